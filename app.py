@@ -1,16 +1,11 @@
 # import streamlit as st
-import hmac, streamlit as st # used for password protection of app
+import hmac, time, streamlit as st # used for password protection of app
 from rag.retriever import retrieve_topn
-from rag.composer import compose_grounded_answer, web_fallback_answer
-from rag.models import AnswerItem, CaseStudy, Chunk
-from rag.loader import upload_and_ingest
+from rag.composer import stream_grounded_answer, stream_web_fallback_answer
 from rag.store import ensure_indexes
-from config import EMBED_DIM, HYBRID_ACCEPT, ADMIN_PASSWORD
-####################################################
-# these are required to view full graph db if needed
-# import streamlit.components.v1 as components
-# from rag.graph_explorer import render_graph_html
-####################################################
+from rag import embed_cache, answer_cache, retrieval_cache, history, tracing, jobs, db, warmup
+from config import (EMBED_DIM, HYBRID_ACCEPT, ADMIN_PASSWORD, JOBS_INPROCESS_WORKERS, GRAPH_PAGE_SIZE, HISTORY_WINDOW,
+                    WARMUP, MISSING_MESSAGE)
 from urllib.parse import urlparse
 #####################################################
 
@@ -47,6 +42,10 @@ if st.secrets.get("MAINTENANCE_MODE", "false").lower() in ("true", "1", "yes"):
     st.info(st.secrets.get("MAINTENANCE_MESSAGE", "Temporarily unavailable."))
     st.stop()
 
+if MISSING_MESSAGE:
+    st.error(MISSING_MESSAGE)
+    st.stop()
+
 def _require_password():
     password = st.secrets.get("APP_PASSWORD", "")
     if not password:
@@ -67,6 +66,11 @@ def _require_password():
 
 _require_password()
 
+# Background ingestion workers (once per process)
+jobs.start_workers(JOBS_INPROCESS_WORKERS)
+# OpenAI client, Neo4j pool and local indexes load in the background while the page paints
+warmup.start(WARMUP)
+
 st.set_page_config(page_title="Conexus AI Search", layout="wide")
 st.set_page_config(page_title="Conexus AI Search", page_icon="assets/logo.png", layout="wide")
 
@@ -102,169 +106,211 @@ with st.sidebar:
 
         st.markdown("---")
         st.header("Upload Case Studies")
+        from rag.loader import upload_and_ingest  # admin-only, imported on first use
         upload_and_ingest()
         st.markdown("---")
+
+        with st.expander("Cache stats"):
+            es = embed_cache.stats()
+            st.caption(
+                f"Embedding cache: {es.get('entries', 0)} entries, {es['bytes'] / 1e6:.1f} MB — "
+                f"query hit rate {es['query']['hit_rate']:.0%}, ingest hit rate {es['ingest']['hit_rate']:.0%}"
+            )
+            ac = answer_cache.stats()
+            st.caption(
+                f"Answer cache: {ac['entries']} entries, hit rate {ac['hit_rate']:.0%}, "
+                f"{ac['saved_per_hit']:.1f}s saved per hit ({ac['saved_seconds']:.0f}s total)"
+            )
+            rc = retrieval_cache.stats()
+            st.caption(
+                f"Retrieval cache: {rc['entries']} entries, {rc['bytes'] / 1e6:.1f} MB — hit rate {rc['hit_rate']:.0%} "
+                f"({rc['disk_hits']} from disk), {rc['stale']} stale dropped, "
+                f"{rc['saved_per_hit'] * 1000:.0f} ms saved per hit"
+            )
+            hs = history.stats()
+            st.caption(
+                f"Chat sources: {hs['chunks']} chunks shared by all sessions, {hs['bytes'] / 1e6:.1f} MB — "
+                f"hit rate {hs['hit_rate']:.0%}, {hs['fetched']} re-read from Neo4j"
+            )
+            ws = warmup.stats()
+            if ws["started"]:
+                st.caption(
+                    f"Warmup: {'done in ' + format(ws['seconds'], '.1f') + 's' if ws['done'] else 'running'} — "
+                    + ", ".join(f"{k} {v * 1000:.0f} ms" for k, v in ws["steps"].items())
+                    + (f" · failed: {', '.join(ws['errors'])}" if ws["errors"] else "")
+                )
     else:
         st.info("Admin tools are locked. Please log in above to manage indexes or upload case studies.")
 
-    #################################################
-    # This will display full db graph
-    # st.subheader("Graph Explorer")
-    # max_nodes = st.slider("Max nodes to visualize", min_value=100, max_value=5000, value=1000, step=100,
-    #                       help="Limits how many nodes are pulled to keep the view responsive.")
-    # if st.button("Render full graph (capped)"):
-    #     with st.spinner("Building graph…"):
-    #         html_path = render_graph_html(max_nodes=max_nodes)
-    #         # Display interactive graph
-    #         with open(html_path, "r", encoding="utf-8") as f:
-    #             components.html(f.read(), height=820, scrolling=True)
-    #         # Optional: let admins download the HTML
-    #         with open(html_path, "rb") as fbin:
-    #             st.download_button(
-    #                 "Download graph HTML",
-    #                 data=fbin,
-    #                 file_name="neo4j_graph.html",
-    #                 mime="text/html",
-    #             )
-    # st.caption("Note: This view caps the number of nodes to avoid memory issues on large databases.")
-    #################################################
+    # Filled at the end of the script, once this run's question (if any) has been answered
+    timings_box = st.empty()
+
+    # Graph explorer (admins): case studies paged, chunks and neighbours on demand; views are cached
+    # per graph version. The controls keep their values in session state, so the view is fetched
+    # once (graph_explorer.explore) and then used for both the controls and the graph.
+    if st.session_state.get("is_admin") and st.checkbox("Graph Explorer"):
+        import streamlit.components.v1 as components
+        from rag import graph_explorer
+        ss = st.session_state
+        ss.setdefault("graph_page", 1)
+        expand = ss.get("graph_expand", [])
+        view = graph_explorer.explore(ss.graph_page - 1, expand,
+                                      {cid: ss.get(f"graph_chunks_{cid}", 1) - 1 for cid in expand},
+                                      ss.get("graph_around") or None)
+        counts, cases = view["counts"], view["cases"]
+        pages = max(1, -(-counts["cases"] // GRAPH_PAGE_SIZE))
+        ss.graph_page = min(ss.graph_page, pages)
+        # A new page has other case studies: start it with nothing expanded
+        st.number_input("Page", min_value=1, max_value=pages, key="graph_page",
+                        on_change=lambda: ss.update(graph_expand=[], graph_around=""))
+
+        # Controls only offer what this page shows; drop stale picks before the widgets are drawn
+        titles = {r["case_id"]: r["title"] or r["case_id"] for r in cases}
+        ss.graph_expand = [cid for cid in expand if cid in titles]
+        st.multiselect("Show chunks of", list(titles), format_func=titles.get, key="graph_expand")
+        for r in cases:
+            chunk_pages = -(-(r["chunks"] or 0) // GRAPH_PAGE_SIZE)
+            if r["case_id"] in ss.graph_expand and chunk_pages > 1:
+                key = f"graph_chunks_{r['case_id']}"
+                ss[key] = min(ss.get(key, 1), chunk_pages)
+                st.number_input(f"Chunk page · {titles[r['case_id']]}", min_value=1, max_value=chunk_pages, key=key)
+        nodes = {"": "—", **{r["id"]: titles[r["case_id"]] for r in cases},
+                 **{c["id"]: c["chunk_id"] for rows in view["chunks"].values() for c in rows}}
+        if ss.get("graph_around") not in nodes:
+            ss.graph_around = ""
+        st.selectbox("Show neighbours of", list(nodes), format_func=nodes.get, key="graph_around")
+
+        components.html(view["html"], height=820, scrolling=True)
+        st.download_button("Download graph HTML", data=view["html"], file_name="neo4j_graph.html", mime="text/html")
+        st.caption(f"{counts['cases']} case studies, {counts['chunks']} chunks · page {ss.graph_page} of {pages}"
+                   f" · {'cached' if view['cached'] else 'rendered'} view of graph {view['stamp']}")
 
 # Chat panel
 st.title("Conexus AI Search")
 if "history" not in st.session_state:
-    st.session_state.history = []
+    st.session_state.history = []  # compact turns, see rag/history.py
 
-user_q = st.chat_input("Ask about the case studies…")
-if user_q:
-    top, best = retrieve_topn(user_q)
-    if top and best >= HYBRID_ACCEPT:
-        answer = compose_grounded_answer(user_q, top)
-        grounded = True
-        ext_link = None
+def _render_sources(turn: dict):
+    if turn["grounded"]:
+        st.caption("Grounded in Conexus MRG Case Studies (top 3)")
+
+        # Only show sources when grounded; chunk text comes from the shared chunk cache
+        for i, (cid, score) in enumerate(turn["sources"], start=1):
+            src = history.source(cid)
+            if src is None:
+                st.caption(f"Source {i}: chunk {cid} is no longer in the database")
+                continue
+            with st.expander(f"Source {i}: {src['title']}"):
+                st.write(src['text'])
+                st.caption(
+                    f"chunk_id={src['chunk_id']} "
+                    f"range={src['start']}-{src['end']}"
+                    + (f" page={src['page']}" if src.get('page') else "")
+                    + (f" section={src['section']}" if src.get('section') else "")
+                )
+                url = _normalize_url(src.get("url"))
+                if url:
+                    try:
+                        st.link_button("Open case study ↗", url)
+                    except Exception:
+                        st.markdown(
+                            f'<a href="{url}" target="_blank" rel="noopener noreferrer">Open case study ↗</a>',
+                            unsafe_allow_html=True,
+                        )
     else:
-        answer, ext_link = web_fallback_answer(user_q)
-        grounded = False
-    # Heuristic: if grounded answer basically says "no info in the data",
-    # flip it to not grounded so we don't display sources.
-    if grounded:
-        ans_lower = answer.lower()
-        no_info_phrases = [
-            # chunks / case studies
-            "the provided chunks do not contain information",
-            "the provided chunks do not contain any information",
-            "the provided chunks do not include information",
-            "no relevant information was found in the provided chunks",
-            "the case studies do not contain information",
-            "the case studies do not include information",
-            # database wording
-            "not present in the database",
-            "no information regarding",
-            "no information about",
-        ]
-
-        if any(p in ans_lower for p in no_info_phrases):
-            grounded = False
+        st.caption("Not found in Conexus MRG Case Studies")
+        if turn.get("external_link"):
+            st.markdown(f"External source: {turn['external_link']}")
+        # No source panels in the non-grounded case
 
+    timing = turn.get("timing")
+    if timing and st.session_state.get("is_admin"):
+        if timing.get("cached"):
+            st.caption("Answer served from cache")
+        else:
+            caption = f"First token {timing.get('ttft', 0):.2f}s · total {timing.get('total', 0):.2f}s"
+            if timing.get("prompt_tokens"):
+                caption += f" · {timing['prompt_tokens']} prompt tokens"
+            if timing.get("retrieval_cached"):
+                caption += " · cached retrieval"
+            st.caption(caption)
 
-    # top3_items = []
-    # for c in (top or [])[:3]:
-    #     top3_items.append(AnswerItem(
-    #         answer_snippet=c['text'][:220] + ('…' if len(c['text'])>220 else ''),
-    #         score=round(float(c['hybrid']), 3),
-    #         case_study=CaseStudy(case_id=c['case_id'], title=c['title'], url=c['url']),
-    #         chunk=Chunk(chunk_id=c['cid'], text=c['text'], order=int(c['order']),
-    #                     char_start=int(c['start']), char_end=int(c['end']))
-    #     ))
-    # Only show top3 sources when the answer is grounded in the DB
-    top3_items = []
-    if grounded and top:
-        for c in top[:3]:
-            top3_items.append(AnswerItem(
-                answer_snippet=c['text'][:220] + ('…' if len(c['text']) > 220 else ''),
-                score=round(float(c['hybrid']), 3),
-                case_study=CaseStudy(case_id=c['case_id'], title=c['title'], url=c['url']),
-                chunk=Chunk(
-                    chunk_id=c['cid'],
-                    text=c['text'],
-                    order=int(c['order']),
-                    char_start=int(c['start']),
-                    char_end=int(c['end']),
-                ),
-            ))
-    
-
-    st.session_state.history.append({
-        "q": user_q,
-        "resp": {
-            "answer": answer,
-            "top3": [i.model_dump() for i in top3_items],
-            "grounded_in_db": grounded,
-            "external_link": ext_link
-        }
-    })
-
-# for turn in st.session_state.history:
-#     st.chat_message("user").write(turn["q"])
-#     with st.chat_message("assistant"):
-#         st.write(turn["resp"]["answer"])
-#         if turn["resp"]["grounded_in_db"]:
-#             st.caption("Grounded in Conexus MRG Case Studies (top 3)")
-#         else:
-#             st.caption("Not found in Conexus MRG Case Studies")
-#             if turn["resp"].get("external_link"):
-#                 st.markdown(f"External source: {turn['resp']['external_link']}")
-#         for i, item in enumerate(turn["resp"]["top3"], start=1):
-#             #with st.expander(f"Source {i}: {item['case_study']['title']} (score {item['score']})"): # SHOW SCORE
-#             with st.expander(f"Source {i}: {item['case_study']['title']}"):
-#                 # Chunk text
-#                 st.write(item['chunk']['text'])
-
-#                 # Metadata (without raw url=...)
-#                 st.caption(
-#                     f"chunk_id={item['chunk']['chunk_id']} "
-#                     f"range={item['chunk']['char_start']}-{item['chunk']['char_end']}"
-#                 )
-
-#                 # Clickable link to the case study (opens in a new tab)
-#                 url = _normalize_url(item["case_study"].get("url"))
-#                 if url:
-#                     # Streamlit 1.52 supports link_button; fallback to HTML if anything odd happens
-#                     try:
-#                         st.link_button("Open case study ↗", url)
-#                     except Exception:
-#                         st.markdown(
-#                             f'<a href="{url}" target="_blank" rel="noopener noreferrer">Open case study ↗</a>',
-#                             unsafe_allow_html=True,
-#                         )
-
-for turn in st.session_state.history:
+# Past turns first, newest HISTORY_WINDOW only; earlier ones are paged in on request.
+# The new turn streams in below them.
+turns = st.session_state.history
+shown = st.session_state.get("history_shown", HISTORY_WINDOW)
+if st.session_state.get("history_dropped"):
+    st.caption(f"{st.session_state.history_dropped} earlier questions were cleared from this session")
+if len(turns) > shown and st.button(f"Show {min(HISTORY_WINDOW, len(turns) - shown)} earlier questions"):
+    shown = st.session_state.history_shown = shown + HISTORY_WINDOW
+for turn in turns[-shown:]:
     st.chat_message("user").write(turn["q"])
     with st.chat_message("assistant"):
-        st.write(turn["resp"]["answer"])
-
-        if turn["resp"]["grounded_in_db"]:
-            st.caption("Grounded in Conexus MRG Case Studies (top 3)")
-
-            # Only show sources when grounded
-            for i, item in enumerate(turn["resp"]["top3"], start=1):
-                with st.expander(f"Source {i}: {item['case_study']['title']}"):
-                    st.write(item['chunk']['text'])
-                    st.caption(
-                        f"chunk_id={item['chunk']['chunk_id']} "
-                        f"range={item['chunk']['char_start']}-{item['chunk']['char_end']}"
-                    )
-                    url = _normalize_url(item["case_study"].get("url"))
-                    if url:
-                        try:
-                            st.link_button("Open case study ↗", url)
-                        except Exception:
-                            st.markdown(
-                                f'<a href="{url}" target="_blank" rel="noopener noreferrer">Open case study ↗</a>',
-                                unsafe_allow_html=True,
-                            )
+        st.write(turn["answer"])
+        _render_sources(turn)
+
+user_q = st.chat_input("Ask about the case studies…")
+if user_q:
+    st.chat_message("user").write(user_q)
+    with st.chat_message("assistant"), tracing.request("chat") as trace:
+        info, meta = {}, {}
+        top, best = retrieve_topn(user_q, info)
+        if top and best >= HYBRID_ACCEPT:
+            answer = answer_cache.lookup(info["qvec"], [c["cid"] for c in top])
+            if answer is None:
+                answer = st.write_stream(stream_grounded_answer(user_q, top, meta))
+                answer_cache.store(info["qvec"], top, answer, meta.get("total", 0.0))
+            else:
+                st.write(answer)
+                meta["cached"] = True
+            grounded = True
+            ext_link = None
         else:
-            st.caption("Not found in Conexus MRG Case Studies")
-            if turn["resp"].get("external_link"):
-                st.markdown(f"External source: {turn['resp']['external_link']}")
-            # No source panels in the non-grounded case
+            answer = st.write_stream(stream_web_fallback_answer(user_q, meta))
+            ext_link = meta.get("external_link")
+            grounded = False
+        # Heuristic: if grounded answer basically says "no info in the data",
+        # flip it to not grounded so we don't display sources.
+        if grounded:
+            ans_lower = answer.lower()
+            no_info_phrases = [
+                # chunks / case studies
+                "the provided chunks do not contain information",
+                "the provided chunks do not contain any information",
+                "the provided chunks do not include information",
+                "no relevant information was found in the provided chunks",
+                "the case studies do not contain information",
+                "the case studies do not include information",
+                # database wording
+                "not present in the database",
+                "no information regarding",
+                "no information about",
+            ]
+
+            if any(p in ans_lower for p in no_info_phrases):
+                grounded = False
+
+
+        turn = history.make_turn(
+            user_q, answer, grounded, top or [], ext_link,
+            {**{k: meta[k] for k in ("ttft", "total", "cached", "prompt_tokens", "interrupted") if k in meta},
+             "retrieval_cached": info.get("cached", False)},
+        )
+        _render_sources(turn)
+
+    dropped = history.append(st.session_state.history, turn)
+    st.session_state.history_dropped = st.session_state.get("history_dropped", 0) + dropped
+    st.session_state["last_trace"] = trace
 
+if st.session_state.get("is_admin"):
+    with timings_box.container():
+        with st.expander("Request timings"):
+            last = st.session_state.get("last_trace")
+            if last:
+                st.caption(f"Last question: {last['ms']:.0f} ms end to end")
+                st.dataframe([{"span": s["name"], "ms": round(s["ms"], 1)} for s in last["spans"]],
+                             hide_index=True, use_container_width=True)
+            st.caption("All sessions (rolling window)")
+            st.dataframe(tracing.aggregates(), hide_index=True, use_container_width=True)
+            st.caption("Neo4j connection pool (this process)")
+            st.json(db.metrics(), expanded=False)
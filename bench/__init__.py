@@ -0,0 +1,14 @@
+# Benchmarks — run from the repo root, e.g. `python -m bench.hybrid_query "your question"`
+import os
+
+def offline_env(**overrides):
+    # config.py insists on credentials at import; offline benches never reach the real
+    # services, so placeholders are enough. Call before importing anything from rag.
+    for k, v in {
+        "OPENAI_API_KEY": "sk-offline",
+        "NEO4J_URI": "bolt://localhost:7687",
+        "NEO4J_USER": "neo4j",
+        "NEO4J_PASSWORD": "offline",
+    }.items():
+        os.environ.setdefault(k, v)
+    os.environ.update({k: str(v) for k, v in overrides.items()})
@@ -0,0 +1,94 @@
+"""
+Local vector index (rag.ann_index) vs Neo4j's chunk_vec_idx: recall and latency.
+
+    python -m bench.ann                       # synthetic vectors, local index only
+    python -m bench.ann --chunks 100000
+    python -m bench.ann --neo4j --queries 200 # real Chunk embeddings, both backends
+
+Reports build/load time, per-query latency and the cost of an incremental ingest
+window. With --neo4j the index is built from the configured database and queried
+with perturbed copies of stored embeddings. The local search is exact, so recall@k
+is Neo4j's HNSW measured against the exact top-k; overlap is the share of ids the two
+backends agree on. The index is built in a temporary directory; the app's is untouched.
+"""
+import argparse, json, statistics, tempfile, time
+import numpy as np
+from bench import offline_env
+
+def _lat(fn, queries):
+    out, res = [], []
+    for q in queries:
+        t0 = time.perf_counter()
+        res.append(fn(q))
+        out.append((time.perf_counter() - t0) * 1000)
+    s = sorted(out)
+    return res, {"p50": round(s[len(s) // 2], 3), "p95": round(s[int(0.95 * (len(s) - 1))], 3),
+                 "mean": round(statistics.fmean(out), 3)}
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--neo4j", action="store_true", help="build from and compare with the configured Neo4j")
+    ap.add_argument("--chunks", type=int, default=20000, help="synthetic vectors (without --neo4j)")
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--k", type=int)
+    ap.add_argument("--noise", type=float, default=0.3, help="query = stored vector + noise * random")
+    a = ap.parse_args()
+
+    if not a.neo4j:
+        offline_env()
+    from config import EMBED_DIM, TOP_K
+    from rag.ann_index import AnnIndex
+    k = a.k or TOP_K
+    rng = np.random.default_rng(0)
+    path = tempfile.mkdtemp()
+    out = {"dim": EMBED_DIM, "k": k}
+
+    t0 = time.perf_counter()
+    index = AnnIndex(path, EMBED_DIM)
+    if a.neo4j:
+        from rag import store
+        n = store.count_embeddings()
+        index.rebuild(store.iter_embeddings(), n)
+    else:
+        n = a.chunks
+        index.rebuild(((f"c{i}", rng.standard_normal(EMBED_DIM, dtype=np.float32)) for i in range(n)), n)
+    out["chunks"] = len(index)
+    out["build_seconds"] = round(time.perf_counter() - t0, 2)
+
+    t0 = time.perf_counter()
+    index = AnnIndex(path, EMBED_DIM)
+    out["load_ms"] = round((time.perf_counter() - t0) * 1000, 2)
+
+    # Queries: perturbed copies of stored vectors, so each has a known near neighbour
+    rows = rng.choice(len(index), size=min(a.queries, len(index)), replace=False)
+    queries = []
+    for r in rows:
+        v = index._vector(int(r))
+        queries.append((v + a.noise * rng.standard_normal(EMBED_DIM, dtype=np.float32) / np.sqrt(EMBED_DIM)).tolist())
+
+    index.search(queries[0], k)  # first touch of the mmap
+    local, out["local_ms"] = _lat(lambda q: index.search(q, k), queries)
+
+    if a.neo4j:
+        remote, out["neo4j_ms"] = _lat(lambda q: store._neo4j_vector(q, k), queries)
+        recall, overlap = [], []
+        for lr, rr in zip(local, remote):
+            exact = {cid for cid, _ in lr}
+            got = {r["chunk"]["chunk_id"] for r in rr}
+            recall.append(len(exact & got) / len(exact) if exact else 1.0)
+            overlap.append(len(exact & got) / max(len(exact | got), 1))
+        out["neo4j_recall@k"] = round(statistics.fmean(recall), 4)
+        out["overlap"] = round(statistics.fmean(overlap), 4)
+
+    # Incremental ingest: one INGEST_WINDOW_CHUNKS-sized upsert plus a delete
+    ids = [f"bench-new-{i}" for i in range(1024)]
+    vecs = rng.standard_normal((1024, EMBED_DIM), dtype=np.float32)
+    t0 = time.perf_counter()
+    index.upsert(ids, vecs)
+    index.delete(ids[:100])
+    out["upsert_1024_ms"] = round((time.perf_counter() - t0) * 1000, 2)
+    _, out["local_ms_after_upsert"] = _lat(lambda q: index.search(q, k), queries)
+    print(json.dumps(out, indent=2))
+
+if __name__ == "__main__":
+    main()
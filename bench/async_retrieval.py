@@ -0,0 +1,40 @@
+"""
+Sequential vs async (overlapped) retrieval against the configured OpenAI + Neo4j.
+
+    python -m bench.async_retrieval "How do we cut installation downtime?" --runs 5
+
+The embedding and retrieval caches are disabled for the run so every question
+pays the real embedding round trip, which is the stage the async path overlaps.
+"""
+import argparse, json, os, statistics, time
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("questions", nargs="+")
+    ap.add_argument("--runs", type=int, default=5)
+    a = ap.parse_args()
+    os.environ["EMBED_CACHE_ENABLED"] = "false"
+    os.environ["RETRIEVAL_CACHE_ENABLED"] = "false"
+    from rag import retriever
+    from rag.async_retriever import retrieve_topn_sync
+
+    seq, stages = [], {}
+    for _ in range(a.runs):
+        for q in a.questions:
+            t0 = time.perf_counter()
+            retriever.retrieve_topn(q)
+            seq.append(time.perf_counter() - t0)
+            info = {}
+            retrieve_topn_sync(q, info)
+            for k, v in info["timings"].items():
+                stages.setdefault(k, []).append(v)
+
+    med = lambda xs: round(statistics.median(xs) * 1000, 1)
+    print(json.dumps({
+        "sync_single_query_p50_ms": med(seq),
+        "async_stage_p50_ms": {k: med(v) for k, v in stages.items()},
+        "async_critical_path_saving_p50_ms": med([s - t for s, t in zip(stages["sequential"], stages["total"])]),
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
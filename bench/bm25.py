@@ -0,0 +1,106 @@
+"""
+Local BM25 index (rag.bm25) vs Neo4j's chunk_text_fts: latency and result overlap.
+
+    python -m bench.bm25                        # synthetic chunks, local index vs the bench's MemoryStore
+    python -m bench.bm25 --chunks 100000
+    python -m bench.bm25 --neo4j --queries 200  # real Chunk text, both backends
+
+Queries are the fixture questions as users type them (question marks, apostrophes,
+hyphens). Reports build/load time, per-query latency, the cost of an incremental
+ingest window, and overlap@k (shared ids / union) and top-1 agreement with the
+reference: MemoryStore's BM25 offline, chunk_text_fts with --neo4j. With --neo4j it
+also counts the raw questions Lucene rejects, which the old fulltext() passed through
+unescaped. The index is built in a temporary directory; the app's is untouched.
+"""
+import argparse, json, random, statistics, tempfile, time
+from bench import offline_env
+from bench.ann import _lat
+from bench.fixtures import CASES, FILLER, NEGATIVES
+
+def _synthetic(n: int, rng: random.Random):
+    sentences = FILLER + [fact for _, _, facts in CASES for fact, _ in facts]
+    for i in range(n):
+        # A few rare tokens per chunk so the vocabulary grows with the corpus
+        rare = " ".join(f"part{rng.randrange(n)}" for _ in range(3))
+        yield f"c{i}", " ".join(rng.sample(sentences, 8)) + f" Ref {rare}."
+
+def _agreement(local, ref):
+    overlap, top1 = [], []
+    for lr, rr in zip(local, ref):
+        a, b = [cid for cid, _ in lr], [cid for cid, _ in rr]
+        overlap.append(len(set(a) & set(b)) / max(len(set(a) | set(b)), 1))
+        top1.append(1.0 if a[:1] == b[:1] else 0.0)
+    return round(statistics.fmean(overlap), 4), round(statistics.fmean(top1), 4)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--neo4j", action="store_true", help="build from and compare with the configured Neo4j")
+    ap.add_argument("--chunks", type=int, default=20000, help="synthetic chunks (without --neo4j)")
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--k", type=int)
+    a = ap.parse_args()
+
+    if not a.neo4j:
+        offline_env()
+    from config import TOP_K
+    from rag.bm25 import Bm25Index
+    k = a.k or TOP_K
+    rng = random.Random(0)
+    path = tempfile.mkdtemp()
+    out = {"k": k}
+
+    base = [q for _, _, facts in CASES for _, q in facts] + NEGATIVES
+    queries = [rng.choice(base) for _ in range(a.queries)]
+
+    t0 = time.perf_counter()
+    index = Bm25Index(path)
+    if a.neo4j:
+        from rag import store
+        index.rebuild(store.iter_texts())
+    else:
+        rows = list(_synthetic(a.chunks, rng))
+        t0 = time.perf_counter()
+        index.rebuild(rows)
+    out["chunks"] = len(index)
+    out["build_seconds"] = round(time.perf_counter() - t0, 2)
+
+    t0 = time.perf_counter()
+    index = Bm25Index(path)
+    out["load_ms"] = round((time.perf_counter() - t0) * 1000, 2)
+    out.update({k_: v for k_, v in index.stats().items() if k_ in ("terms", "postings", "avg_len")})
+
+    index.search(queries[0], k)  # first touch of the mmap
+    local, out["local_ms"] = _lat(lambda q: index.search(q, k), queries)
+
+    if a.neo4j:
+        remote, out["neo4j_ms"] = _lat(lambda q: store._neo4j_fulltext(q, k), queries)
+        ref = [[(r["chunk"]["chunk_id"], r["score"]) for r in rr] for rr in remote]
+        failed = 0
+        with store.get_session() as s:
+            for q in set(queries):
+                try:
+                    s.run(store.FIND_FTS, q=q, k=k).consume()
+                except Exception:
+                    failed += 1
+        out["raw_questions_rejected"] = f"{failed}/{len(set(queries))}"
+    else:
+        from bench.memstore import MemoryStore
+        mem = MemoryStore()
+        mem.upsert_chunks({"case_id": "bench"}, [{"chunk_id": cid, "text": text, "order": i, "start": 0, "end": 0,
+                                                  "embedding": []} for i, (cid, text) in enumerate(rows)])
+        # MemoryStore scores in pure Python, so compare on a slice of the queries
+        local = local[:50]
+        ref = [[(r["chunk"]["chunk_id"], r["score"]) for r in mem.fulltext(q, k)] for q in queries[:50]]
+    out["overlap@k"], out["top1_agreement"] = _agreement(local, ref)
+
+    # Incremental ingest: one INGEST_WINDOW_CHUNKS-sized upsert plus a delete
+    new = [(f"bench-new-{i}", text) for i, (_, text) in enumerate(_synthetic(1024, rng))]
+    t0 = time.perf_counter()
+    index.upsert(new)
+    index.delete(cid for cid, _ in new[:100])
+    out["upsert_1024_ms"] = round((time.perf_counter() - t0) * 1000, 2)
+    _, out["local_ms_after_upsert"] = _lat(lambda q: index.search(q, k), queries)
+    print(json.dumps(out, indent=2))
+
+if __name__ == "__main__":
+    main()
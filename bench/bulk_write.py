@@ -0,0 +1,60 @@
+"""
+Chunk write throughput: per-chunk upsert_chunk vs batched MERGE vs bulk CREATE.
+
+    python -m bench.bulk_write --chunks 2000 --batch-size 200
+
+Writes synthetic `bench-*` CaseStudy/Chunk nodes to the configured database and
+deletes them afterwards. Run `Ensure Indexes` first so chunk_id_unique exists.
+"""
+import argparse, json, time
+import numpy as np
+from config import EMBED_DIM
+from rag.store import get_session, upsert_chunk, upsert_chunks
+
+CLEANUP = """
+MATCH (cs:CaseStudy) WHERE cs.case_id STARTS WITH 'bench-'
+OPTIONAL MATCH (cs)-[:HAS_CHUNK]->(ch)
+DETACH DELETE cs, ch
+"""
+
+def _rows(case_id: str, n: int):
+    rng = np.random.default_rng(0)
+    return [{
+        "chunk_id": f"{case_id}-{i:05d}",
+        "text": f"Synthetic chunk {i} " + "lorem ipsum " * 100,
+        "order": i, "start": i * 1200, "end": i * 1200 + 1400,
+        "embedding": rng.standard_normal(EMBED_DIM).astype(np.float32).tolist(),
+    } for i in range(n)]
+
+def _cleanup():
+    with get_session() as s:
+        s.run(CLEANUP).consume()
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--chunks", type=int, default=1000)
+    ap.add_argument("--batch-size", type=int, default=200)
+    ap.add_argument("--legacy-chunks", type=int, default=200, help="per-chunk path is slow; cap it")
+    a = ap.parse_args()
+    out = {}
+    _cleanup()
+    try:
+        case = {"case_id": "bench-legacy", "title": "bench", "url": None}
+        rows = _rows(case["case_id"], a.legacy_chunks)
+        t0 = time.perf_counter()
+        for r in rows:
+            upsert_chunk({**case, **r})
+        out["per_chunk_merge"] = {"chunks": len(rows),
+                                  "chunks_per_sec": round(len(rows) / (time.perf_counter() - t0), 1)}
+
+        for mode, bulk in (("batched_merge", False), ("bulk_create", True)):
+            case = {"case_id": f"bench-{mode}", "title": "bench", "url": None}
+            stats = {}
+            upsert_chunks(case, _rows(case["case_id"], a.chunks), a.batch_size, bulk=bulk, stats=stats)
+            out[mode] = {k: round(v, 2) if isinstance(v, float) else v for k, v in stats.items()}
+    finally:
+        _cleanup()
+    print(json.dumps(out, indent=2))
+
+if __name__ == "__main__":
+    main()
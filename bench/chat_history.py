@@ -0,0 +1,130 @@
+"""
+Chat history: session memory and rerun time, the old per-turn copies vs rag.history.
+
+    python -m bench.chat_history                      # 10, 50 and 200 turns
+    python -m bench.chat_history --turns 100 --sessions 50
+
+Turns cite chunks of the bench corpus (bench.fixtures), three per answer, as the app
+does. "legacy" stores every turn the way app.py used to: the answer plus a
+model_dump() of each source, with the chunk text and a snippet of it. It re-renders
+every turn on each rerun. "compact" stores [chunk_id, score] per source, with chunk
+text in the shared cache, and renders the newest HISTORY_WINDOW turns. Memory is
+the pickled size of one session's history. The shared cache is counted once per
+process, and totals are given for --sessions concurrent sessions. Rerun time is one
+Streamlit run of the history section (streamlit.testing AppTest), with no question
+asked.
+"""
+import argparse, json, pickle, random, statistics, time
+from bench import offline_env
+
+LEGACY = '''
+import streamlit as st
+def _render_sources(resp):
+    if resp["grounded_in_db"]:
+        st.caption("Grounded in Conexus MRG Case Studies (top 3)")
+        for i, item in enumerate(resp["top3"], start=1):
+            with st.expander(f"Source {i}: {item['case_study']['title']}"):
+                st.write(item['chunk']['text'])
+                st.caption(f"chunk_id={item['chunk']['chunk_id']} "
+                           f"range={item['chunk']['char_start']}-{item['chunk']['char_end']}")
+                if item["case_study"].get("url"):
+                    st.link_button("Open case study ↗", item["case_study"]["url"])
+for turn in st.session_state.history:
+    st.chat_message("user").write(turn["q"])
+    with st.chat_message("assistant"):
+        st.write(turn["resp"]["answer"])
+        _render_sources(turn["resp"])
+'''
+
+COMPACT = '''
+import streamlit as st
+from rag import history
+from config import HISTORY_WINDOW
+def _render_sources(turn):
+    if turn["grounded"]:
+        st.caption("Grounded in Conexus MRG Case Studies (top 3)")
+        for i, (cid, score) in enumerate(turn["sources"], start=1):
+            src = history.source(cid)
+            with st.expander(f"Source {i}: {src['title']}"):
+                st.write(src['text'])
+                st.caption(f"chunk_id={src['chunk_id']} range={src['start']}-{src['end']}")
+                if src.get("url"):
+                    st.link_button("Open case study ↗", src["url"])
+turns = st.session_state.history
+shown = st.session_state.get("history_shown", HISTORY_WINDOW)
+if len(turns) > shown and st.button(f"Show {min(HISTORY_WINDOW, len(turns) - shown)} earlier questions"):
+    shown = st.session_state.history_shown = shown + HISTORY_WINDOW
+for turn in turns[-shown:]:
+    st.chat_message("user").write(turn["q"])
+    with st.chat_message("assistant"):
+        st.write(turn["answer"])
+        _render_sources(turn)
+'''
+
+def _chunks():
+    from bench.fixtures import build
+    from rag.chunking import chunk_units
+    docs, _ = build()
+    out = []
+    for d in docs:
+        for order, (text, s, e, page, section) in enumerate(chunk_units([(d["text"], None, "text")])):
+            out.append({"cid": f"{d['case_id']}-{order:04d}", "case_id": d["case_id"], "title": d["title"],
+                        "url": d.get("url") or f"https://example.com/{d['case_id']}", "text": text, "order": order,
+                        "start": s, "end": e, "page": page, "section": section, "hybrid": random.random()})
+    return out
+
+def _legacy_turn(q, answer, top):
+    from rag.models import AnswerItem, CaseStudy, Chunk
+    items = [AnswerItem(answer_snippet=c['text'][:220] + ('…' if len(c['text']) > 220 else ''),
+                        score=round(float(c['hybrid']), 3),
+                        case_study=CaseStudy(case_id=c['case_id'], title=c['title'], url=c['url']),
+                        chunk=Chunk(chunk_id=c['cid'], text=c['text'], order=int(c['order']),
+                                    char_start=int(c['start']), char_end=int(c['end'])))
+             for c in top[:3]]
+    return {"q": q, "resp": {"answer": answer, "top3": [i.model_dump() for i in items], "grounded_in_db": True,
+                             "external_link": None, "timing": {"ttft": 0.4, "total": 2.1}}}
+
+def _rerun(script: str, turns, runs: int) -> float:
+    from streamlit.testing.v1 import AppTest
+    lat = []
+    for _ in range(runs):
+        at = AppTest.from_string(script, default_timeout=120)
+        at.session_state["history"] = turns
+        t0 = time.perf_counter()
+        at.run()
+        lat.append((time.perf_counter() - t0) * 1000)
+        assert not at.exception, at.exception
+    return round(statistics.median(lat), 1)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--turns", default="10,50,200")
+    ap.add_argument("--sessions", type=int, default=20, help="concurrent sessions for the memory totals")
+    ap.add_argument("--runs", type=int, default=3)
+    a = ap.parse_args()
+    offline_env(HISTORY_MAX_TURNS="100000")
+    from rag import history
+
+    random.seed(0)
+    chunks = _chunks()
+    answer = "The retrofit was staged across planned outages, with spare units pre-assembled offsite. " * 8
+    rows = []
+    for n in (int(t) for t in a.turns.split(",")):
+        legacy, compact = [], []
+        for i in range(n):
+            top = random.sample(chunks, 3)
+            q = f"Question {i} about {top[0]['title']}?"
+            legacy.append(_legacy_turn(q, answer, top))
+            history.append(compact, history.make_turn(q, answer, True, top, None, {"ttft": 0.4, "total": 2.1}))
+        legacy_b, compact_b = len(pickle.dumps(legacy)), len(pickle.dumps(compact))
+        shared = history.stats()["bytes"]
+        rows.append({"turns": n, "legacy_session_kb": round(legacy_b / 1024, 1),
+                     "compact_session_kb": round(compact_b / 1024, 1), "shared_chunk_cache_kb": round(shared / 1024, 1),
+                     f"legacy_{a.sessions}_sessions_mb": round(a.sessions * legacy_b / 2**20, 2),
+                     f"compact_{a.sessions}_sessions_mb": round((a.sessions * compact_b + shared) / 2**20, 2),
+                     "legacy_rerun_ms": _rerun(LEGACY, legacy, a.runs),
+                     "compact_rerun_ms": _rerun(COMPACT, compact, a.runs)})
+    print(json.dumps({"chunks_in_corpus": len(chunks), "rows": rows}, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""
+Chunking modes side by side: chunk count, prompt tokens and retrieval quality.
+
+    python -m bench.chunking                    # fixtures as PDFs, every mode
+    python -m bench.chunking --text --modes chars,sentences
+    python -m bench.chunking --embedder openai  # real embeddings (cached on disk)
+
+Runs bench.retrieval once per mode (in a subprocess, so each gets a clean config)
+and prints one row per mode; the full results are kept under bench_results/.
+"""
+import argparse, json, os, subprocess, sys, time
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--modes", default="chars,tokens,sentences,layout")
+    ap.add_argument("--text", action="store_true", help="ingest the fixture text directly instead of PDFs")
+    ap.add_argument("--embedder", choices=["fake", "openai"], default="fake")
+    ap.add_argument("--chunk-tokens", type=int)
+    a = ap.parse_args()
+
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    rows = []
+    for mode in a.modes.split(","):
+        out = os.path.join("bench_results", f"chunking-{mode}-{stamp}.json")
+        cmd = [sys.executable, "-m", "bench.retrieval", "--chunk-mode", mode, "--embedder", a.embedder,
+               "--repeat", "1", "--out", out]
+        if not a.text:
+            cmd.append("--pdf")
+        if a.chunk_tokens:
+            cmd += ["--chunk-tokens", str(a.chunk_tokens)]
+        subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL)
+        with open(out, encoding="utf-8") as f:
+            r = json.load(f)
+        q = r["quality"]
+        rows.append({"mode": mode, "chunks": r["corpus"]["chunks"],
+                     "prompt_tokens_mean": r["prompt_tokens"]["mean"], "prompt_tokens_p95": r["prompt_tokens"]["p95"],
+                     "recall@1": q["recall@1"], f"recall@{r['config']['top_n']}": q[f"recall@{r['config']['top_n']}"],
+                     "mrr": q["mrr"], "case_recall": q["case_recall"], "result": out})
+    cols = [k for k in rows[0] if k != "result"]
+    print("  ".join(f"{c:>18}" for c in cols))
+    for row in rows:
+        print("  ".join(f"{row[c]:>18}" for c in cols))
+
+if __name__ == "__main__":
+    main()
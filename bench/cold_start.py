@@ -0,0 +1,144 @@
+"""
+Cold start: import time, first paint and time to first answer, each in a fresh process.
+
+    python -m bench.cold_start                        # this tree, offline
+    python -m bench.cold_start --against HEAD~1       # also an earlier commit, same probes
+    python -m bench.cold_start --think 5 --runs 5
+
+Every number comes from a new Python process, the way a Streamlit Cloud boot or a
+new worker starts. The disk cache is warm after the first run, so a real first boot
+is slower than these figures.
+  import        the module-level imports of app.py (streamlit is imported first and not counted)
+  first_paint   one script run of app.py under streamlit.testing AppTest, streamlit import included
+  first_answer  the app's imports, then --think seconds of idle time (a visitor reading
+                and typing), then one question: retrieval plus a streamed grounded answer,
+                timed from the moment it is asked. Run with WARMUP off and on.
+Neo4j is replaced by bench.memstore holding the bench corpus, and OpenAI by
+bench.stub_openai. Warmup still tries to reach Neo4j, fails in the background
+and records the error. --against REV extracts that commit with `git archive` and
+runs the same probes on it, so the before/after comparison uses the same machine.
+"""
+import argparse, ast, json, os, shutil, statistics, subprocess, sys, tempfile, time
+
+T0 = time.perf_counter()
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+def _app_imports(root: str):
+    tree = ast.parse(open(os.path.join(root, "app.py"), encoding="utf-8").read())
+    mod = ast.Module(body=[n for n in tree.body if isinstance(n, (ast.Import, ast.ImportFrom))], type_ignores=[])
+    return compile(mod, "app.py:imports", "exec")
+
+def _probe_import(a):
+    import streamlit  # the app imports it first either way
+    t0 = time.perf_counter()
+    exec(_app_imports(os.getcwd()), {})
+    loaded = [m for m in ("openai", "neo4j", "fitz", "pandas", "pyvis") if m in sys.modules]
+    return {"seconds": time.perf_counter() - t0, "loaded": loaded}
+
+def _probe_paint(a):
+    from streamlit.testing.v1 import AppTest
+    at = AppTest.from_file(os.path.join(os.getcwd(), "app.py"), default_timeout=120)
+    at.secrets["MAINTENANCE_MODE"] = "false"
+    at.run()
+    return {"seconds": time.perf_counter() - T0, "exception": bool(at.exception)}
+
+def _probe_answer(a):
+    import streamlit
+    exec(_app_imports(os.getcwd()), {})
+    t_import = time.perf_counter() - T0
+    try:
+        from rag import warmup
+        from config import WARMUP
+        warmup.start(WARMUP)
+    except ImportError:
+        warmup = None
+    from bench.memstore import MemoryStore
+    from bench.stub_openai import fake_vector
+    from bench.fixtures import build
+    from rag import retriever
+    from rag.composer import stream_grounded_answer
+    store = MemoryStore()
+    for d in build()[0]:
+        text = d["text"]
+        rows = [{"chunk_id": f"{d['case_id']}-{i // 1200:04d}", "text": text[i:i + 1400], "order": i // 1200,
+                 "start": i, "end": min(i + 1400, len(text)), "embedding": fake_vector(text[i:i + 1400])}
+                for i in range(0, len(text), 1200)]
+        store.upsert_chunks({"case_id": d["case_id"], "title": d["title"], "url": d.get("url")}, rows)
+    for name in ("fulltext", "vector", "get_context", "hybrid_search"):
+        setattr(retriever, name, getattr(store, name))
+    time.sleep(max(0.0, a.think - (time.perf_counter() - T0 - t_import)))
+    t0 = time.perf_counter()
+    top, _ = retriever.retrieve_topn("How did Northwind Paper avoid unplanned downtime?", {})
+    answer = "".join(stream_grounded_answer("How did Northwind Paper avoid unplanned downtime?", top, {}))
+    out = {"seconds": time.perf_counter() - t0, "import_seconds": t_import, "answered": bool(answer)}
+    if warmup is not None:
+        out["warmup"] = warmup.stats()
+    return out
+
+PROBES = {"import": _probe_import, "paint": _probe_paint, "answer": _probe_answer}
+
+def _run(root: str, probe: str, env: dict, a) -> dict:
+    cmd = [sys.executable, os.path.join(HERE, "cold_start.py"), "--probe", probe, "--think", str(a.think)]
+    p = subprocess.run(cmd, cwd=root, env={**os.environ, **env, "PYTHONPATH": root}, capture_output=True, text=True,
+                       timeout=600)
+    lines = [l for l in p.stdout.splitlines() if l.startswith("{")]
+    if p.returncode or not lines:
+        raise RuntimeError(f"{probe} probe failed in {root}:\n{p.stderr[-2000:]}")
+    return json.loads(lines[-1])
+
+def _measure(root: str, base_env: dict, a) -> dict:
+    out = {}
+    for label, probe, env in (("import", "import", {}), ("first_paint", "paint", {}),
+                              ("first_answer_no_warmup", "answer", {"WARMUP": "false"}),
+                              ("first_answer_warmup", "answer", {"WARMUP": "true"})):
+        runs = [_run(root, probe, {**base_env, **env}, a) for _ in range(a.runs)]
+        out[label] = {"median_ms": round(1000 * statistics.median(r["seconds"] for r in runs), 1)}
+        if probe == "import":
+            out[label]["loaded"] = runs[-1]["loaded"]
+        if probe == "paint" and any(r["exception"] for r in runs):
+            out[label]["exception"] = True
+        if probe == "answer":
+            out[label]["import_ms"] = round(1000 * statistics.median(r["import_seconds"] for r in runs), 1)
+            if "warmup" in runs[-1] and runs[-1]["warmup"]["started"]:
+                w = runs[-1]["warmup"]
+                out[label]["warmup_steps_ms"] = {k: round(v * 1000, 1) for k, v in w["steps"].items()}
+                out[label]["warmup_failed"] = sorted(w["errors"])
+    return out
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--probe", choices=sorted(PROBES), help=argparse.SUPPRESS)
+    ap.add_argument("--against", metavar="REV", help="also measure this git revision")
+    ap.add_argument("--think", type=float, default=3.0, help="idle seconds before the first question")
+    ap.add_argument("--runs", type=int, default=3)
+    a = ap.parse_args()
+    if a.probe:
+        # Run as a script from another tree: import rag/bench from that tree, not modules next to this file
+        sys.path[:] = [p for p in sys.path if os.path.abspath(p or ".") != HERE]
+        print(json.dumps(PROBES[a.probe](a), default=str))
+        return
+
+    from bench.stub_openai import serve_in_background
+    srv, url = serve_in_background()
+    tmp = tempfile.mkdtemp()
+    env = {"OPENAI_API_KEY": "sk-offline", "NEO4J_URI": "bolt://127.0.0.1:1", "NEO4J_USER": "neo4j",
+           "NEO4J_PASSWORD": "offline", "OPENAI_BASE_URL": url, "EMBED_CACHE_ENABLED": "false",
+           "RETRIEVAL_CACHE_ENABLED": "false", "ANSWER_CACHE_ENABLED": "false", "ASYNC_RETRIEVAL": "false",
+           "JOBS_DB_PATH": os.path.join(tmp, "jobs.sqlite"), "JOBS_SPOOL_DIR": os.path.join(tmp, "uploads"),
+           "GRAPH_CACHE_DIR": os.path.join(tmp, "graph")}
+    try:
+        out = {"think_s": a.think, "runs": a.runs, "tree": _measure(ROOT, env, a)}
+        if a.against:
+            old = os.path.join(tmp, "against")
+            os.makedirs(old)
+            archive = subprocess.run(["git", "archive", a.against], cwd=ROOT, capture_output=True, check=True).stdout
+            subprocess.run(["tar", "-x", "-C", old], input=archive, check=True)
+            out[a.against] = _measure(old, env, a)
+    finally:
+        srv.shutdown()
+        shutil.rmtree(tmp, ignore_errors=True)
+    print(json.dumps(out, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Neo4j pool sizing: retrieval-shaped read load from concurrent users against the shared driver.
+
+    python -m bench.db_pool "your question" --users 1,4,16,32 --seconds 10
+    NEO4J_POOL_SIZE=8 python -m bench.db_pool "your question" --users 16
+
+Each simulated user runs the single-query retrieval round trip (hybrid_search) in a
+loop with a precomputed embedding, so only Neo4j and the pool are measured. Prints
+throughput, latency percentiles and the pool metrics from rag.db per level; when p95
+climbs while connections in use sit at NEO4J_POOL_SIZE, the pool is the bottleneck.
+"""
+import argparse, json, statistics, threading, time
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("question")
+    ap.add_argument("--users", default="1,4,16")
+    ap.add_argument("--seconds", type=float, default=10)
+    a = ap.parse_args()
+
+    from config import TOP_K
+    from rag import db, store
+    from rag.composer import embed_query
+    qvec = embed_query(a.question)
+    store.hybrid_search(a.question, qvec, TOP_K)  # connect and warm the pool
+
+    rows = []
+    for users in (int(u) for u in a.users.split(",")):
+        lat, peak_in_use = [], 0
+        stop = time.perf_counter() + a.seconds
+        def user():
+            while time.perf_counter() < stop:
+                t0 = time.perf_counter()
+                store.hybrid_search(a.question, qvec, TOP_K)
+                lat.append((time.perf_counter() - t0) * 1000)
+        threads = [threading.Thread(target=user) for _ in range(users)]
+        for t in threads: t.start()
+        while any(t.is_alive() for t in threads):
+            conns = db.metrics()["connections"]
+            peak_in_use = max(peak_in_use, sum(c["in_use"] for c in conns.values()))
+            time.sleep(0.05)
+        s = sorted(lat)
+        rows.append({"users": users, "queries": len(s), "qps": round(len(s) / a.seconds, 1),
+                     "p50_ms": round(s[len(s) // 2], 1), "p95_ms": round(s[int(0.95 * (len(s) - 1))], 1),
+                     "mean_ms": round(statistics.fmean(s), 1), "peak_connections_in_use": peak_in_use})
+    print(json.dumps({"levels": rows, "pool": db.metrics()}, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Embedding profiles: recall, latency and size per vector size and storage type.
+
+    python -m bench.embed_profiles                            # synthetic vectors
+    python -m bench.embed_profiles --dims 1536,1024,512,256 --dtypes float32,float16,int8
+    python -m bench.embed_profiles --neo4j                    # the stored Chunk embeddings
+
+Every profile is a local index (rag.ann_index) of the same vectors truncated to the
+profile's size and stored in the profile's type; truncating is what the
+`dimensions` parameter does, so no re-embedding is needed to compare. Queries are
+perturbed copies of stored vectors, and recall@k is measured against the exact
+full-size float32 top-k. With --neo4j, the vector indexes that exist in Neo4j (see
+python -m rag.embed_profile status) are queried too.
+
+Synthetic vectors give each component a smaller spread than the one before, like
+text-embedding-3's leading components carry the most; real embeddings (--neo4j)
+are the better guide.
+"""
+import argparse, json, os, shutil, statistics, tempfile, time
+import numpy as np
+from bench import offline_env
+from bench.ann import _lat
+
+NEO4J_QUERY = "CALL db.index.vector.queryNodes($index, $k, $qvec) YIELD node, score RETURN node.chunk_id AS id, score"
+
+def _recall(got, exact):
+    return round(statistics.fmean(len({c for c, _ in g} & e) / len(e) for g, e in zip(got, exact)), 4)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--neo4j", action="store_true", help="use the configured Neo4j's stored embeddings")
+    ap.add_argument("--chunks", type=int, default=20000, help="synthetic vectors (without --neo4j)")
+    ap.add_argument("--dims", default="1536,1024,512,256")
+    ap.add_argument("--dtypes", default="float32,float16,int8")
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--k", type=int)
+    ap.add_argument("--noise", type=float, default=0.3, help="query = stored vector + noise * random")
+    a = ap.parse_args()
+
+    if not a.neo4j:
+        offline_env()
+    from config import EMBED_DIM, TOP_K
+    from rag.ann_index import AnnIndex
+    from rag.embed_profile import names, truncate
+    k = a.k or TOP_K
+    rng = np.random.default_rng(0)
+
+    if a.neo4j:
+        from rag import store
+        ids, vecs = zip(*store.iter_embeddings())
+        full = np.asarray(vecs, dtype=np.float32)
+    else:
+        spread = 1 / np.sqrt(1 + np.arange(EMBED_DIM, dtype=np.float32))
+        full = rng.standard_normal((a.chunks, EMBED_DIM), dtype=np.float32) * spread
+        ids = [f"c{i}" for i in range(len(full))]
+    full = truncate(full, full.shape[1])
+    rows = rng.choice(len(full), size=min(a.queries, len(full)), replace=False)
+    dim = full.shape[1]
+    queries = full[rows] + a.noise * rng.standard_normal((len(rows), dim), dtype=np.float32) / np.sqrt(dim)
+
+    exact = []
+    for q in queries:
+        top = np.argpartition(-(full @ q), k - 1)[:k]
+        exact.append({ids[i] for i in top})
+
+    out = {"chunks": len(ids), "dim": dim, "k": k, "profiles": []}
+    root = tempfile.mkdtemp()
+    try:
+        for d in (int(x) for x in a.dims.split(",")):
+            if d > dim:
+                continue
+            m = truncate(full, d)
+            qs = truncate(queries, d)
+            for dtype in a.dtypes.split(","):
+                t0 = time.perf_counter()
+                index = AnnIndex(os.path.join(root, f"{d}-{dtype}"), d, dtype)
+                index.rebuild(zip(ids, m), len(ids))
+                build = time.perf_counter() - t0
+                index.search(qs[0], k)
+                got, lat = _lat(lambda q: index.search(q, k), qs)
+                out["profiles"].append({"dim": d, "dtype": dtype, "recall@k": _recall(got, exact), "local_ms": lat,
+                                        "snapshot_mb": index.stats()["snapshot_mb"], "build_s": round(build, 2)})
+            if a.neo4j:
+                index_name = names(d)[1]
+                state = store.vector_index_state(index_name)
+                if state and state["state"] == "ONLINE":
+                    got, lat = _lat(lambda q: [(r["id"], r["score"]) for r in
+                                               store.db.read(NEO4J_QUERY, index=index_name, qvec=q.tolist(), k=k)], qs)
+                    out["profiles"].append({"dim": d, "dtype": "neo4j", "index": index_name,
+                                            "recall@k": _recall(got, exact), "neo4j_ms": lat})
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    print(json.dumps(out, indent=2))
+
+if __name__ == "__main__":
+    main()
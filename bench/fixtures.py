@@ -0,0 +1,131 @@
+"""
+Synthetic labeled corpus for the offline retrieval benchmark.
+
+Each case study mixes a few "fact" sentences (each paired with a question) into
+paragraphs of generic filler, so answers land at varied offsets and chunk
+boundaries. Questions are labeled with the exact character span of their fact,
+which keeps labels valid whatever CHARS/OVERLAP or chunking mode is used.
+Negative questions have no answer in the corpus and should not be accepted.
+
+Deterministic for a given seed. Custom corpora can be supplied as JSONL instead:
+  corpus:    {"case_id", "title", "url", "text"}
+  questions: {"q", "case_id", "start", "end"}   (case_id null for negatives)
+"""
+import json, random
+from typing import Dict, List, Tuple
+
+CASES = [
+    ("northwind-paper", "Northwind Paper Mill Drive Retrofit", [
+        ("Northwind Paper replaced the dryer section gearboxes during a planned nine-day outage, avoiding any unplanned production downtime.",
+         "How did Northwind Paper avoid unplanned downtime when replacing the dryer gearboxes?"),
+        ("Vibration monitoring on the Northwind winder cut bearing failures from eleven per year to two.",
+         "How many bearing failures per year did the Northwind winder have after vibration monitoring?"),
+        ("The retrofit paid back in 14 months through lower energy use on the variable frequency drives.",
+         "What was the payback period of the paper mill drive retrofit?"),
+    ]),
+    ("lakeshore-water", "Lakeshore Municipal Water Pump Station Upgrade", [
+        ("Lakeshore staged the pump station upgrade one pump at a time so the city never lost more than a third of its pumping capacity.",
+         "How did Lakeshore keep pumping capacity during the pump station upgrade?"),
+        ("Soft starters on the Lakeshore high-lift pumps eliminated the water hammer that had cracked two discharge valves.",
+         "What fixed the water hammer at the Lakeshore high-lift pumps?"),
+        ("SCADA alarm rationalization reduced nuisance alarms at Lakeshore by 70 percent.",
+         "By how much were nuisance alarms reduced at the water utility?"),
+    ]),
+    ("granite-mining", "Granite Ridge Conveyor Reliability Program", [
+        ("Granite Ridge installed belt rip detection on the overland conveyor after a tear shut the mine down for three days.",
+         "Why did Granite Ridge install belt rip detection on the overland conveyor?"),
+        ("Thermal imaging surveys every six weeks caught overheating idlers before they seized.",
+         "How often were thermal imaging surveys done on the conveyor idlers?"),
+        ("Conveyor availability at Granite Ridge rose from 88 to 96 percent in the first year.",
+         "What conveyor availability did Granite Ridge reach in the first year?"),
+    ]),
+    ("harbor-foods", "Harbor Foods Packaging Line Modernization", [
+        ("Harbor Foods moved to washdown-rated servo motors so the packaging line could be sanitized without covering the drives.",
+         "Why did Harbor Foods choose washdown-rated servo motors?"),
+        ("Changeover time on the Harbor Foods tray sealer fell from 45 minutes to 12 minutes with recipe-driven servo positioning.",
+         "How long does a tray sealer changeover take at Harbor Foods now?"),
+        ("The modernization was installed over four weekend shutdowns to avoid disrupting weekday production.",
+         "How was the packaging line modernization scheduled to avoid disrupting production?"),
+    ]),
+    ("summit-hospital", "Summit Regional Hospital Power Resilience", [
+        ("Summit Regional added a second automatic transfer switch so the emergency generator could be serviced without leaving critical loads unprotected.",
+         "How can Summit Regional service its emergency generator while keeping critical loads protected?"),
+        ("Infrared inspection of the hospital switchgear found a loose busbar connection running 40 degrees above ambient.",
+         "What did the infrared inspection of the hospital switchgear find?"),
+        ("Power quality meters now alert facilities staff to voltage sags before imaging equipment trips.",
+         "How are facilities staff warned about voltage sags before imaging equipment trips?"),
+    ]),
+    ("ironbridge-steel", "Ironbridge Steel Rolling Mill Motor Rewind", [
+        ("Ironbridge kept a rewound spare for the roughing mill motor on site, turning a six-week failure into a 36-hour swap.",
+         "How did Ironbridge shorten a roughing mill motor failure to a 36-hour swap?"),
+        ("Partial discharge testing flagged insulation breakdown in the finishing stand motor months before failure.",
+         "Which test flagged insulation breakdown in the finishing stand motor?"),
+        ("The mill standardized on three motor frame sizes to cut its spare parts inventory by a quarter.",
+         "How did the steel mill cut its spare parts inventory?"),
+    ]),
+    ("cedar-logistics", "Cedar Logistics Distribution Center Automation", [
+        ("Cedar Logistics commissioned the new sortation system zone by zone during night shifts so daytime shipping continued.",
+         "How did Cedar Logistics commission the sortation system without stopping daytime shipping?"),
+        ("Predictive maintenance on the Cedar sorter motors reduced emergency work orders by 55 percent.",
+         "By how much did predictive maintenance reduce emergency work orders at Cedar Logistics?"),
+        ("Regenerative drives on the Cedar vertical lifts feed braking energy back to the building supply.",
+         "What happens to braking energy from the vertical lifts at the distribution center?"),
+    ]),
+    ("bluewater-chem", "Bluewater Chemical Hazardous Area Upgrade", [
+        ("Bluewater replaced aging explosion-proof motors in the solvent area with certified Ex d units during the annual turnaround.",
+         "When did Bluewater replace the explosion-proof motors in the solvent area?"),
+        ("Online insulation monitoring on the Bluewater agitator motors removed the need for monthly manual megger tests.",
+         "What replaced the monthly manual megger tests on the agitator motors?"),
+        ("Bluewater's upgrade passed its hazardous area audit with zero findings.",
+         "How did the chemical plant do in its hazardous area audit after the upgrade?"),
+    ]),
+]
+
+FILLER = [
+    "The project team met weekly with operations to agree on work windows.",
+    "Safety briefings were held at the start of every shift throughout the project.",
+    "Spare parts were staged near the work area before each outage began.",
+    "Operators were trained on the new equipment before it entered service.",
+    "Documentation was updated to reflect the as-built configuration.",
+    "Lessons learned were captured and shared with other sites in the group.",
+    "Maintenance planners used the shutdown calendar to sequence the work.",
+    "The client's engineering group reviewed every design change before approval.",
+    "Contractor access was coordinated through the site permit-to-work system.",
+    "Baseline measurements were taken so improvements could be verified afterward.",
+    "Commissioning checklists were signed off by both the vendor and the site.",
+    "A risk assessment identified the critical path activities early on.",
+]
+
+NEGATIVES = [
+    "What is the capital of Australia?",
+    "How do I reset my email password?",
+    "Who won the football world cup in 1998?",
+    "What is a good recipe for banana bread?",
+    "How many moons does Jupiter have?",
+    "What time zone is Tokyo in?",
+]
+
+def build(seed: int = 7, filler_per_paragraph: int = 6) -> Tuple[List[Dict], List[Dict]]:
+    rng = random.Random(seed)
+    docs, questions = [], []
+    for case_id, title, facts in CASES:
+        paragraphs, spans = [f"{title}."], []
+        for fact, q in facts:
+            for _ in range(rng.randint(1, 3)):
+                paragraphs.append(" ".join(rng.sample(FILLER, filler_per_paragraph)))
+            body = rng.sample(FILLER, 4)
+            body.insert(rng.randint(0, 4), fact)
+            paragraphs.append(" ".join(body))
+            spans.append((fact, q))
+        paragraphs.append(" ".join(rng.sample(FILLER, filler_per_paragraph)))
+        text = "\n\n".join(paragraphs)
+        for fact, q in spans:
+            start = text.index(fact)
+            questions.append({"q": q, "case_id": case_id, "start": start, "end": start + len(fact)})
+        docs.append({"case_id": case_id, "title": title, "url": f"https://example.com/{case_id}", "text": text})
+    questions += [{"q": q, "case_id": None, "start": None, "end": None} for q in NEGATIVES]
+    return docs, questions
+
+def load_jsonl(path: str) -> List[Dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
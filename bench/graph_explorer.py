@@ -0,0 +1,57 @@
+"""
+Graph explorer: the old capped full-graph pull vs the projected, cached views.
+
+    python -m bench.graph_explorer                 # against the configured Neo4j
+    python -m bench.graph_explorer --max-nodes 5000
+
+"legacy" reruns the old queries (properties(n) for the first N nodes, then the
+relationships among them) and the PyVis render; "overview" is render_html() with an
+empty cache, then again warm. Reports seconds and HTML size for each.
+"""
+import argparse, json, shutil, tempfile, time
+
+LEGACY_NODES = "MATCH (n) RETURN id(n) AS id, labels(n) AS labels, properties(n) AS props ORDER BY id(n) LIMIT $limit"
+LEGACY_RELS = """
+MATCH (n)-[r]->(m)
+WHERE id(n) IN $ids AND id(m) IN $ids
+RETURN id(r) AS id, id(n) AS src, id(m) AS dst, type(r) AS type, properties(r) AS props
+"""
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--max-nodes", type=int, default=1000)
+    a = ap.parse_args()
+
+    from pyvis.network import Network
+    from rag import db, graph_explorer
+    out = {"counts": graph_explorer.counts()}
+
+    t0 = time.perf_counter()
+    with db.session(read=True) as s:
+        nodes = s.run(LEGACY_NODES, limit=a.max_nodes).data()
+        rels = s.run(LEGACY_RELS, ids=[r["id"] for r in nodes] or [-1]).data()
+    t1 = time.perf_counter()
+    net = Network(height="780px", width="100%", directed=True)
+    for r in nodes:
+        net.add_node(r["id"], label=str(r["id"]), title=json.dumps(r["props"], default=str)[:4000])
+    for r in rels:
+        net.add_edge(r["src"], r["dst"], label=r["type"])
+    html = net.generate_html(notebook=False)
+    out["legacy"] = {"query_s": round(t1 - t0, 3), "total_s": round(time.perf_counter() - t0, 3),
+                     "nodes": len(nodes), "rels": len(rels), "html_kb": round(len(html) / 1024, 1)}
+
+    graph_explorer.GRAPH_CACHE_DIR = tempfile.mkdtemp()
+    try:
+        for run in ("cold", "warm"):
+            t0 = time.perf_counter()
+            info = {}
+            html = graph_explorer.render_html(page_size=a.max_nodes, stats=info)
+            out[f"overview_{run}"] = {"total_s": round(time.perf_counter() - t0, 3), "cached": info["cached"],
+                                      "html_kb": round(len(html) / 1024, 1)}
+    finally:
+        shutil.rmtree(graph_explorer.GRAPH_CACHE_DIR, ignore_errors=True)
+    out["pool"] = db.metrics()
+    print(json.dumps(out, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+Single-query vs multi-query retrieval against the configured Neo4j database.
+
+    python -m bench.hybrid_query "How do we cut installation downtime?" --runs 10
+
+Query embeddings are computed once up front so only the Neo4j side is timed.
+"""
+import argparse, json, statistics, time
+from rag import retriever
+from rag.composer import embed_query
+
+def _time_path(questions, single: bool, runs: int):
+    retriever.SINGLE_QUERY_RETRIEVAL = single
+    retriever.retrieval_cache.RETRIEVAL_CACHE_ENABLED = False  # every run must reach Neo4j
+    lat = []
+    for _ in range(runs):
+        for q in questions:
+            t0 = time.perf_counter()
+            retriever.retrieve_topn(q)
+            lat.append((time.perf_counter() - t0) * 1000)
+    lat.sort()
+    return {
+        "queries": len(lat),
+        "p50_ms": round(statistics.median(lat), 1),
+        "p95_ms": round(lat[int(0.95 * (len(lat) - 1))], 1),
+        "mean_ms": round(statistics.fmean(lat), 1),
+    }
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("questions", nargs="+")
+    ap.add_argument("--runs", type=int, default=5)
+    args = ap.parse_args()
+
+    vecs = {q: embed_query(q) for q in args.questions}
+    retriever.embed_query = vecs.__getitem__
+
+    # Warm the driver's connection pool before timing either path
+    _time_path(args.questions, True, 1)
+    out = {
+        "single_query": _time_path(args.questions, True, args.runs),
+        "multi_query": _time_path(args.questions, False, args.runs),
+    }
+    print(json.dumps(out, indent=2))
+
+if __name__ == "__main__":
+    main()
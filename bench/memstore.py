@@ -0,0 +1,140 @@
+"""
+In-process stand-in for rag.store plus a deterministic embedder, for offline benchmarks.
+
+MemoryStore exposes the same functions and row shapes as rag.store (fulltext, vector,
+get_context, hybrid_search, upsert_chunks, get_case_hashes, finish_case, ensure_indexes).
+hash_embed is a feature-hashed bag of words: similar wording gives similar vectors,
+with no network and no randomness.
+"""
+import hashlib, math, re
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
+import numpy as np
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall(text.lower())
+
+def hash_embed(text: str, dim: int = 1536) -> List[float]:
+    v = np.zeros(dim, dtype=np.float32)
+    toks = tokenize(text)
+    for a, b in zip(toks, toks[1:] + [""]):
+        for feat, w in ((a, 1.0), (f"{a} {b}", 0.5)):
+            h = int.from_bytes(hashlib.blake2b(feat.encode(), digest_size=8).digest(), "little")
+            v[h % dim] += w if (h >> 63) else -w
+    n = np.linalg.norm(v)
+    return (v / n if n else v).tolist()
+
+class MemoryStore:
+    def __init__(self):
+        self.cases: Dict[str, Dict] = {}
+        self.chunks: Dict[str, Dict] = {}
+        self.case_of: Dict[str, str] = {}
+        self._matrix: Optional[np.ndarray] = None
+        self._ids: List[str] = []
+        self._postings: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self._lengths: Dict[str, int] = {}
+        self.version = 0
+
+    # --- writes ---
+    def ensure_indexes(self, dim: int):
+        pass
+
+    def upsert_chunks(self, case: dict, rows: List[dict], batch_size: int = 0, bulk: bool = False,
+                      stats: Optional[Dict] = None):
+        self.cases.setdefault(case["case_id"], {k: case.get(k) for k in ("case_id", "title", "url")})
+        for r in rows:
+            cid = r["chunk_id"]
+            if bulk and cid in self.chunks:
+                raise ValueError(f"chunk_id {cid} already exists")
+            emb = r["embedding"] if r.get("embedding") is not None else self.chunks[cid]["embedding"]
+            self._unindex(cid)
+            self.chunks[cid] = {"chunk_id": cid, "text": r["text"], "order": r["order"],
+                                "char_start": r["start"], "char_end": r["end"], "embedding": emb,
+                                **{k: r[k] for k in r if k not in ("chunk_id", "text", "order", "start", "end", "embedding")}}
+            self.case_of[cid] = case["case_id"]
+            tf = Counter(tokenize(r["text"]))
+            for t, n in tf.items():
+                self._postings[t][cid] = n
+            self._lengths[cid] = sum(tf.values())
+        self._matrix = None
+        if stats is not None:
+            stats.update(chunks=len(rows), batches=1, seconds=0.0, chunks_per_sec=0.0)
+
+    def get_case_hashes(self, case_id: str):
+        if case_id not in self.cases:
+            return None, {}
+        return self.cases[case_id].get("doc_hash"), {
+            c: (self.chunks[c].get("content_hash"), self.chunks[c]["char_start"], self.chunks[c]["char_end"])
+            for c, cs in self.case_of.items() if cs == case_id}
+
+    def finish_case(self, case_id: str, keep: List[str], doc_hash: str) -> int:
+        if case_id not in self.cases:
+            return 0
+        self.cases[case_id]["doc_hash"] = doc_hash
+        stale = [c for c, cs in self.case_of.items() if cs == case_id and c not in set(keep)]
+        for c in stale:
+            self._unindex(c)
+            del self.chunks[c], self.case_of[c]
+        self._matrix = None
+        return len(stale)
+
+    def corpus_version(self, max_age: float = 0.0) -> int:
+        return self.version
+
+    def bump_corpus_version(self) -> int:
+        self.version += 1
+        return self.version
+
+    def _unindex(self, cid: str):
+        if cid in self.chunks:
+            for t in set(tokenize(self.chunks[cid]["text"])):
+                self._postings[t].pop(cid, None)
+            self._lengths.pop(cid, None)
+
+    # --- reads (same shapes as rag.store) ---
+    def fulltext(self, q: str, k: int):
+        # Lucene-style BM25 (k1=1.2, b=0.75) over the same naive tokenization
+        N = len(self._lengths) or 1
+        avg = sum(self._lengths.values()) / N if self._lengths else 1.0
+        scores: Dict[str, float] = defaultdict(float)
+        for t in set(tokenize(q)):
+            post = self._postings.get(t)
+            if not post:
+                continue
+            idf = math.log(1 + (N - len(post) + 0.5) / (len(post) + 0.5))
+            for cid, tf in post.items():
+                dl = self._lengths[cid]
+                scores[cid] += idf * tf * 2.2 / (tf + 1.2 * (0.25 + 0.75 * dl / avg))
+        best = sorted(scores.items(), key=lambda x: x[1], reverse=True)[:k]
+        return [{"chunk": self.chunks[c], "score": s} for c, s in best]
+
+    def vector(self, qvec: List[float], k: int):
+        if self._matrix is None:
+            self._ids = list(self.chunks)
+            m = np.asarray([self.chunks[c]["embedding"] for c in self._ids], dtype=np.float32)
+            self._matrix = m / (np.linalg.norm(m, axis=1, keepdims=True) + 1e-9) if len(m) else m
+        if not self._ids:
+            return []
+        q = np.asarray(qvec, dtype=np.float32)
+        sims = self._matrix @ (q / (np.linalg.norm(q) + 1e-9))
+        top = np.argsort(-sims)[:k]
+        # Neo4j's cosine vector index reports (1 + cos) / 2
+        return [{"chunk": self.chunks[self._ids[i]], "score": float((1 + sims[i]) / 2)} for i in top]
+
+    def get_context(self, chunk_id: str):
+        c = self.chunks.get(chunk_id)
+        if c is None:
+            return None
+        cs = self.cases[self.case_of[chunk_id]]
+        return {"case_id": cs["case_id"], "title": cs["title"], "url": cs["url"], "chunk_id": chunk_id,
+                "text": c["text"], "ord": c["order"], "s": c["char_start"], "e": c["char_end"],
+                "page": c.get("page"), "section": c.get("section"), "vec": c["embedding"]}
+
+    def hybrid_search(self, q: str, qvec: List[float], k: int):
+        rows = []
+        for src, hits in (("sem", self.vector(qvec, k)), ("lex", self.fulltext(q, k))):
+            for h in hits:
+                rows.append({"src": src, "score": h["score"], **self.get_context(h["chunk"]["chunk_id"])})
+        return rows
@@ -0,0 +1,60 @@
+"""
+MMR re-ranking micro-benchmark: the old per-pair Python loop vs the vectorized routine.
+
+    python -m bench.mmr --top-k 100 200 400 --top-n 3 10 25
+"""
+import argparse, json, time
+import numpy as np
+from bench import offline_env
+
+def legacy_mmr(cands, lam=0.7, n=3):
+    def cos(a, b):
+        a = np.array(a); b = np.array(b)
+        return float(np.dot(a, b) / float(np.linalg.norm(a) * np.linalg.norm(b) + 1e-9))
+    selected = [cands[0]]
+    remaining = cands[1:]
+    while len(selected) < n and remaining:
+        best_item = None; best_score = -1e9
+        for item in remaining:
+            sim = max([cos(item['vec'], s['vec']) for s in selected] or [0])
+            score = lam * item['hybrid'] - (1 - lam) * sim
+            if score > best_score:
+                best_score, best_item = score, item
+        selected.append(best_item)
+        remaining = [r for r in remaining if r is not best_item]
+    return selected
+
+def _cands(k: int, dim: int, rng):
+    vecs = rng.standard_normal((k, dim)).astype(np.float32)
+    scores = np.sort(rng.random(k))[::-1]
+    return [{'cid': f"c{i}", 'hybrid': float(scores[i]), 'vec': vecs[i].tolist()} for i in range(k)]
+
+def _ms(fn, reps):
+    t0 = time.perf_counter()
+    for _ in range(reps):
+        out = fn()
+    return (time.perf_counter() - t0) * 1000 / reps, out
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--top-k", type=int, nargs="+", default=[100, 200, 400])
+    ap.add_argument("--top-n", type=int, nargs="+", default=[3, 10, 25])
+    ap.add_argument("--dim", type=int, default=1536)
+    ap.add_argument("--reps", type=int, default=3)
+    a = ap.parse_args()
+    offline_env()
+    from rag.retriever import mmr
+
+    rng = np.random.default_rng(0)
+    rows = []
+    for k in a.top_k:
+        cands = _cands(k, a.dim, rng)
+        for n in a.top_n:
+            old_ms, old = _ms(lambda: legacy_mmr(cands, n=n), a.reps)
+            new_ms, new = _ms(lambda: mmr(cands, n=n), a.reps)
+            rows.append({"top_k": k, "top_n": n, "legacy_ms": round(old_ms, 2), "vectorized_ms": round(new_ms, 2),
+                         "same_selection": [c['cid'] for c in old] == [c['cid'] for c in new]})
+    print(json.dumps(rows, indent=2))
+
+if __name__ == "__main__":
+    main()
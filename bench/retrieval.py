@@ -0,0 +1,290 @@
+"""
+Offline retrieval benchmark: quality (recall@k, MRR, acceptance) and latency of retrieve_topn.
+
+    python -m bench.retrieval                                    # in-memory store + hashed fake embedder
+    python -m bench.retrieval --alpha 0.4 --chars 900 --overlap 150
+    python -m bench.retrieval --chunk-mode layout --pdf              # fixtures rendered to PDF first
+    python -m bench.retrieval --store neo4j                      # load fixtures into the configured (local!) Neo4j
+    python -m bench.retrieval --embedder openai                  # real embeddings (cached on disk)
+    python -m bench.retrieval --fusion rrf --hybrid-accept 0.8   # minmax | rrf | calibrated (default FUSION)
+    python -m bench.retrieval --tune                             # accept threshold per fusion strategy
+    python -m bench.retrieval --compare bench_results/a.json bench_results/b.json
+
+Every run writes a JSON result (config, git commit, metrics, per-question scores)
+to --out, default bench_results/retrieval-<commit>-<time>.json. `prompt_tokens` is the
+size of the grounded-answer prompt built from each question's retrieved chunks, after
+context packing; `unpacked` is what the chunks' text alone would have cost without it.
+
+The calibrated strategy is fitted on the loaded corpus before the replay (a temporary
+calibration file; the app's is untouched). --tune replays the questions once per
+strategy and picks the HYBRID_ACCEPT threshold that best separates questions whose
+answer was retrieved from the rest (max TPR - FPR), as a HYBRID_ACCEPT value. Tune on
+a labeled set of real questions (--corpus/--questions, --embedder openai): thresholds
+from the synthetic fixtures and the fake embedder say nothing about production scores.
+"""
+import argparse, json, os, random, re, statistics, subprocess, tempfile, time
+from bench import offline_env
+from bench.fixtures import build, load_jsonl
+
+NEO4J_PREFIX = "bench-"
+NEO4J_CLEANUP = """
+MATCH (cs:CaseStudy) WHERE cs.case_id STARTS WITH $prefix
+OPTIONAL MATCH (cs)-[:HAS_CHUNK]->(ch)
+DETACH DELETE cs, ch
+"""
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return "unknown"
+
+def _pct(xs, p):
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(round(p / 100 * (len(xs) - 1))))]
+
+def _norm(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+def _relevant(c, q) -> bool:
+    if c["case_id"] != q["case_id"]:
+        return False
+    if "fact" in q:
+        # PDF runs: offsets refer to the extracted text, so match on either half of the fact
+        fact, text = _norm(q["fact"]), _norm(c["text"])
+        return fact[:len(fact) // 2] in text or fact[len(fact) // 2:] in text
+    overlap = min(c["end"], q["end"]) - max(c["start"], q["start"])
+    return overlap >= 0.5 * (q["end"] - q["start"])
+
+def _render_pdf(doc: dict, path: str):
+    # Title as a large-font heading, then one text box per paragraph, flowing over pages
+    import fitz
+    pdf = fitz.open()
+    page, y = pdf.new_page(), 50
+    paras = [(doc["title"], 16)] + [(p, 10) for p in doc["text"].split("\n\n")[1:]]
+    for text, size in paras:
+        while True:
+            rect = fitz.Rect(50, y, page.rect.width - 50, page.rect.height - 50)
+            left = page.insert_textbox(rect, text, fontsize=size)
+            if left >= 0:
+                y = page.rect.height - 50 - left + size
+                break
+            page, y = pdf.new_page(), 50
+    pdf.save(path)
+    pdf.close()
+
+def _args():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--store", choices=["memory", "neo4j"], default="memory")
+    ap.add_argument("--embedder", choices=["fake", "openai"], default="fake")
+    ap.add_argument("--path", choices=["single", "multi"], default="single", help="retrieval query path")
+    ap.add_argument("--alpha", type=float)
+    ap.add_argument("--top-k", type=int)
+    ap.add_argument("--top-n", type=int)
+    ap.add_argument("--hybrid-accept", type=float)
+    ap.add_argument("--fusion", choices=["minmax", "rrf", "calibrated"], help="default FUSION")
+    ap.add_argument("--tune", action="store_true", help="tune the accept threshold of every fusion strategy")
+    ap.add_argument("--chars", type=int)
+    ap.add_argument("--overlap", type=int)
+    ap.add_argument("--chunk-mode", help="chars | tokens | sentences | layout (default CHUNK_MODE)")
+    ap.add_argument("--chunk-tokens", type=int)
+    ap.add_argument("--chunk-overlap-tokens", type=int)
+    ap.add_argument("--pdf", action="store_true", help="render fixture docs to PDF and ingest those")
+    ap.add_argument("--corpus", help="JSONL corpus (default: built-in synthetic fixtures)")
+    ap.add_argument("--questions", help="JSONL labeled questions (required with --corpus)")
+    ap.add_argument("--repeat", type=int, default=3, help="replays of the question set for latency")
+    ap.add_argument("--out")
+    ap.add_argument("--compare", nargs=2, metavar=("A", "B"))
+    return ap.parse_args()
+
+def _tune(questions, retriever, relevant) -> dict:
+    out = {}
+    for name in retriever.FUSIONS:
+        retriever.FUSION = name
+        rows = []
+        for q in questions:
+            top, best = retriever.retrieve_topn(q["q"])
+            rank = next((i + 1 for i, c in enumerate(top) if q["case_id"] and relevant(c, q)), None)
+            rows.append((float(best) if top else 0.0, rank is not None, rank))
+        good = [b for b, ok, _ in rows if ok]
+        bad = [b for b, ok, _ in rows if not ok]
+        best_t, best_j = 0.0, -1.0
+        cuts = sorted({b for b, _, _ in rows})
+        for lo, hi in zip([0.0] + cuts, cuts + [cuts[-1] + 1e-3 if cuts else 1.0]):
+            # Midpoint between neighbouring scores, so the threshold isn't sitting on a sample
+            t = (lo + hi) / 2
+            tpr = sum(b >= t for b in good) / len(good) if good else 0.0
+            fpr = sum(b >= t for b in bad) / len(bad) if bad else 0.0
+            if tpr - fpr > best_j:
+                best_t, best_j = t, tpr - fpr
+        n = sum(1 for q in questions if q["case_id"])
+        out[name] = {"threshold": round(best_t, 4), "youden_j": round(best_j, 4),
+                     "accept_rate_answerable": round(sum(b >= best_t for b in good) / len(good), 4) if good else 0.0,
+                     "accept_rate_other": round(sum(b >= best_t for b in bad) / len(bad), 4) if bad else 0.0,
+                     "mrr": round(sum(1 / r for _, _, r in rows if r) / n, 4) if n else 0.0,
+                     "best_answerable_mean": round(statistics.fmean(good), 4) if good else None,
+                     "best_other_mean": round(statistics.fmean(bad), 4) if bad else None}
+    return out
+
+def compare(a_path: str, b_path: str):
+    a, b = (json.load(open(p, encoding="utf-8")) for p in (a_path, b_path))
+    rows = {}
+    for section in ("quality", "latency_ms", "prompt_tokens"):
+        for k, va in a.get(section, {}).items():
+            vb = b.get(section, {}).get(k)
+            if isinstance(va, (int, float)) and isinstance(vb, (int, float)):
+                rows[f"{section}.{k}"] = {"a": va, "b": vb, "delta": round(vb - va, 4)}
+    rows["qps"] = {"a": a["qps"], "b": b["qps"], "delta": round(b["qps"] - a["qps"], 1)}
+    print(json.dumps({"a": a["commit"], "b": b["commit"], "metrics": rows}, indent=2))
+
+def main():
+    a = _args()
+    if a.compare:
+        return compare(*a.compare)
+
+    # Offline runs must not touch the shared embedding cache or real services
+    env = {} if a.embedder == "openai" else {"EMBED_CACHE_ENABLED": "false"}
+    env["RETRIEVAL_CACHE_ENABLED"] = "false"  # repeats must measure retrieval, not the cache
+    env["FUSION_CALIBRATION_PATH"] = os.path.join(tempfile.mkdtemp(), "calibration.json")
+    if a.hybrid_accept is not None:
+        env["HYBRID_ACCEPT"] = str(a.hybrid_accept)
+    elif a.fusion not in (None, "minmax") and not os.getenv("HYBRID_ACCEPT"):
+        raise SystemExit(f"--fusion {a.fusion} needs --hybrid-accept (its scores are not on the minmax scale); "
+                         "run --tune without --fusion to find one")
+    for flag, key in ((a.fusion, "FUSION"), (a.chunk_mode, "CHUNK_MODE"), (a.chunk_tokens, "CHUNK_TOKENS"),
+                      (a.chunk_overlap_tokens, "CHUNK_OVERLAP_TOKENS")):
+        if flag is not None:
+            env[key] = flag
+    offline_env(**env)
+    os.environ["ASYNC_RETRIEVAL"] = "false"
+    from config import EMBED_DIM, HYBRID_ACCEPT, CHUNK_MODE, CHUNK_TOKENS, CHUNK_OVERLAP_TOKENS, FUSION
+    from rag import retriever, ingest, chunking, calibration
+    from rag.composer import _grounded_messages
+
+    if a.alpha is not None: retriever.ALPHA = a.alpha
+    if a.top_k is not None: retriever.TOP_K = a.top_k
+    if a.top_n is not None: retriever.TOP_N = a.top_n
+    if a.chars is not None: chunking.CHARS = a.chars
+    if a.overlap is not None: chunking.OVERLAP = a.overlap
+    retriever.SINGLE_QUERY_RETRIEVAL = a.path == "single"
+    accept = HYBRID_ACCEPT
+
+    if a.corpus:
+        docs, questions = load_jsonl(a.corpus), load_jsonl(a.questions)
+    else:
+        docs, questions = build()
+    if a.pdf:
+        by_case = {d["case_id"]: d for d in docs}
+        for q in questions:
+            if q["case_id"]:
+                q["fact"] = by_case[q["case_id"]]["text"][q["start"]:q["end"]]
+        pdf_dir = tempfile.mkdtemp()
+        for d in docs:
+            d["pdf"] = os.path.join(pdf_dir, f"{d['case_id']}.pdf")
+            _render_pdf(d, d["pdf"])
+
+    if a.embedder == "fake":
+        from bench.memstore import hash_embed
+        embed_one = lambda t: hash_embed(t, EMBED_DIM)
+        retriever.embed_query = embed_one
+        ingest.embed_texts = lambda ts, stats=None: [embed_one(t) for t in ts]
+
+    if a.store == "memory":
+        from bench.memstore import MemoryStore
+        store = MemoryStore()
+        for name in ("fulltext", "vector", "get_context", "hybrid_search"):
+            setattr(retriever, name, getattr(store, name))
+        for name in ("upsert_chunks", "get_case_hashes", "finish_case", "bump_corpus_version"):
+            setattr(ingest, name, getattr(store, name))
+        prefix = ""
+    else:
+        from rag import store
+        store.ensure_indexes(EMBED_DIM)
+        prefix = NEO4J_PREFIX
+        for d in docs: d["case_id"] = prefix + d["case_id"]
+        for q in questions:
+            if q["case_id"]: q["case_id"] = prefix + q["case_id"]
+        with store.get_session() as s:
+            s.run(NEO4J_CLEANUP, prefix=prefix).consume()
+
+    # --- load ---
+    t0 = time.perf_counter()
+    n_chunks = 0
+    for d in docs:
+        text = ingest.iter_units([d["pdf"]], layout=CHUNK_MODE == "layout") if a.pdf else d["text"]
+        r = ingest.ingest_text({"case_id": d["case_id"], "title": d["title"], "url": d.get("url")}, text)
+        n_chunks += r["chunks"]
+    if a.store == "neo4j":
+        with store.get_session() as s:
+            s.run("CALL db.awaitIndexes(300)").consume()
+    load_s = time.perf_counter() - t0
+    if FUSION == "calibrated" or a.tune:
+        texts = [c["text"] for c in store.chunks.values()] if a.store == "memory" else store.sample_texts(200)
+        queries = calibration.pseudo_queries(texts, random.Random(0))
+        calibration.save(calibration.fit(queries, lambda q: retriever._multi_query(q, retriever.embed_query(q))[:2]))
+
+    # --- replay ---
+    try:
+        per_q, lat, prompt, unpacked = [], [], [], []
+        t_all = time.perf_counter()
+        for rep in range(a.repeat):
+            for q in questions:
+                t1 = time.perf_counter()
+                top, best = retriever.retrieve_topn(q["q"])
+                lat.append((time.perf_counter() - t1) * 1000)
+                if rep == 0:
+                    packing = {}
+                    _grounded_messages(q["q"], top, packing)
+                    prompt.append(packing["prompt_tokens"])
+                    unpacked.append(packing["prompt_tokens"] - packing["tokens_out"] + packing["tokens_in"])
+                    rank = next((i + 1 for i, c in enumerate(top) if q["case_id"] and _relevant(c, q)), None)
+                    per_q.append({"q": q["q"], "positive": q["case_id"] is not None, "rank": rank,
+                                  "best": round(float(best), 4), "accepted": bool(top) and best >= accept,
+                                  "case_hit": any(c["case_id"] == q["case_id"] for c in top)})
+        wall = time.perf_counter() - t_all
+        tuned = _tune(questions, retriever, _relevant) if a.tune else None
+    finally:
+        if a.store == "neo4j":
+            with store.get_session() as s:
+                s.run(NEO4J_CLEANUP, prefix=prefix).consume()
+
+    pos = [r for r in per_q if r["positive"]]
+    neg = [r for r in per_q if not r["positive"]]
+    n = retriever.TOP_N
+    quality = {
+        "recall@1": sum(1 for r in pos if r["rank"] == 1) / len(pos) if pos else 0.0,
+        f"recall@{n}": sum(1 for r in pos if r["rank"]) / len(pos) if pos else 0.0,
+        "mrr": sum(1 / r["rank"] for r in pos if r["rank"]) / len(pos) if pos else 0.0,
+        "case_recall": sum(1 for r in pos if r["case_hit"]) / len(pos) if pos else 0.0,
+        "accept_rate_positive": sum(r["accepted"] for r in pos) / len(pos) if pos else 0.0,
+        "accept_rate_negative": sum(r["accepted"] for r in neg) / len(neg) if neg else 0.0,
+    }
+    result = {
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {"store": a.store, "embedder": a.embedder, "path": a.path, "fusion": FUSION, "alpha": retriever.ALPHA,
+                   "top_k": retriever.TOP_K, "top_n": n, "hybrid_accept": accept,
+                   "chunk_mode": CHUNK_MODE, "chars": chunking.CHARS, "overlap": chunking.OVERLAP,
+                   "chunk_tokens": CHUNK_TOKENS, "chunk_overlap_tokens": CHUNK_OVERLAP_TOKENS, "pdf": a.pdf},
+        "corpus": {"docs": len(docs), "chunks": n_chunks, "questions": len(pos), "negatives": len(neg),
+                   "load_seconds": round(load_s, 3)},
+        "quality": {k: round(v, 4) for k, v in quality.items()},
+        "latency_ms": {"p50": round(_pct(lat, 50), 3), "p95": round(_pct(lat, 95), 3),
+                       "p99": round(_pct(lat, 99), 3), "mean": round(statistics.fmean(lat), 3)},
+        "qps": round(len(lat) / wall, 1),
+        "prompt_tokens": {"mean": round(statistics.fmean(prompt), 1), "p95": _pct(prompt, 95),
+                          "unpacked_mean": round(statistics.fmean(unpacked), 1)},
+        "per_question": per_q,
+    }
+    if tuned:
+        result["tune"] = tuned
+    out = a.out or os.path.join("bench_results", f"retrieval-{result['commit']}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(json.dumps({k: v for k, v in result.items() if k != "per_question"}, indent=2))
+    print(f"wrote {out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Retrieval result cache (rag.retrieval_cache): miss vs memory hit vs disk hit, and invalidation.
+
+    python -m bench.retrieval_cache                          # offline: in-memory store, fake embedder
+    python -m bench.retrieval_cache --embed-ms 150 --search-ms 40
+    python -m bench.retrieval_cache --live "question one" "question two"
+
+Offline, the bench corpus is loaded into bench.memstore and every question is
+retrieved three times: cold (miss), again (memory hit), and after the in-memory
+entries are cleared (hit from the RETRIEVAL_CACHE_PATH file, as another process
+would see). --embed-ms / --search-ms add the latency of the OpenAI and Neo4j round
+trips the cache saves. Then one case study is re-ingested, which bumps the corpus
+version, and the questions are asked once more: every entry must be dropped as stale.
+--live runs the same three rounds against the configured services.
+"""
+import argparse, json, os, statistics, tempfile, time
+from bench import offline_env
+from bench.fixtures import build
+
+def _round(retriever, questions):
+    lat, cached = [], 0
+    for q in questions:
+        info = {}
+        t0 = time.perf_counter()
+        retriever.retrieve_topn(q, info)
+        lat.append((time.perf_counter() - t0) * 1000)
+        cached += info["cached"]
+    s = sorted(lat)
+    return {"p50_ms": round(s[len(s) // 2], 3), "mean_ms": round(statistics.fmean(s), 3), "cached": cached}
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--live", nargs="+", metavar="QUESTION", help="use the configured OpenAI + Neo4j")
+    ap.add_argument("--embed-ms", type=float, default=0.0, help="offline: simulated embedding latency")
+    ap.add_argument("--search-ms", type=float, default=0.0, help="offline: simulated Neo4j latency")
+    a = ap.parse_args()
+
+    env = {"RETRIEVAL_CACHE_ENABLED": "true",
+           "RETRIEVAL_CACHE_PATH": os.path.join(tempfile.mkdtemp(), "retrieval.sqlite")}
+    if a.live:
+        os.environ.update(env)
+    else:
+        offline_env(EMBED_CACHE_ENABLED="false", ASYNC_RETRIEVAL="false", **env)
+    from rag import retriever, retrieval_cache, ingest
+
+    if a.live:
+        questions = a.live
+    else:
+        from bench.memstore import MemoryStore, hash_embed
+        store = MemoryStore()
+        def slow(fn, ms):
+            return lambda *args, **kw: (time.sleep(ms / 1000), fn(*args, **kw))[1]
+        retriever.embed_query = slow(lambda t: hash_embed(t), a.embed_ms)
+        ingest.embed_texts = lambda ts, stats=None: [hash_embed(t) for t in ts]
+        for name in ("fulltext", "vector", "get_context"):
+            setattr(retriever, name, getattr(store, name))
+        retriever.hybrid_search = slow(store.hybrid_search, a.search_ms)
+        for name in ("upsert_chunks", "get_case_hashes", "finish_case", "bump_corpus_version"):
+            setattr(ingest, name, getattr(store, name))
+        retrieval_cache.corpus_version = store.corpus_version
+        docs, qs = build()
+        for d in docs:
+            ingest.ingest_text({"case_id": d["case_id"], "title": d["title"], "url": d.get("url")}, d["text"])
+        questions = [q["q"] for q in qs]
+
+    out = {"questions": len(questions), "miss": _round(retriever, questions), "memory_hit": _round(retriever, questions)}
+    with retrieval_cache._lock:
+        retrieval_cache._entries.clear()
+        retrieval_cache._bytes = 0
+    out["disk_hit"] = _round(retriever, questions)
+    if not a.live:
+        d = docs[0]
+        ingest.ingest_text({"case_id": d["case_id"], "title": d["title"], "url": d.get("url")}, d["text"] + " Revised.")
+        out["after_ingest"] = _round(retriever, questions)
+    out["stats"] = retrieval_cache.stats()
+    print(json.dumps(out, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Minimal OpenAI-compatible embeddings + chat server for offline benchmarks.
+
+    python -m bench.stub_openai --port 8099 --latency-ms 150 --rate-limit-every 7
+    OPENAI_BASE_URL=http://127.0.0.1:8099/v1 ...
+
+Vectors are deterministic per (text, dimensions), so repeated runs are comparable.
+Chat completions echo a canned answer, streamed word by word when `stream` is set.
+"""
+import argparse, hashlib, json, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+
+def fake_vector(text: str, dim: int = 1536) -> list:
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    v = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return (v / np.linalg.norm(v)).tolist()
+
+def make_server(port: int = 0, latency_ms: float = 0.0, rate_limit_every: int = 0, dim: int = 1536):
+    state = {"requests": 0, "inputs": 0, "throttled": 0}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *a):
+            pass
+
+        def _send(self, code, body, headers=None):
+            raw = json.dumps(body).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(raw)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(raw)
+
+        def _chat(self, req):
+            words = ("Stub answer grounded in the provided sources. " * 8).split(" ")
+            if latency_ms:
+                time.sleep(latency_ms / 1000)
+            if not req.get("stream"):
+                return self._send(200, {
+                    "id": "stub", "object": "chat.completion", "created": 0, "model": req.get("model", "stub"),
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": " ".join(words)}}],
+                })
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.end_headers()
+            for w in words:
+                chunk = {"id": "stub", "object": "chat.completion.chunk", "created": 0,
+                         "model": req.get("model", "stub"),
+                         "choices": [{"index": 0, "delta": {"content": w + " "}, "finish_reason": None}]}
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                self.wfile.flush()
+                time.sleep(0.005)
+            self.wfile.write(b"data: [DONE]\n\n")
+
+        def do_POST(self):
+            req = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            if self.path.rstrip("/").endswith("/chat/completions"):
+                return self._chat(req)
+            if not self.path.rstrip("/").endswith("/embeddings"):
+                return self._send(404, {"error": {"message": "not found"}})
+            inputs = req.get("input", [])
+            inputs = [inputs] if isinstance(inputs, str) else inputs
+            with lock:
+                state["requests"] += 1
+                n = state["requests"]
+            if rate_limit_every and n % rate_limit_every == 0:
+                with lock:
+                    state["throttled"] += 1
+                return self._send(429, {"error": {"message": "rate limited", "type": "requests"}},
+                                  {"retry-after": "0.05"})
+            if latency_ms:
+                time.sleep(latency_ms / 1000)
+            with lock:
+                state["inputs"] += len(inputs)
+            d = int(req.get("dimensions") or dim)
+            self._send(200, {
+                "object": "list",
+                "model": req.get("model", "stub"),
+                "data": [{"object": "embedding", "index": i, "embedding": fake_vector(t, d)}
+                         for i, t in enumerate(inputs)],
+                "usage": {"prompt_tokens": 0, "total_tokens": 0},
+            })
+
+    srv = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    srv.daemon_threads = True
+    srv.stats = state
+    return srv
+
+def serve_in_background(**kw):
+    srv = make_server(**kw)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv, f"http://127.0.0.1:{srv.server_address[1]}/v1"
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--port", type=int, default=8099)
+    ap.add_argument("--latency-ms", type=float, default=0.0)
+    ap.add_argument("--rate-limit-every", type=int, default=0)
+    ap.add_argument("--dim", type=int, default=1536)
+    a = ap.parse_args()
+    srv = make_server(a.port, a.latency_ms, a.rate_limit_every, a.dim)
+    print(f"Stub OpenAI embeddings on http://127.0.0.1:{a.port}/v1")
+    srv.serve_forever()
+
+if __name__ == "__main__":
+    main()
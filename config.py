@@ -1,12 +1,12 @@
 # config.py — model/config overrides
-import os
+import os, sys
 from dotenv import load_dotenv
+# Streamlit secrets only when running under Streamlit: job workers and CLIs read the
+# environment and skip importing streamlit
+_IN_STREAMLIT = "streamlit" in sys.modules
 try:
-    import streamlit as st
-    _IN_STREAMLIT = True
-    _SECRETS = dict(st.secrets)
+    _SECRETS = dict(sys.modules["streamlit"].secrets) if _IN_STREAMLIT else {}
 except Exception:
-    _IN_STREAMLIT = False
     _SECRETS = {}
 load_dotenv()
 def _get(key, default=None):
@@ -17,6 +17,7 @@ def _get(key, default=None):
 OPENAI_API_KEY = _get("OPENAI_API_KEY", "")
 OPENAI_PROJECT_ID = _get("OPENAI_PROJECT_ID")
 OPENAI_ORG_ID = _get("OPENAI_ORG_ID")
+OPENAI_BASE_URL = _get("OPENAI_BASE_URL")  # e.g. a local OpenAI-compatible stub for benchmarks
 # Models (override in Secrets if you like)
 EMBED_MODEL = _get("EMBED_MODEL", "text-embedding-3-small")
 CHAT_MODEL = _get("CHAT_MODEL", "gpt-4o-mini")  # was 'gpt-5-reasoning' which 404s for many accounts
@@ -24,16 +25,103 @@ CHAT_MODEL = _get("CHAT_MODEL", "gpt-4o-mini")  # was 'gpt-5-reasoning' which 40
 NEO4J_URI = _get("NEO4J_URI")
 NEO4J_USER = _get("NEO4J_USER")
 NEO4J_PASSWORD = _get("NEO4J_PASSWORD")
+NEO4J_DATABASE = _get("NEO4J_DATABASE")  # None = the server's default database
+# Driver pool (one per process, see rag/db.py); timeouts and lifetimes in seconds
+NEO4J_POOL_SIZE = int(_get("NEO4J_POOL_SIZE", 50))
+NEO4J_ACQUIRE_TIMEOUT = float(_get("NEO4J_ACQUIRE_TIMEOUT", 15))
+NEO4J_CONNECT_TIMEOUT = float(_get("NEO4J_CONNECT_TIMEOUT", 10))
+NEO4J_LIVENESS_CHECK = float(_get("NEO4J_LIVENESS_CHECK", 60))  # ping connections idle longer than this before reuse
+NEO4J_MAX_CONN_LIFETIME = float(_get("NEO4J_MAX_CONN_LIFETIME", 1800))
+NEO4J_FETCH_SIZE = int(_get("NEO4J_FETCH_SIZE", 1000))
+# Warm the OpenAI client, the Neo4j pool and local indexes in the background at app start (rag/warmup.py)
+WARMUP = _get("WARMUP", "true").lower() in ("1","true","yes")
+# Seconds a process reuses the corpus version (bumped by ingest) before re-reading it
+CORPUS_VERSION_TTL = float(_get("CORPUS_VERSION_TTL", 5))
+# Admin graph explorer: case studies / chunks per page, and where rendered views are cached
+GRAPH_PAGE_SIZE = int(_get("GRAPH_PAGE_SIZE", 200))
+GRAPH_CACHE_DIR = _get("GRAPH_CACHE_DIR", ".cache/graph")
 # Retrieval tuning
+# Below the model's native size (text-embedding-3 only) vectors are requested shortened and kept
+# in their own Chunk property and vector index; switch sizes with python -m rag.embed_profile migrate
 EMBED_DIM = int(_get("EMBED_DIM", 1536))
-HYBRID_ACCEPT = float(_get("HYBRID_ACCEPT", 0.35))
+# Hybrid fusion: minmax (ALPHA-weighted min-max per list) | rrf (reciprocal rank) | calibrated (see rag/calibration.py)
+FUSION = _get("FUSION", "minmax").lower()
+FUSION_CALIBRATION_PATH = _get("FUSION_CALIBRATION_PATH", ".cache/fusion_calibration.json")
+# Minimum best hybrid score to ground an answer. The 0.35 default is for minmax; rrf and calibrated
+# score on their own scales (rrf gives a chunk ranked first in one list >= 0.4), so they need it set.
+# Pick the value with `python -m bench.retrieval --tune --corpus ... --questions ...`
+_HYBRID_ACCEPT = _get("HYBRID_ACCEPT")
+if not _HYBRID_ACCEPT and FUSION != "minmax":
+    raise ValueError(f"FUSION={FUSION} needs HYBRID_ACCEPT set explicitly: the 0.35 default only suits minmax. "
+                     "Pick one with python -m bench.retrieval --tune on your own questions.")
+HYBRID_ACCEPT = float(_HYBRID_ACCEPT or 0.35)
 TOP_K = int(_get("TOP_K", 8))
 TOP_N = int(_get("TOP_N", 3))
+# Grounded-answer prompt: max tokens of source text after merging overlapping chunks (0 = no limit)
+CONTEXT_TOKEN_BUDGET = int(_get("CONTEXT_TOKEN_BUDGET", 3000))
+# Ingestion embedding batches (per request limits + parallel requests)
+EMBED_BATCH_ITEMS = int(_get("EMBED_BATCH_ITEMS", 256))
+EMBED_BATCH_TOKENS = int(_get("EMBED_BATCH_TOKENS", 100_000))
+EMBED_CONCURRENCY = int(_get("EMBED_CONCURRENCY", 4))
+EMBED_MAX_RETRIES = int(_get("EMBED_MAX_RETRIES", 6))
+# Persistent embedding cache (shared by query + ingest paths)
+EMBED_CACHE_ENABLED = _get("EMBED_CACHE_ENABLED", "true").lower() in ("1","true","yes")
+EMBED_CACHE_PATH = _get("EMBED_CACHE_PATH", ".cache/embeddings.sqlite")
+EMBED_CACHE_MB = int(_get("EMBED_CACHE_MB", 512))
+# Semantic answer cache (grounded answers, per process)
+ANSWER_CACHE_ENABLED = _get("ANSWER_CACHE_ENABLED", "true").lower() in ("1","true","yes")
+ANSWER_CACHE_SIM = float(_get("ANSWER_CACHE_SIM", 0.95))
+ANSWER_CACHE_TTL = int(_get("ANSWER_CACHE_TTL", 24 * 3600))  # seconds
+ANSWER_CACHE_MAX = int(_get("ANSWER_CACHE_MAX", 512))
+# Retrieval result cache (question + retrieval settings -> ranked chunks), tagged with the corpus version
+RETRIEVAL_CACHE_ENABLED = _get("RETRIEVAL_CACHE_ENABLED", "true").lower() in ("1","true","yes")
+RETRIEVAL_CACHE_MB = int(_get("RETRIEVAL_CACHE_MB", 64))
+RETRIEVAL_CACHE_TTL = int(_get("RETRIEVAL_CACHE_TTL", 24 * 3600))  # seconds; also bounds writes the version misses
+RETRIEVAL_CACHE_PATH = _get("RETRIEVAL_CACHE_PATH", "")  # optional SQLite file shared by processes
+RETRIEVAL_CACHE_DISK_MB = int(_get("RETRIEVAL_CACHE_DISK_MB", 256))
+# Chat history: turns kept per session, turns shown before "show earlier", shared cache of cited chunks
+HISTORY_MAX_TURNS = int(_get("HISTORY_MAX_TURNS", 100))
+HISTORY_WINDOW = int(_get("HISTORY_WINDOW", 10))
+HISTORY_CHUNK_CACHE_MB = int(_get("HISTORY_CHUNK_CACHE_MB", 32))
+# Background ingestion queue (0 in-process workers = run `python -m rag.jobs worker` separately)
+JOBS_DB_PATH = _get("JOBS_DB_PATH", ".cache/jobs.sqlite")
+JOBS_SPOOL_DIR = _get("JOBS_SPOOL_DIR", ".cache/uploads")
+JOBS_INPROCESS_WORKERS = int(_get("JOBS_INPROCESS_WORKERS", 1))
+JOBS_STALE_SECONDS = int(_get("JOBS_STALE_SECONDS", 600))
+JOBS_MAX_ATTEMPTS = int(_get("JOBS_MAX_ATTEMPTS", 3))
+# Seconds before a failed job is retried, doubled after each further failure
+JOBS_RETRY_BACKOFF = float(_get("JOBS_RETRY_BACKOFF", 30))
+# PDF page extraction pool (0 workers = one per CPU) and chunks embedded/written per ingest window
+PDF_WORKERS = int(_get("PDF_WORKERS", 0))
+PDF_PAGES_PER_TASK = int(_get("PDF_PAGES_PER_TASK", 16))
+INGEST_WINDOW_CHUNKS = int(_get("INGEST_WINDOW_CHUNKS", 1024))
+# Chunking: chars (fixed windows) | tokens | sentences | layout (PDF blocks); see rag/chunking.py
+CHUNK_MODE = _get("CHUNK_MODE", "chars")
+CHUNK_TOKENS = int(_get("CHUNK_TOKENS", 300))
+CHUNK_OVERLAP_TOKENS = int(_get("CHUNK_OVERLAP_TOKENS", 40))
+# Chunks per UNWIND write transaction during ingestion
+WRITE_BATCH_SIZE = int(_get("WRITE_BATCH_SIZE", 200))
+# One Cypher round trip for vector + full-text + context (false = legacy per-chunk lookups)
+SINGLE_QUERY_RETRIEVAL = _get("SINGLE_QUERY_RETRIEVAL", "true").lower() in ("1","true","yes")
+# Vector search: neo4j (chunk_vec_idx) | local (in-process mirror in ANN_INDEX_DIR, see rag/ann_index.py)
+VECTOR_BACKEND = _get("VECTOR_BACKEND", "neo4j").lower()
+ANN_INDEX_DIR = _get("ANN_INDEX_DIR", ".cache/ann")
+# Storage for the local mirror: float32 | float16 | int8 (one scale per row); converted on first use after a change
+ANN_DTYPE = _get("ANN_DTYPE", "float32").lower()
+# Keyword search: neo4j (chunk_text_fts) | local (in-process BM25 in BM25_INDEX_DIR, see rag/bm25.py)
+FULLTEXT_BACKEND = _get("FULLTEXT_BACKEND", "neo4j").lower()
+BM25_INDEX_DIR = _get("BM25_INDEX_DIR", ".cache/bm25")
+# Overlap query embedding with the full-text search (asyncio; takes precedence over the above)
+ASYNC_RETRIEVAL = _get("ASYNC_RETRIEVAL", "false").lower() in ("1","true","yes")
 # -----------------------
 # Admin
 # -----------------------
 ADMIN_PASSWORD = _get("ADMIN_PASSWORD", "")
 
+# Tracing: per-stage spans, optionally exported (file path / OTLP-HTTP endpoint e.g. http://localhost:4318/v1/traces)
+TRACE_JSONL_PATH = _get("TRACE_JSONL_PATH", "")
+TRACE_OTLP_ENDPOINT = _get("TRACE_OTLP_ENDPOINT", "")
+
 # Optional feature flags
 WEB_SEARCH_ENABLED = _get("WEB_SEARCH_ENABLED", "false").lower() in ("1","true","yes")
 REQUIRED = {
@@ -43,8 +131,10 @@ REQUIRED = {
     "NEO4J_PASSWORD": NEO4J_PASSWORD,
 }
 MISSING = [k for k, v in REQUIRED.items() if not v]
+# The app reports missing secrets on the page (app.py); anything else fails at import
+MISSING_MESSAGE = ""
 if MISSING:
-    msg = (
+    MISSING_MESSAGE = (
         "Missing required secrets: " + ", ".join(MISSING) + "\n\n"
         "Add them in Streamlit Cloud → Settings → Secrets. Example:\n\n"
         "OPENAI_API_KEY = sk-...\n"
@@ -52,10 +142,7 @@ if MISSING:
         "NEO4J_USER = neo4j\n"
         "NEO4J_PASSWORD = <your-password>\n"
         "EMBED_DIM = 1536\n"
-        "HYBRID_ACCEPT = 0.35\n"
         "CHAT_MODEL = gpt-4o-mini\n"
     )
-    if _IN_STREAMLIT:
-        st.error(msg); st.stop()
-    else:
-        raise AssertionError(msg)
+    if not _IN_STREAMLIT:
+        raise AssertionError(MISSING_MESSAGE)
@@ -0,0 +1,229 @@
+"""
+Local mirror of the Chunk embeddings for in-process vector search (VECTOR_BACKEND=local).
+
+Exact search: a memory-mapped matrix of unit vectors, one row per chunk, and a
+NumPy matrix-vector product per query. At our corpus size that is a few ms,
+needs no extra dependency, and has recall 1.0 by construction.
+
+The snapshot can be stored as float32, float16 or int8 (ANN_DTYPE). int8 rows are
+scaled to their largest component, with the scale kept per row. Quantized rows are
+widened to float32 a small block at a time while scoring, so memory stays at the
+stored size. int8 costs little extra per query; NumPy's float16 conversion is slow,
+so float16 mostly saves memory (python -m bench.embed_profiles). Journal rows
+(recent upserts) stay float32 until the next compaction.
+
+Snapshot files per generation (see rag.local_index for generations and the journal):
+  base-g.npy      normalized vectors, loaded with mmap (startup does not read them)
+  scale-g.npy     int8 snapshots only: per-row scale
+  ids-g.json      chunk_id per row
+
+One directory per vector size, so indexes of two embedding profiles can coexist.
+
+    python -m rag.ann_index build     # (re)build from Neo4j
+    python -m rag.ann_index stats
+"""
+import json, os, struct, threading, time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+from .local_index import JournaledIndex, UPSERT, DELETE
+
+_ID = struct.Struct("<H")
+DTYPES = ("float32", "float16", "int8")
+_BLOCK = 512  # rows widened to float32 at a time when scoring a quantized snapshot (stays in cache)
+
+class AnnIndex(JournaledIndex):
+    KINDS = {"base": "npy", "scale": "npy", "ids": "json"}
+
+    def __init__(self, path: str, dim: int, dtype: str = "float32"):
+        if dtype not in DTYPES:
+            raise ValueError(f"ANN dtype must be one of {', '.join(DTYPES)}, not {dtype!r}")
+        self.dim = dim
+        self.dtype = dtype
+        super().__init__(path)
+
+    def _reset(self, gen: Optional[int]):
+        self._extra = np.zeros((0, self.dim), dtype=np.float32)
+        self._n_extra = 0
+        self._scale = None
+        if gen is None:
+            self._base = np.zeros((0, self.dim), dtype=np.float32)
+            self._ids: List[str] = []
+        else:
+            with open(self._file("ids", gen), encoding="utf-8") as f:
+                self._ids = json.load(f)
+            self._base = np.load(self._file("base", gen), mmap_mode="r")[:len(self._ids)]
+            if self._base.dtype == np.int8:
+                self._scale = np.load(self._file("scale", gen))[:len(self._ids)]
+        self._alive = np.ones(len(self._ids), dtype=bool)  # base rows, then extra rows (with spare capacity)
+        self._row: Dict[str, int] = {cid: i for i, cid in enumerate(self._ids)}
+
+    def _apply(self, op: int, payload: bytes):
+        (n,) = _ID.unpack_from(payload)
+        cid = payload[_ID.size:_ID.size + n].decode("utf-8")
+        old = self._row.pop(cid, None)
+        if old is not None:
+            self._alive[old] = False
+        if op != UPSERT:
+            return
+        vec = np.frombuffer(payload, dtype=np.float32, count=self.dim, offset=_ID.size + n)
+        row = len(self._ids)
+        if self._n_extra == len(self._extra):
+            cap = max(64, 2 * len(self._extra))
+            grown = np.zeros((cap, self.dim), dtype=np.float32)
+            grown[:self._n_extra] = self._extra[:self._n_extra]
+            self._extra = grown
+            alive = np.zeros(len(self._base) + cap, dtype=bool)
+            alive[:row] = self._alive[:row]
+            self._alive = alive
+        self._extra[self._n_extra] = vec
+        self._n_extra += 1
+        self._ids.append(cid)
+        self._alive[row] = True
+        self._row[cid] = row
+
+    def _journal_rows(self) -> int:
+        return len(self._ids) - len(self._row) + self._n_extra
+
+    def _snapshot_rows(self) -> int:
+        return len(self._base)
+
+    # --- reads ---
+    def __len__(self) -> int:
+        return len(self._row)
+
+    def search(self, qvec: Sequence[float], k: int) -> List[Tuple[str, float]]:
+        """Top-k (chunk_id, score) by cosine, scored (1 + cos) / 2 like Neo4j's vector index."""
+        self.refresh()
+        q = np.asarray(qvec, dtype=np.float32)
+        q = q / (np.linalg.norm(q) + 1e-9)
+        with self._lock:
+            n_base = len(self._base)
+            sims = np.empty(len(self._ids), dtype=np.float32)
+            if n_base:
+                self._score_base(q, sims[:n_base])
+            if self._n_extra:
+                np.matmul(self._extra[:self._n_extra], q, out=sims[n_base:])
+            sims[~self._alive[:len(self._ids)]] = -np.inf
+            k = min(k, len(self._row))
+            if k <= 0:
+                return []
+            top = np.argpartition(-sims, k - 1)[:k]
+            top = top[np.argsort(-sims[top])]
+            return [(self._ids[i], float((1 + sims[i]) / 2)) for i in top]
+
+    def _score_base(self, q: np.ndarray, out: np.ndarray):
+        if self._base.dtype == np.float32:
+            np.matmul(self._base, q, out=out)
+            return
+        buf = np.empty((min(_BLOCK, len(self._base)), self.dim), dtype=np.float32)
+        for i in range(0, len(self._base), _BLOCK):
+            block = self._base[i:i + _BLOCK]
+            np.copyto(buf[:len(block)], block)
+            np.matmul(buf[:len(block)], q, out=out[i:i + len(block)])
+        if self._scale is not None:
+            out *= self._scale
+
+    def _vector(self, row: int) -> np.ndarray:
+        n_base = len(self._base)
+        if row >= n_base:
+            return self._extra[row - n_base].copy()
+        v = np.asarray(self._base[row], dtype=np.float32)
+        return v * self._scale[row] if self._scale is not None else v
+
+    # --- writes ---
+    @staticmethod
+    def _key(cid: str) -> bytes:
+        b = cid.encode("utf-8")
+        return _ID.pack(len(b)) + b
+
+    def upsert(self, ids: Sequence[str], vecs: Sequence[Sequence[float]]):
+        if not ids:
+            return
+        m = np.asarray(vecs, dtype=np.float32)
+        m /= np.linalg.norm(m, axis=1, keepdims=True) + 1e-9
+        self._append([(UPSERT, self._key(cid) + v.tobytes()) for cid, v in zip(ids, m)])
+
+    def delete(self, ids: Iterable[str]):
+        self._append([(DELETE, self._key(cid)) for cid in ids])
+
+    def _write_snapshot(self, gen: int, rows: Iterable[Tuple[str, Sequence[float]]], count: Optional[int]):
+        # rows: (chunk_id, vector); streamed straight into the memmap when `count` is known
+        rows = rows if count is not None else list(rows)
+        count = count if count is not None else len(rows)
+        tmp = self._file("base", gen) + ".tmp"
+        base = np.lib.format.open_memmap(tmp, mode="w+", dtype=self.dtype, shape=(count, self.dim))
+        scale = np.ones(count, dtype=np.float32) if self.dtype == "int8" else None
+        ids = []
+        for i, (cid, vec) in enumerate(rows):
+            if i >= count:
+                break
+            v = np.asarray(vec, dtype=np.float32)
+            v = v / (np.linalg.norm(v) + 1e-9)
+            if scale is not None:
+                scale[i] = max(float(np.abs(v).max()), 1e-9) / 127
+                v = np.rint(v / scale[i])
+            base[i] = v
+            ids.append(cid)
+        base.flush()
+        del base
+        os.replace(tmp, self._file("base", gen))
+        if scale is not None:
+            np.save(self._file("scale", gen), scale[:len(ids)])
+        with open(self._file("ids", gen), "w", encoding="utf-8") as f:
+            json.dump(ids, f)
+
+    def _live_rows(self):
+        return [(cid, self._vector(row)) for cid, row in self._row.items()]
+
+    def stats(self) -> Dict:
+        self.refresh(0)
+        return {"generation": self._gen, "chunks": len(self), "snapshot_rows": len(self._base),
+                "journal_rows": self._n_extra, "dead_rows": len(self._ids) - len(self._row), "dim": self.dim,
+                "dtype": str(self._base.dtype), "snapshot_mb": round(self._base.nbytes / 2**20, 2)}
+
+_index: Optional[AnnIndex] = None
+_index_lock = threading.Lock()
+
+def index_dir(dim: int) -> str:
+    # The native-size profile keeps ANN_INDEX_DIR itself, so existing indexes stay in use
+    from config import ANN_INDEX_DIR
+    from .embed_profile import native_dim
+    return ANN_INDEX_DIR if dim == native_dim() else os.path.join(ANN_INDEX_DIR, f"d{dim}")
+
+def open_index() -> AnnIndex:
+    from config import EMBED_DIM, ANN_DTYPE
+    return AnnIndex(index_dir(EMBED_DIM), EMBED_DIM, ANN_DTYPE)
+
+def get() -> AnnIndex:
+    """The process-wide index, built from Neo4j the first time if nothing is on disk yet."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = open_index()
+            if not _index.exists():
+                build(_index)
+            elif len(_index._base) and _index._base.dtype != np.dtype(_index.dtype):
+                _index.compact()  # ANN_DTYPE changed: rewrite the snapshot in the new type
+        return _index
+
+def build(index: Optional[AnnIndex] = None) -> AnnIndex:
+    from .store import count_embeddings, iter_embeddings
+    index = index or get()
+    index.rebuild(iter_embeddings(), count_embeddings())
+    return index
+
+def main():
+    import argparse
+    ap = argparse.ArgumentParser(prog="python -m rag.ann_index")
+    ap.add_argument("cmd", choices=["build", "stats", "compact"])
+    a = ap.parse_args()
+    if a.cmd == "build":
+        t0 = time.perf_counter()
+        index = build(open_index())
+        print(f"built {len(index)} vectors in {time.perf_counter() - t0:.1f}s")
+    elif a.cmd == "compact":
+        get().compact()
+    print(json.dumps(get().stats(), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+import threading, time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+from .tracing import traced
+from .store import corpus_version
+from config import ANSWER_CACHE_ENABLED, ANSWER_CACHE_SIM, ANSWER_CACHE_TTL, ANSWER_CACHE_MAX
+
+# Grounded answers shared across sessions in this process. A lookup hits when the
+# question embedding is close enough AND retrieval picked exactly the same chunks,
+# so a near-duplicate question grounded on different sources still gets a fresh answer.
+# Entries are tagged with the corpus version (store.corpus_version) and dropped when
+# read under a newer one: an ingest in another process (a job worker, the CLI) can
+# change a chunk's text without changing its id, and invalidate_case only reaches
+# this process.
+
+_lock = threading.Lock()
+_entries: "OrderedDict[int, Dict]" = OrderedDict()
+_next_id = 0
+_stats = {"hits": 0, "misses": 0, "saved_seconds": 0.0, "invalidated": 0}
+
+def _unit(v) -> np.ndarray:
+    v = np.asarray(v, dtype=np.float32)
+    return v / (np.linalg.norm(v) + 1e-9)
+
+@traced("answer_cache.lookup")
+def lookup(qvec: List[float], chunk_ids: Iterable[str]) -> Optional[str]:
+    if not ANSWER_CACHE_ENABLED:
+        return None
+    cids = frozenset(chunk_ids)
+    q = _unit(qvec)
+    now, version = time.time(), corpus_version()
+    with _lock:
+        for eid in [e for e, v in _entries.items() if now - v["created"] > ANSWER_CACHE_TTL]:
+            del _entries[eid]
+        stale = [e for e, v in _entries.items() if v["version"] != version]
+        for eid in stale:
+            del _entries[eid]
+        _stats["invalidated"] += len(stale)
+        best_id, best_sim = None, ANSWER_CACHE_SIM
+        for eid, v in _entries.items():
+            if v["cids"] != cids:
+                continue
+            sim = float(v["qvec"] @ q)
+            if sim >= best_sim:
+                best_id, best_sim = eid, sim
+        if best_id is None:
+            _stats["misses"] += 1
+            return None
+        hit = _entries[best_id]
+        _entries.move_to_end(best_id)
+        _stats["hits"] += 1
+        _stats["saved_seconds"] += hit["latency"]
+        return hit["answer"]
+
+def store(qvec: List[float], chunks: List[Dict], answer: str, latency: float):
+    """`chunks` are the retrieved candidates the answer was grounded on; `latency` is what a hit saves."""
+    if not ANSWER_CACHE_ENABLED:
+        return
+    global _next_id
+    version = corpus_version()
+    with _lock:
+        _entries[_next_id] = {
+            "qvec": _unit(qvec),
+            "cids": frozenset(c["cid"] for c in chunks),
+            "case_ids": {c["case_id"] for c in chunks},
+            "answer": answer,
+            "latency": latency,
+            "created": time.time(),
+            "version": version,
+        }
+        _next_id += 1
+        while len(_entries) > ANSWER_CACHE_MAX:
+            _entries.popitem(last=False)
+
+def invalidate_case(case_id: str) -> int:
+    # Called by the loader whenever a CaseStudy is (re-)ingested
+    with _lock:
+        stale = [e for e, v in _entries.items() if case_id in v["case_ids"]]
+        for e in stale:
+            del _entries[e]
+        _stats["invalidated"] += len(stale)
+    return len(stale)
+
+def stats() -> Dict:
+    with _lock:
+        hits = _stats["hits"]
+        total = hits + _stats["misses"]
+        return {
+            **_stats,
+            "entries": len(_entries),
+            "hit_rate": hits / total if total else 0.0,
+            "saved_per_hit": _stats["saved_seconds"] / hits if hits else 0.0,
+        }
@@ -0,0 +1,134 @@
+import asyncio, threading, time
+from typing import Dict, List, Optional, Tuple
+from neo4j import AsyncGraphDatabase, READ_ACCESS
+from openai import AsyncOpenAI
+from config import (NEO4J_URI, NEO4J_DATABASE, NEO4J_FETCH_SIZE, OPENAI_API_KEY, OPENAI_PROJECT_ID,
+                    OPENAI_ORG_ID, OPENAI_BASE_URL, EMBED_MODEL, TOP_K, VECTOR_BACKEND, FULLTEXT_BACKEND)
+from . import embed_cache, tracing
+from .db import driver_options
+from .embed_profile import cache_model, request_args
+from .store import FTS_WITH_CONTEXT, VEC_WITH_CONTEXT, HITS_WITH_CONTEXT, lucene_query
+from .retriever import _rank
+
+# The full-text search does not need the query embedding, so it runs while the
+# embedding request is in flight; the vector search starts as soon as it lands:
+#
+#   embed ──────────► vector ─┐
+#   fulltext ─────────────────┴─► rank
+#
+# Async clients are bound to the event loop they first run on, so everything runs on
+# one long-lived loop in a daemon thread and sync callers (Streamlit) submit to it.
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+_driver = None
+_client = None
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="async-retriever", daemon=True).start()
+    return _loop
+
+def _clients():
+    global _driver, _client
+    if _driver is None:
+        # Its own pool (async drivers are bound to this loop), sized like rag.db's
+        _driver = AsyncGraphDatabase.driver(NEO4J_URI, **driver_options())
+        _client = AsyncOpenAI(
+            api_key=OPENAI_API_KEY,
+            base_url=OPENAI_BASE_URL if OPENAI_BASE_URL else None,
+            project=OPENAI_PROJECT_ID if OPENAI_PROJECT_ID else None,
+            organization=OPENAI_ORG_ID if OPENAI_ORG_ID else None,
+        )
+    return _driver, _client
+
+async def _warm():
+    driver, _ = _clients()
+    await driver.verify_connectivity()
+
+def warm():
+    """Creates the async clients on their loop and opens one pooled Neo4j connection (rag.warmup)."""
+    asyncio.run_coroutine_threadsafe(_warm(), _get_loop()).result()
+
+async def _timed(name: str, timings: Dict, coro):
+    t0 = time.perf_counter()
+    try:
+        return await coro
+    finally:
+        timings[name] = time.perf_counter() - t0
+
+async def _embed(q: str) -> List[float]:
+    cached = embed_cache.get_many(cache_model(), [q], source="query")[0]
+    if cached is not None:
+        return cached
+    _, client = _clients()
+    emb = await client.embeddings.create(model=EMBED_MODEL, input=q, **request_args())
+    vec = emb.data[0].embedding
+    embed_cache.put_many(cache_model(), [q], [vec])
+    return vec
+
+async def _query(cypher: str, **params) -> List[Dict]:
+    driver, _ = _clients()
+    async def work(tx):
+        res = await tx.run(cypher, **params)
+        return await res.data()
+    async with driver.session(database=NEO4J_DATABASE, fetch_size=NEO4J_FETCH_SIZE,
+                              default_access_mode=READ_ACCESS) as s:
+        return await s.execute_read(work)
+
+async def _vector(qvec: List[float]) -> List[Dict]:
+    if VECTOR_BACKEND == "local":
+        from . import ann_index
+        hits = [{"id": cid, "score": score, "src": "sem"} for cid, score in ann_index.get().search(qvec, TOP_K)]
+        return await _query(HITS_WITH_CONTEXT, hits=hits)
+    return await _query(VEC_WITH_CONTEXT, qvec=qvec, k=TOP_K)
+
+async def _fulltext(q: str) -> List[Dict]:
+    if FULLTEXT_BACKEND == "local":
+        from . import bm25
+        hits = [{"id": cid, "score": score, "src": "lex"} for cid, score in bm25.get().search(q, TOP_K)]
+        return await _query(HITS_WITH_CONTEXT, hits=hits) if hits else []
+    lq = lucene_query(q)
+    return await _query(FTS_WITH_CONTEXT, q=lq, k=TOP_K) if lq else []
+
+async def retrieve_topn_async(question: str, info: Optional[Dict] = None) -> Tuple[List[Dict], float]:
+    """
+    Same result as retriever.retrieve_topn. `info` receives 'qvec' and 'timings'
+    (seconds per stage, plus 'total' wall time and 'sequential' = what the stages
+    would have cost back to back).
+    """
+    timings: Dict[str, float] = {}
+    t0 = time.perf_counter()
+    fts_task = asyncio.ensure_future(_timed("fulltext", timings, _fulltext(question)))
+    try:
+        qvec = await _timed("embed", timings, _embed(question))
+        vec_rows = await _timed("vector", timings, _vector(qvec))
+        fts_rows = await fts_task
+    finally:
+        if not fts_task.done():
+            fts_task.cancel()
+
+    t1 = time.perf_counter()
+    sem = [(r['chunk_id'], r['score']) for r in vec_rows]
+    lex = [(r['chunk_id'], r['score']) for r in fts_rows]
+    ctx = {r['chunk_id']: r for r in vec_rows + fts_rows if r['case_id'] is not None}
+    top, best = _rank(qvec, sem, lex, ctx.get)
+    timings["rank"] = time.perf_counter() - t1
+    timings["total"] = time.perf_counter() - t0
+    timings["sequential"] = sum(timings[k] for k in ("embed", "fulltext", "vector", "rank"))
+
+    if info is not None:
+        info['qvec'] = qvec
+        info['timings'] = timings
+    return top, best
+
+def retrieve_topn_sync(question: str, info: Optional[Dict] = None) -> Tuple[List[Dict], float]:
+    info = info if info is not None else {}
+    out = asyncio.run_coroutine_threadsafe(retrieve_topn_async(question, info), _get_loop()).result()
+    # Spans can't be opened on the loop thread (the request trace lives in this one), so replay them here
+    for k in ("embed", "fulltext", "vector", "rank"):
+        tracing.record(f"async.{k}", info["timings"][k])
+    return out
@@ -0,0 +1,250 @@
+"""
+Local BM25 index over Chunk text, an in-process alternative to the chunk_text_fts
+call (FULLTEXT_BACKEND=local).
+
+Postings are compressed-sparse-row arrays: for term id t, offsets[t]:offsets[t+1]
+slices docs (row numbers) and tfs. Scoring is Lucene's BM25 (k1=1.2, b=0.75), so
+scores sit on the same scale as the full-text index. Tokenization matches Lucene's
+standard analyzer closely enough for ranking (lowercased letter/digit runs, keeping
+inner apostrophes and dots as in "don't" and "3.5"); questions are tokenized the
+same way, so punctuation can't turn into query syntax.
+
+Snapshot files per generation (see rag.local_index for generations and the journal):
+  vocab-g.json, offsets-g.npy, docs-g.npy, tfs-g.npy, lens-g.npy, ids-g.json
+
+    python -m rag.bm25 build     # (re)build from Neo4j
+    python -m rag.bm25 stats
+"""
+import json, math, os, re, struct, threading, time
+from collections import Counter
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+import numpy as np
+from .local_index import JournaledIndex, UPSERT, DELETE
+
+K1, B = 1.2, 0.75
+_TOKEN = re.compile(r"[^\W_]+(?:['.][^\W_]+)*")
+_ID = struct.Struct("<H")
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall(text.lower())
+
+class _Postings(NamedTuple):
+    # A whole index as flat arrays, one entry per (term, doc) pair, in any order
+    ids: List[str]
+    vocab: List[str]
+    terms: np.ndarray
+    docs: np.ndarray
+    tfs: np.ndarray
+    lens: np.ndarray
+
+def _from_texts(rows: Iterable[Tuple[str, str]]) -> _Postings:
+    ids, lens, vocab = [], [], {}
+    terms, docs, tfs = [], [], []
+    for cid, text in rows:
+        toks = Counter(tokenize(text or ""))
+        row = len(ids)
+        ids.append(cid)
+        lens.append(sum(toks.values()))
+        for t, n in toks.items():
+            terms.append(vocab.setdefault(t, len(vocab)))
+            docs.append(row)
+            tfs.append(n)
+    return _Postings(ids, list(vocab), np.asarray(terms, dtype=np.int64), np.asarray(docs, dtype=np.int32),
+                     np.asarray(tfs, dtype=np.int32), np.asarray(lens, dtype=np.int32))
+
+class Bm25Index(JournaledIndex):
+    KINDS = {"vocab": "json", "offsets": "npy", "docs": "npy", "tfs": "npy", "lens": "npy", "ids": "json"}
+
+    def _reset(self, gen: Optional[int]):
+        if gen is None:
+            self._ids: List[str] = []
+            self._vocab: Dict[str, int] = {}
+            self._offsets = np.zeros(1, dtype=np.int64)
+            self._docs = np.zeros(0, dtype=np.int32)
+            self._tfs = np.zeros(0, dtype=np.int32)
+            self._lens = np.zeros(0, dtype=np.int32)
+        else:
+            with open(self._file("ids", gen), encoding="utf-8") as f:
+                self._ids = json.load(f)
+            with open(self._file("vocab", gen), encoding="utf-8") as f:
+                self._vocab = {t: i for i, t in enumerate(json.load(f))}
+            load = lambda kind: np.load(self._file(kind, gen), mmap_mode="r")
+            self._offsets, self._docs, self._tfs = load("offsets"), load("docs"), load("tfs")
+            self._lens = np.array(load("lens"))
+        self._n_base = len(self._ids)
+        self._alive = np.ones(self._n_base, dtype=bool)
+        self._row: Dict[str, int] = {cid: i for i, cid in enumerate(self._ids)}
+        self._total_len = int(self._lens.sum())
+        # Journal docs: rows after the snapshot's, postings kept as plain dicts
+        self._delta: Dict[str, Dict[int, int]] = {}
+        self._delta_lens: Dict[int, int] = {}
+
+    def _apply(self, op: int, payload: bytes):
+        (n,) = _ID.unpack_from(payload)
+        cid = payload[_ID.size:_ID.size + n].decode("utf-8")
+        old = self._row.pop(cid, None)
+        if old is not None:
+            if old < self._n_base:
+                self._alive[old] = False
+                self._total_len -= int(self._lens[old])
+            else:
+                self._total_len -= self._delta_lens.pop(old)
+        if op != UPSERT:
+            return
+        toks = Counter(tokenize(payload[_ID.size + n:].decode("utf-8")))
+        row = len(self._ids)
+        self._ids.append(cid)
+        self._row[cid] = row
+        self._delta_lens[row] = sum(toks.values())
+        self._total_len += self._delta_lens[row]
+        for t, c in toks.items():
+            self._delta.setdefault(t, {})[row] = c
+
+    def _journal_rows(self) -> int:
+        return len(self._ids) - self._n_base + int((~self._alive).sum())
+
+    def _snapshot_rows(self) -> int:
+        return self._n_base
+
+    # --- reads ---
+    def __len__(self) -> int:
+        return len(self._row)
+
+    def search(self, q: str, k: int) -> List[Tuple[str, float]]:
+        """Top-k (chunk_id, BM25 score) for the terms of `q`; chunks matching no term are left out."""
+        self.refresh()
+        qt = Counter(tokenize(q))
+        with self._lock:
+            N = len(self._row)
+            if not qt or not N:
+                return []
+            avgdl = self._total_len / N
+            base = np.zeros(self._n_base, dtype=np.float32)
+            extra: Dict[int, float] = {}
+            for t, qtf in qt.items():
+                tid = self._vocab.get(t)
+                if tid is not None:
+                    o0, o1 = int(self._offsets[tid]), int(self._offsets[tid + 1])
+                    docs = np.asarray(self._docs[o0:o1])
+                    alive = self._alive[docs]
+                    docs, tf = docs[alive], np.asarray(self._tfs[o0:o1])[alive].astype(np.float32)
+                else:
+                    docs, tf = np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+                live_delta = {r: c for r, c in self._delta.get(t, {}).items() if r in self._delta_lens}
+                df = len(docs) + len(live_delta)
+                if not df:
+                    continue
+                idf = math.log(1 + (N - df + 0.5) / (df + 0.5)) * qtf
+                if len(docs):
+                    norm = K1 * (1 - B + B * self._lens[docs] / avgdl)
+                    base[docs] += idf * tf / (tf + norm)
+                for r, c in live_delta.items():
+                    extra[r] = extra.get(r, 0.0) + idf * c / (c + K1 * (1 - B + B * self._delta_lens[r] / avgdl))
+            hits = np.flatnonzero(base)
+            if len(hits) > k:
+                hits = hits[np.argpartition(-base[hits], k - 1)[:k]]
+            scored = [(self._ids[i], float(base[i])) for i in hits] + [(self._ids[r], s) for r, s in extra.items()]
+            scored.sort(key=lambda x: x[1], reverse=True)
+            return scored[:k]
+
+    # --- writes ---
+    @staticmethod
+    def _key(cid: str) -> bytes:
+        b = cid.encode("utf-8")
+        return _ID.pack(len(b)) + b
+
+    def upsert(self, rows: Iterable[Tuple[str, str]]):
+        """rows: (chunk_id, text)."""
+        self._append([(UPSERT, self._key(cid) + (text or "").encode("utf-8")) for cid, text in rows])
+
+    def delete(self, ids: Iterable[str]):
+        self._append([(DELETE, self._key(cid)) for cid in ids])
+
+    def _write_snapshot(self, gen: int, rows, count: Optional[int]):
+        # rows: (chunk_id, text) pairs, or a _Postings when compacting
+        p = rows if isinstance(rows, _Postings) else _from_texts(rows)
+        order = np.lexsort((p.docs, p.terms))
+        offsets = np.zeros(len(p.vocab) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(p.terms, minlength=len(p.vocab)), out=offsets[1:])
+        for kind, arr in (("offsets", offsets), ("docs", p.docs[order].astype(np.int32)),
+                          ("tfs", p.tfs[order].astype(np.int32)), ("lens", p.lens.astype(np.int32))):
+            tmp = self._file(kind, gen) + ".tmp"
+            with open(tmp, "wb") as f:
+                np.save(f, arr)
+            os.replace(tmp, self._file(kind, gen))
+        for kind, obj in (("vocab", p.vocab), ("ids", p.ids)):
+            with open(self._file(kind, gen), "w", encoding="utf-8") as f:
+                json.dump(obj, f)
+
+    def _live_rows(self) -> _Postings:
+        # Live snapshot docs plus journal docs, renumbered, without going back to text
+        keep = np.flatnonzero(self._alive)
+        remap = np.full(self._n_base, -1, dtype=np.int64)
+        remap[keep] = np.arange(len(keep))
+        counts = np.diff(np.asarray(self._offsets))
+        terms = np.repeat(np.arange(len(counts)), counts)
+        docs = remap[np.asarray(self._docs)]
+        live = docs >= 0
+        vocab = dict(self._vocab)
+        ids = [self._ids[i] for i in keep]
+        lens = [self._lens[keep]]
+        d_terms, d_docs, d_tfs, d_lens = [], [], [], []
+        new_row = {}
+        for r in sorted(self._delta_lens):
+            new_row[r] = len(ids)
+            ids.append(self._ids[r])
+            d_lens.append(self._delta_lens[r])
+        for t, post in self._delta.items():
+            for r, c in post.items():
+                if r in new_row:
+                    d_terms.append(vocab.setdefault(t, len(vocab)))
+                    d_docs.append(new_row[r])
+                    d_tfs.append(c)
+        return _Postings(ids, list(vocab),
+                         np.concatenate([terms[live], np.asarray(d_terms, dtype=np.int64)]),
+                         np.concatenate([docs[live], np.asarray(d_docs, dtype=np.int64)]),
+                         np.concatenate([np.asarray(self._tfs)[live], np.asarray(d_tfs, dtype=np.int32)]),
+                         np.concatenate(lens + [np.asarray(d_lens, dtype=np.int32)]))
+
+    def stats(self) -> Dict:
+        self.refresh(0)
+        return {"generation": self._gen, "chunks": len(self), "snapshot_rows": self._n_base,
+                "journal_rows": len(self._ids) - self._n_base, "terms": len(self._vocab),
+                "postings": len(self._docs), "avg_len": round(self._total_len / len(self), 1) if len(self) else 0}
+
+_index: Optional[Bm25Index] = None
+_index_lock = threading.Lock()
+
+def get() -> Bm25Index:
+    """The process-wide index, built from Neo4j the first time if nothing is on disk yet."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            from config import BM25_INDEX_DIR
+            _index = Bm25Index(BM25_INDEX_DIR)
+            if not _index.exists():
+                build(_index)
+        return _index
+
+def build(index: Optional[Bm25Index] = None) -> Bm25Index:
+    from .store import iter_texts
+    index = index or get()
+    index.rebuild(iter_texts())
+    return index
+
+def main():
+    import argparse
+    ap = argparse.ArgumentParser(prog="python -m rag.bm25")
+    ap.add_argument("cmd", choices=["build", "stats", "compact"])
+    a = ap.parse_args()
+    if a.cmd == "build":
+        from config import BM25_INDEX_DIR
+        t0 = time.perf_counter()
+        index = build(Bm25Index(BM25_INDEX_DIR))
+        print(f"indexed {len(index)} chunks in {time.perf_counter() - t0:.1f}s")
+    elif a.cmd == "compact":
+        get().compact()
+    print(json.dumps(get().stats(), indent=2))
+
+if __name__ == "__main__":
+    main()
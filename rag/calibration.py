@@ -0,0 +1,120 @@
+"""
+Score calibration for FUSION=calibrated.
+
+Raw vector and full-text scores mean different things on different corpora and
+embedders, and min-max scaling throws the absolute level away. Instead, each raw
+score is mapped to where it falls in the distribution of scores this corpus
+usually produces: the empirical CDF over the top-k hits of pseudo-queries, i.e.
+sentences cut from random chunks. A calibrated 0.9 means "higher than 90% of the
+hits a typical question gets", whatever the index.
+
+The distribution is stored as quantiles in FUSION_CALIBRATION_PATH:
+
+    python -m rag.calibration build --queries 200   # samples chunks from Neo4j, embeds the pseudo-queries
+    python -m rag.calibration show
+
+Rebuild it after large corpus changes or a change of embedding model. Without a
+file, vector scores are used as they are (already 0..1) and BM25 scores are squashed
+with s / (s + LEX_HALF).
+"""
+import json, os, random, threading
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+
+QUANTILES = 101
+LEX_HALF = 5.0  # uncalibrated fallback: the BM25 score that maps to 0.5
+
+_cache: Dict = {"key": None, "cal": None}
+_cache_lock = threading.Lock()
+
+def _path() -> str:
+    from config import FUSION_CALIBRATION_PATH
+    return FUSION_CALIBRATION_PATH
+
+def load(path: Optional[str] = None) -> Optional[Dict]:
+    """The stored calibration (re-read when the file changes), or None."""
+    path = path or _path()
+    try:
+        key = (path, os.path.getmtime(path))
+    except OSError:
+        return None
+    with _cache_lock:
+        if _cache["key"] != key:
+            with open(path, encoding="utf-8") as f:
+                _cache.update(key=key, cal=json.load(f))
+        return _cache["cal"]
+
+def stamp(path: Optional[str] = None) -> Optional[float]:
+    # When the stored calibration last changed (None: there is none), for caches of fused results
+    try:
+        return os.path.getmtime(path or _path())
+    except OSError:
+        return None
+
+def save(cal: Dict, path: Optional[str] = None):
+    path = path or _path()
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(cal, f)
+    os.replace(tmp, path)
+
+def cdf(cal: Optional[Dict], src: str, scores: Sequence[float]) -> List[float]:
+    """Calibrated scores in [0, 1] for raw scores from one index ('sem' | 'lex')."""
+    x = np.asarray(scores, dtype=np.float64)
+    q = (cal or {}).get(src)
+    if q:
+        return np.interp(x, q, np.linspace(0.0, 1.0, len(q))).tolist()
+    if src == "lex":
+        x = np.maximum(x, 0.0)
+        return (x / (x + LEX_HALF)).tolist()
+    return np.clip(x, 0.0, 1.0).tolist()
+
+def pseudo_queries(texts: Iterable[str], rng: random.Random, words: Tuple[int, int] = (6, 18)) -> List[str]:
+    # A run of words from somewhere in each chunk, roughly question-sized
+    out = []
+    for text in texts:
+        toks = (text or "").split()
+        if len(toks) < words[0]:
+            continue
+        n = rng.randint(words[0], min(words[1], len(toks)))
+        i = rng.randrange(len(toks) - n + 1)
+        out.append(" ".join(toks[i:i + n]))
+    return out
+
+def fit(queries: Iterable[str], search: Callable[[str], Tuple[List, List]]) -> Dict:
+    """search(q) -> (sem, lex) as [(chunk_id, raw score)], e.g. the retriever's gather step."""
+    samples: Dict[str, List[float]] = {"sem": [], "lex": []}
+    n = 0
+    for q in queries:
+        sem, lex = search(q)
+        samples["sem"] += [s for _, s in sem]
+        samples["lex"] += [s for _, s in lex]
+        n += 1
+    grid = np.linspace(0, 100, QUANTILES)
+    cal = {src: np.percentile(v, grid).tolist() if v else None for src, v in samples.items()}
+    cal["queries"] = n
+    cal["hits"] = {src: len(v) for src, v in samples.items()}
+    return cal
+
+def main():
+    import argparse
+    ap = argparse.ArgumentParser(prog="python -m rag.calibration")
+    ap.add_argument("cmd", choices=["build", "show"])
+    ap.add_argument("--queries", type=int, default=200)
+    a = ap.parse_args()
+    if a.cmd == "build":
+        from .store import sample_texts
+        from .composer import embed_query
+        from .retriever import _multi_query
+        queries = pseudo_queries(sample_texts(a.queries), random.Random(0))
+        save(fit(queries, lambda q: _multi_query(q, embed_query(q))[:2]))
+    cal = load()
+    if cal is None:
+        print(f"no calibration at {_path()}")
+        return
+    summary = {src: {p: round(cal[src][p], 4) for p in (10, 50, 90, 99)} for src in ("sem", "lex") if cal.get(src)}
+    print(json.dumps({"path": _path(), "queries": cal["queries"], "hits": cal["hits"], "percentiles": summary}, indent=2))
+
+if __name__ == "__main__":
+    main()
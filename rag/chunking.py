@@ -0,0 +1,182 @@
+"""
+Chunking engine. Input is a stream of units (text, page, kind) whose texts, joined,
+form the document; output is pieces (text, start, end, page, section) where text is
+document[start:end], so offsets stay comparable across re-ingests.
+
+Modes (CHUNK_MODE):
+  chars      fixed CHARS windows with OVERLAP, the original behaviour
+  tokens     CHUNK_TOKENS-token windows cut between words
+  sentences  cuts only between sentences, preferring paragraph breaks; Markdown
+             headings start a new chunk and name its section
+  layout     PDFs: PyMuPDF text blocks are kept whole where they fit (tables, lists)
+             and larger-font blocks are treated as section headings; other input is
+             chunked as in `sentences`
+
+Unit kinds: "text" (free text), "block" (one layout block) and "heading".
+"""
+import re
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+Unit = Tuple[str, Optional[int], str]
+Piece = Tuple[str, int, int, Optional[int], Optional[str]]
+
+MODES = ("chars", "tokens", "sentences", "layout")
+
+CHARS = 1400
+OVERLAP = 200
+
+# --- token counting (tiktoken if installed, else a close word/punctuation estimate) ---
+_enc = None
+_TOKENISH = re.compile(r"\w+|[^\w\s]")
+
+def count_tokens(text: str) -> int:
+    global _enc
+    if _enc is None:
+        try:
+            import tiktoken
+            _enc = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _enc = False
+    if _enc:
+        return len(_enc.encode(text, disallowed_special=()))
+    return len(_TOKENISH.findall(text))
+
+# --- chars (legacy) ---
+def _chunks(text: str):
+    i = 0; n = len(text)
+    while i < n:
+        j = min(i+CHARS, n)
+        yield text[i:j], i, j
+        i += CHARS - OVERLAP if i+CHARS < n else j
+
+def _stream_chunks(parts: Iterable[str]):
+    # Same (chunk, start, end) as _chunks("".join(parts)), but only the unchunked tail
+    # (< CHARS plus the latest part) is held, so pages can be dropped once chunked.
+    buf, base = "", 0
+    step = CHARS - OVERLAP
+    for part in parts:
+        buf += part
+        i = 0
+        while len(buf) - i > CHARS:
+            yield buf[i:i+CHARS], base + i, base + i + CHARS
+            i += step
+        buf, base = buf[i:], base + i
+    if buf:
+        yield buf, base, base + len(buf)
+
+def _chars(units: Iterable[Unit]) -> Iterator[Piece]:
+    starts: List[Tuple[int, Optional[int]]] = []  # (offset, page) of units not yet passed
+
+    def texts():
+        pos = 0
+        for text, page, _ in units:
+            starts.append((pos, page))
+            pos += len(text)
+            yield text
+
+    for text, s, e in _stream_chunks(texts()):
+        while len(starts) > 1 and starts[1][0] <= s:
+            starts.pop(0)
+        yield text, s, e, starts[0][1] if starts else None, None
+
+# --- segment-packing modes ---
+_WORDS = re.compile(r"\S*\s*")
+_SENT_END = re.compile(r"[.!?][\"')\]]*\s+|\n\s*\n\s*")
+_MD_HEADING = re.compile(r"(?m)^#{1,6}[ \t]+\S.*(?:\n|$)")
+
+def _words(text: str) -> Iterator[str]:
+    for m in _WORDS.finditer(text):
+        if m.group():
+            yield m.group()
+
+def _sentences(text: str) -> Iterator[Tuple[str, bool]]:
+    # (sentence, starts_paragraph); sentences partition `text` including whitespace
+    i, para = 0, True
+    for m in _SENT_END.finditer(text):
+        yield text[i:m.end()], para
+        para = m.group().count("\n") > 1
+        i = m.end()
+    if i < len(text):
+        yield text[i:], para
+
+def _tokens(text: str) -> int:
+    return count_tokens(text) if text.strip() else 0
+
+def _segments(units: Iterable[Unit], mode: str, budget: int) -> Iterator[Tuple[str, Optional[int], str, int]]:
+    # Splits units into (text, page, kind, tokens) segments of at most `budget` tokens,
+    # kind: "word" | "sent" | "para" (sentence opening a paragraph/block) | "heading"
+    for text, page, kind in units:
+        if mode == "tokens":
+            for w in _words(text):
+                yield w, page, "word", _tokens(w)
+            continue
+        if kind == "heading":
+            yield text, page, "heading", _tokens(text)
+            continue
+        pieces = []
+        i = 0
+        for m in _MD_HEADING.finditer(text) if kind == "text" else ():
+            pieces += [(text[i:m.start()], False), (m.group(), True)]
+            i = m.end()
+        pieces.append((text[i:], False))
+        for piece, heading in pieces:
+            if heading:
+                yield piece, page, "heading", _tokens(piece)
+                continue
+            first = kind == "block"
+            for sent, para in _sentences(piece):
+                label = "para" if (para or first) else "sent"
+                first = False
+                n = _tokens(sent)
+                if n > budget:
+                    # An over-long "sentence" (e.g. a table row dump) falls back to word cuts
+                    for j, w in enumerate(_words(sent)):
+                        yield w, page, label if j == 0 else "word", _tokens(w)
+                else:
+                    yield sent, page, label, n
+
+def _pack(segments: Iterable[Tuple[str, Optional[int], str, int]], budget: int, overlap: int,
+          prefer_paragraphs: bool) -> Iterator[Piece]:
+    buf, base, pos = "", 0, 0       # buf holds document[base:pos]
+    cur: List[list] = []            # [start, end, page, tokens] of segments in the open chunk
+    size, section = 0, None
+
+    def emit():
+        body = [c for c in cur if c[3]]
+        s = body[0][0]
+        text = buf[s - base:body[-1][1] - base].rstrip()
+        return text, s, s + len(text), body[0][2], section
+
+    for text, page, kind, n in segments:
+        s, e = pos, pos + len(text)
+        buf += text; pos = e
+        has_body = any(c[3] for c in cur)
+        if kind == "heading":
+            if has_body:
+                yield emit()
+            cur, size = [], 0
+            section = text.strip().lstrip("#").strip()[:200] or section
+        elif has_body and (size + n > budget or (prefer_paragraphs and kind == "para" and size >= budget // 2)):
+            yield emit()
+            keep, t = [], 0
+            for c in reversed(cur):
+                if t + c[3] > overlap:
+                    break
+                keep.insert(0, c); t += c[3]
+            cur, size = (keep, t) if len(keep) < len(cur) else ([], 0)
+        if n or cur:
+            cur.append([s, e, page, n]); size += n
+        # Drop text no open chunk can reach any more (amortized, not per segment)
+        lo = cur[0][0] if cur else pos
+        if lo - base > 65536:
+            buf, base = buf[lo - base:], lo
+    if any(c[3] for c in cur):
+        yield emit()
+
+def chunk_units(units: Iterable[Unit], mode: str = "chars", tokens: int = 300, overlap: int = 40) -> Iterator[Piece]:
+    """Chunks a unit stream lazily; see the module docstring for the modes."""
+    if mode not in MODES:
+        raise ValueError(f"Unknown chunk mode {mode!r}; expected one of {', '.join(MODES)}")
+    if mode == "chars":
+        return _chars(units)
+    return _pack(_segments(units, mode, tokens), tokens, overlap, prefer_paragraphs=mode != "tokens")
@@ -1,17 +1,40 @@
-from typing import List, Optional, Tuple
-from openai import OpenAI
-from config import OPENAI_API_KEY, OPENAI_PROJECT_ID, OPENAI_ORG_ID, CHAT_MODEL, EMBED_MODEL, WEB_SEARCH_ENABLED
-
-client = OpenAI(
-    api_key=OPENAI_API_KEY,
-    project=OPENAI_PROJECT_ID if OPENAI_PROJECT_ID else None,
-    organization=OPENAI_ORG_ID if OPENAI_ORG_ID else None,
-)
+import threading, time
+from typing import Dict, Iterator, List, Optional, Tuple
+from . import embed_cache, tracing
+from .embed_profile import cache_model, request_args
+from .packing import pack
+from .chunking import count_tokens
+from config import (OPENAI_API_KEY, OPENAI_PROJECT_ID, OPENAI_ORG_ID, OPENAI_BASE_URL, CHAT_MODEL, EMBED_MODEL,
+                    WEB_SEARCH_ENABLED, CONTEXT_TOKEN_BUDGET)
+
+# The OpenAI client (and the openai package, about a second to import) is created on
+# first use, so a cold start can paint the page before anything asks a question.
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            from openai import OpenAI
+            _client = OpenAI(
+                api_key=OPENAI_API_KEY,
+                base_url=OPENAI_BASE_URL if OPENAI_BASE_URL else None,
+                project=OPENAI_PROJECT_ID if OPENAI_PROJECT_ID else None,
+                organization=OPENAI_ORG_ID if OPENAI_ORG_ID else None,
+            )
+        return _client
 
 # --- Embeddings ---
+@tracing.traced("openai.embed_query")
 def embed_query(q: str) -> List[float]:
-    emb = client.embeddings.create(model=EMBED_MODEL, input=q)
-    return emb.data[0].embedding
+    cached = embed_cache.get_many(cache_model(), [q], source="query")[0]
+    if cached is not None:
+        return cached
+    emb = get_client().embeddings.create(model=EMBED_MODEL, input=q, **request_args())
+    vec = emb.data[0].embedding
+    embed_cache.put_many(cache_model(), [q], [vec])
+    return vec
 
 # --- Answer composition (grounded) ---
 PROMPT = """
@@ -24,10 +47,19 @@ Return a concise answer.
 
 """
 
-def compose_grounded_answer(question: str, chunks: List[dict]) -> str:
+def _where(c: dict) -> str:
+    cids = c.get('cids') or [c['cid']]
+    where = f"chunk{'s' if len(cids) > 1 else ''} {', '.join(cids)} range {c['start']}-{c['end']}"
+    if c.get('page'): where += f", page {c['page']}"
+    if c.get('section'): where += f", section \"{c['section']}\""
+    return where
+
+def _grounded_messages(question: str, chunks: List[dict], stats: Optional[Dict] = None) -> List[dict]:
+    # `stats`, if given, receives the packing stats (see rag.packing) and 'prompt_tokens'
+    stats = stats if stats is not None else {}
     sources = "\n\n".join([
 
-        f"[{i+1}] {c['title']} (chunk {c['cid']} range {c['start']}-{c['end']}):\n{c['text']}" for i,c in enumerate(chunks)
+        f"[{i+1}] {c['title']} ({_where(c)}):\n{c['text']}" for i,c in enumerate(pack(chunks, CONTEXT_TOKEN_BUDGET, stats))
 
     ])
     messages = [
@@ -37,11 +69,22 @@ def compose_grounded_answer(question: str, chunks: List[dict]) -> str:
         {"role": "user", "content": f"Question: {question}\n\nSources:\n{sources}"}
 
     ]
+    stats["prompt_tokens"] = sum(count_tokens(m["content"]) for m in messages)
+    return messages
+
+def compose_grounded_answer(question: str, chunks: List[dict]) -> str:
+    packing: Dict = {}
+    messages = _grounded_messages(question, chunks, packing)
 
-    res = client.chat.completions.create(model=CHAT_MODEL, messages=messages)
+    with tracing.span("openai.compose", **_prompt_attrs(packing)):
+        res = get_client().chat.completions.create(model=CHAT_MODEL, messages=messages)
 
     return res.choices[0].message.content
 
+def _prompt_attrs(packing: Dict) -> Dict:
+    # Span attributes, so prompt size shows up next to latency in traces
+    return {k: packing[k] for k in ("prompt_tokens", "tokens_in", "tokens_out", "merged", "trimmed") if k in packing}
+
 # --- Web fallback (optional) ---
 def web_fallback_answer(question: str) -> Tuple[str, Optional[str]]:
 
@@ -57,13 +100,13 @@ def web_fallback_answer(question: str) -> Tuple[str, Optional[str]]:
 
         ]
 
-        res = client.chat.completions.create(model=CHAT_MODEL, messages=msg)
+        res = get_client().chat.completions.create(model=CHAT_MODEL, messages=msg)
 
         return ("Not found in Neo4j. " + res.choices[0].message.content, None)
 
     try:
 
-        res = client.responses.create(
+        res = get_client().responses.create(
 
             model=CHAT_MODEL,
 
@@ -109,7 +152,86 @@ def web_fallback_answer(question: str) -> Tuple[str, Optional[str]]:
 
         ]
 
-        res = client.chat.completions.create(model=CHAT_MODEL, messages=msg)
+        res = get_client().chat.completions.create(model=CHAT_MODEL, messages=msg)
 
         return ("Not found in Neo4j. " + res.choices[0].message.content, None)
 
+# --- Streaming variants ---
+# Generators yield text as it arrives. Pass a `meta` dict to receive 'ttft' and 'total'
+# (seconds from the request) and, for the fallback, 'external_link'.
+FALLBACK_SYSTEM = "Answer generally. If not in local context, say it's not from the database."
+
+def _stream_chat(messages: List[dict], meta: Dict, t0: float) -> Iterator[str]:
+    stream = get_client().chat.completions.create(model=CHAT_MODEL, messages=messages, stream=True)
+    for event in stream:
+        delta = event.choices[0].delta.content if event.choices else None
+        if delta:
+            meta.setdefault("ttft", time.perf_counter() - t0)
+            yield delta
+
+def stream_grounded_answer(question: str, chunks: List[dict], meta: Optional[Dict] = None) -> Iterator[str]:
+    meta = meta if meta is not None else {}
+    t0 = time.perf_counter()
+    packing: Dict = {}
+    messages = _grounded_messages(question, chunks, packing)
+    meta["prompt_tokens"] = packing["prompt_tokens"]
+    yield from _stream_chat(messages, meta, t0)
+    meta["total"] = time.perf_counter() - t0
+    _record_stream("openai.compose", meta, **_prompt_attrs(packing))
+
+def _record_stream(name: str, meta: Dict, **attrs):
+    if "ttft" in meta:
+        tracing.record(name + ".ttft", meta["ttft"])
+    tracing.record(name, meta["total"], **attrs)
+
+def stream_web_fallback_answer(question: str, meta: Optional[Dict] = None) -> Iterator[str]:
+    meta = meta if meta is not None else {}
+    meta["external_link"] = None
+    t0 = time.perf_counter()
+    general = [
+        {"role": "system", "content": FALLBACK_SYSTEM},
+        {"role": "user", "content": question},
+    ]
+    if WEB_SEARCH_ENABLED:
+        started = False
+        try:
+            stream = get_client().responses.create(
+                model=CHAT_MODEL,
+                input=question,
+                tools=[{"type": "web_search"}],
+                tool_choice="auto",
+                stream=True,
+            )
+            for event in stream:
+                if event.type == "response.output_text.delta" and event.delta:
+                    if not started:
+                        started = True
+                        meta["ttft"] = time.perf_counter() - t0
+                        yield "Not found in Neo4j. Based on the web: "
+                    yield event.delta
+                elif event.type == "response.completed":
+                    for b in (getattr(event.response, "output", []) or []):
+                        urls = getattr(b, "urls", None)
+                        if urls:
+                            meta["external_link"] = urls[0]
+                            break
+            if started:
+                meta["total"] = time.perf_counter() - t0
+                _record_stream("openai.fallback", meta)
+                return
+        except Exception:
+            # Before any text this is the tool not being enabled for the key/account: fall
+            # through to the plain answer. After it the answer is cut off; say so, and keep
+            # it out of the stream timings since it never completed.
+            if started:
+                meta["interrupted"] = True
+                yield "\n\n[answer interrupted]"
+                return
+    first = True
+    for delta in _stream_chat(general, meta, t0):
+        if first:
+            first = False
+            yield "Not found in Neo4j. "
+        yield delta
+    meta["total"] = time.perf_counter() - t0
+    _record_stream("openai.fallback", meta)
@@ -0,0 +1,126 @@
+"""
+The process-wide Neo4j driver.
+
+One pool per process, created on first use (importing this module connects to
+nothing, and does not even load the neo4j package, most of a second of a cold
+start), shared by rag.store, rag.graph_explorer, the job workers and the async
+retriever's settings. Queries go through read()/write(), which run managed
+transactions (execute_read / execute_write): the driver retries them on transient
+errors and, on Aura and other clusters, routes reads to followers.
+
+Pool settings come from config (NEO4J_POOL_SIZE, NEO4J_ACQUIRE_TIMEOUT, ...).
+metrics() reports sessions and transactions since start plus, per server, the
+connections in use and idle right now, for sizing the pool against concurrent users.
+"""
+import atexit, threading, time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional
+from config import (NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD, NEO4J_DATABASE, NEO4J_POOL_SIZE, NEO4J_ACQUIRE_TIMEOUT,
+                    NEO4J_CONNECT_TIMEOUT, NEO4J_LIVENESS_CHECK, NEO4J_MAX_CONN_LIFETIME, NEO4J_FETCH_SIZE)
+
+_driver = None
+_lock = threading.Lock()
+_counts: Counter = Counter()
+_active = 0
+_peak = 0
+_tx_seconds = {"read": 0.0, "write": 0.0}
+
+def driver_options() -> Dict:
+    """Keyword arguments for GraphDatabase.driver / AsyncGraphDatabase.driver."""
+    return {"auth": (NEO4J_USER, NEO4J_PASSWORD),
+            "max_connection_pool_size": NEO4J_POOL_SIZE,
+            "connection_acquisition_timeout": NEO4J_ACQUIRE_TIMEOUT,
+            "connection_timeout": NEO4J_CONNECT_TIMEOUT,
+            "liveness_check_timeout": NEO4J_LIVENESS_CHECK,
+            "max_connection_lifetime": NEO4J_MAX_CONN_LIFETIME}
+
+def get_driver():
+    global _driver
+    with _lock:
+        if _driver is None:
+            from neo4j import GraphDatabase
+            _driver = GraphDatabase.driver(NEO4J_URI, **driver_options())
+            atexit.register(close)
+        return _driver
+
+def close():
+    global _driver
+    with _lock:
+        if _driver is not None:
+            _driver.close()
+            _driver = None
+
+@contextmanager
+def session(read: bool = False) -> Iterator:
+    """A session on the shared pool; read=True marks auto-commit queries as reads for routing."""
+    global _active, _peak
+    from neo4j import READ_ACCESS, WRITE_ACCESS
+    s = get_driver().session(database=NEO4J_DATABASE, fetch_size=NEO4J_FETCH_SIZE,
+                             default_access_mode=READ_ACCESS if read else WRITE_ACCESS)
+    with _lock:
+        _counts["sessions"] += 1
+        _active += 1
+        _peak = max(_peak, _active)
+    try:
+        with s:
+            yield s
+    except Exception as e:
+        with _lock:
+            _counts[f"errors.{type(e).__name__}"] += 1
+        raise
+    finally:
+        with _lock:
+            _active -= 1
+
+def _execute(kind: str, work: Callable):
+    t0 = time.perf_counter()
+    with session(read=kind == "read") as s:
+        out = (s.execute_read if kind == "read" else s.execute_write)(work)
+    with _lock:
+        _counts[f"tx.{kind}"] += 1
+        _tx_seconds[kind] += time.perf_counter() - t0
+    return out
+
+def read(cypher: str, **params) -> List[Dict]:
+    """All rows of a read query, as dicts."""
+    return _execute("read", lambda tx: tx.run(cypher, **params).data())
+
+def read_single(cypher: str, **params):
+    """The only row of a read query (a Record), or None."""
+    return _execute("read", lambda tx: tx.run(cypher, **params).single())
+
+def write(cypher: str, **params):
+    """Runs a write query; returns its ResultSummary."""
+    return _execute("write", lambda tx: tx.run(cypher, **params).consume())
+
+def read_tx(work: Callable):
+    """Runs work(tx) in one managed read transaction, for several queries that belong together."""
+    return _execute("read", work)
+
+def write_tx(work: Callable):
+    return _execute("write", work)
+
+def metrics() -> Dict:
+    """Session/transaction counters since start and the pool's current connections per server."""
+    with _lock:
+        out = {"sessions_opened": _counts["sessions"], "sessions_active": _active, "sessions_peak": _peak,
+               "tx_read": _counts["tx.read"], "tx_write": _counts["tx.write"],
+               "tx_read_ms_mean": round(1000 * _tx_seconds["read"] / _counts["tx.read"], 2) if _counts["tx.read"] else 0.0,
+               "tx_write_ms_mean": round(1000 * _tx_seconds["write"] / _counts["tx.write"], 2) if _counts["tx.write"] else 0.0,
+               "errors": {k.split(".", 1)[1]: v for k, v in _counts.items() if k.startswith("errors.")},
+               "pool_size": NEO4J_POOL_SIZE}
+        drv = _driver
+    out["connections"] = _connections(drv) if drv is not None else {}
+    return out
+
+def _connections(drv) -> Dict:
+    # The driver has no public pool API; read its pool defensively and report nothing if that changes
+    try:
+        pool = drv._pool
+        with pool.lock:
+            return {str(addr): {"in_use": sum(1 for c in conns if c.in_use),
+                                "idle": sum(1 for c in conns if not c.in_use)}
+                    for addr, conns in pool.connections.items()}
+    except Exception:
+        return {}
@@ -0,0 +1,109 @@
+import hashlib, os, sqlite3, threading, time
+from typing import Dict, List, Optional
+import numpy as np
+from config import EMBED_CACHE_ENABLED, EMBED_CACHE_PATH, EMBED_CACHE_MB
+
+# Content-addressed embeddings on disk: key = sha256(model, text), value = float32 bytes.
+# Shared by every process pointing at the same file (WAL mode), evicted LRU by size.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS emb (
+    key       TEXT PRIMARY KEY,
+    vec       BLOB NOT NULL,
+    nbytes    INTEGER NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS emb_last_used ON emb(last_used);
+"""
+
+_lock = threading.Lock()
+_conn: Optional[sqlite3.Connection] = None
+_total_bytes = 0
+_counters = {"query": {"hits": 0, "misses": 0}, "ingest": {"hits": 0, "misses": 0}}
+
+def _db() -> sqlite3.Connection:
+    global _conn, _total_bytes
+    if _conn is None:
+        os.makedirs(os.path.dirname(EMBED_CACHE_PATH) or ".", exist_ok=True)
+        _conn = sqlite3.connect(EMBED_CACHE_PATH, check_same_thread=False, timeout=30)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute("PRAGMA synchronous=NORMAL")
+        _conn.executescript(SCHEMA)
+        _total_bytes = _conn.execute("SELECT COALESCE(SUM(nbytes), 0) FROM emb").fetchone()[0]
+    return _conn
+
+def key(model: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+def get_many(model: str, texts: List[str], source: str = "ingest") -> List[Optional[List[float]]]:
+    if not EMBED_CACHE_ENABLED or not texts:
+        return [None] * len(texts)
+    keys = [key(model, t) for t in texts]
+    found: Dict[str, bytes] = {}
+    with _lock:
+        db = _db()
+        for i in range(0, len(keys), 500):  # stay under SQLite's bound-parameter limit
+            part = keys[i:i + 500]
+            marks = ",".join("?" * len(part))
+            found.update(db.execute(f"SELECT key, vec FROM emb WHERE key IN ({marks})", part).fetchall())
+        if found:
+            now = time.time()
+            db.executemany("UPDATE emb SET last_used=? WHERE key=?", [(now, k) for k in found])
+            db.commit()
+        c = _counters.setdefault(source, {"hits": 0, "misses": 0})
+        c["hits"] += len(found)
+        c["misses"] += len(keys) - len(found)
+    return [np.frombuffer(found[k], dtype=np.float32).tolist() if k in found else None for k in keys]
+
+def put_many(model: str, texts: List[str], vecs: List[List[float]]):
+    global _total_bytes
+    if not EMBED_CACHE_ENABLED or not texts:
+        return
+    now = time.time()
+    rows = []
+    for t, v in zip(texts, vecs):
+        blob = np.asarray(v, dtype=np.float32).tobytes()
+        rows.append((key(model, t), blob, len(blob), now))
+    rows = list({r[0]: r for r in rows}.values())  # one row per key, the last one wins as in the REPLACE below
+    with _lock:
+        db = _db()
+        # REPLACE swaps out rows already stored under these keys, so only the difference is added
+        replaced = 0
+        for i in range(0, len(rows), 500):
+            part = [r[0] for r in rows[i:i + 500]]
+            marks = ",".join("?" * len(part))
+            replaced += db.execute(f"SELECT COALESCE(SUM(nbytes), 0) FROM emb WHERE key IN ({marks})", part).fetchone()[0]
+        db.executemany("INSERT OR REPLACE INTO emb(key, vec, nbytes, last_used) VALUES (?,?,?,?)", rows)
+        _total_bytes += sum(r[2] for r in rows) - replaced
+        if _total_bytes > EMBED_CACHE_MB * 1024 * 1024:
+            _evict(db)
+        db.commit()
+
+def _evict(db: sqlite3.Connection):
+    # Drop least-recently-used entries until we're back under 90% of the budget
+    global _total_bytes
+    _total_bytes = db.execute("SELECT COALESCE(SUM(nbytes), 0) FROM emb").fetchone()[0]
+    target = int(EMBED_CACHE_MB * 1024 * 1024 * 0.9)
+    while _total_bytes > target:
+        rows = db.execute("SELECT key, nbytes FROM emb ORDER BY last_used LIMIT 1000").fetchall()
+        if not rows:
+            break
+        drop, freed = [], 0
+        for k, n in rows:
+            if _total_bytes - freed <= target:
+                break
+            drop.append((k,)); freed += n
+        db.executemany("DELETE FROM emb WHERE key=?", drop)
+        _total_bytes -= freed
+
+def stats() -> Dict:
+    # Hit counters are per process; entries/bytes describe the shared file
+    with _lock:
+        out = {}
+        for src, c in _counters.items():
+            total = c["hits"] + c["misses"]
+            out[src] = {**c, "hit_rate": c["hits"] / total if total else 0.0}
+        if EMBED_CACHE_ENABLED:
+            out["entries"] = _db().execute("SELECT COUNT(*) FROM emb").fetchone()[0]
+        out["bytes"] = _total_bytes
+    return out
@@ -0,0 +1,150 @@
+"""
+Embedding profiles: the model plus a vector size (EMBED_DIM), and where that size lives in Neo4j.
+
+text-embedding-3 models can return shorter vectors (the `dimensions` request
+parameter). OpenAI shortens them by truncating and re-normalizing, so a stored
+full-size vector can be cut down here with the same result and no API call. The
+model's native size keeps the original names (Chunk.embedding, chunk_vec_idx); any
+other size gets its own property and index (embedding_512, chunk_vec_idx_512), so
+two profiles can coexist while one replaces the other:
+
+    python -m rag.embed_profile status
+    python -m rag.embed_profile migrate --dim 512              # truncate the stored vectors
+    python -m rag.embed_profile migrate --dim 512 --reembed    # or embed the chunk texts again
+    python -m rag.embed_profile drop --dim 1536                # once nothing reads it
+
+migrate fills the new property in keyset pages while the app keeps searching the
+old one, creates the new vector index, waits for it to come online, then makes a
+catch-up pass for chunks written meanwhile (it gives up if the index fails or is
+not online within --timeout seconds). Then set EMBED_DIM and restart; run
+migrate again to pick up uploads from processes that were still on the old profile,
+and drop the old one. Each profile property has a companion <property>_hash with
+the content_hash it was computed from, so a pass never keeps a vector of older text.
+"""
+import json, time
+from typing import Callable, Dict, Sequence, Tuple
+import numpy as np
+from config import EMBED_MODEL, EMBED_DIM
+
+NATIVE_DIMS = {"text-embedding-3-small": 1536, "text-embedding-3-large": 3072, "text-embedding-ada-002": 1536}
+
+def native_dim(model: str = EMBED_MODEL) -> int:
+    # Unknown models (e.g. an OpenAI-compatible server) are taken at EMBED_DIM
+    return NATIVE_DIMS.get(model, EMBED_DIM)
+
+def names(dim: int = EMBED_DIM) -> Tuple[str, str]:
+    """(Chunk property, vector index name) for vectors of size `dim`."""
+    if dim == native_dim():
+        return "embedding", "chunk_vec_idx"
+    return f"embedding_{int(dim)}", f"chunk_vec_idx_{int(dim)}"
+
+def request_args(dim: int = EMBED_DIM) -> Dict:
+    """Extra keyword arguments for embeddings.create."""
+    if dim == native_dim():
+        return {}
+    if not EMBED_MODEL.startswith("text-embedding-3") or dim > native_dim():
+        raise ValueError(f"{EMBED_MODEL} returns {native_dim()}-dimension vectors; EMBED_DIM={dim} needs a "
+                         f"text-embedding-3 model and at most {native_dim()}")
+    return {"dimensions": dim}
+
+def cache_model(dim: int = EMBED_DIM) -> str:
+    # Embedding cache namespace: native vectors keep the bare model name, so existing entries stay valid
+    return EMBED_MODEL if dim == native_dim() else f"{EMBED_MODEL}@{dim}"
+
+def truncate(vecs: Sequence[Sequence[float]], dim: int) -> np.ndarray:
+    """The first `dim` components of each vector, re-normalized (what `dimensions` returns)."""
+    m = np.asarray(vecs, dtype=np.float32)[:, :dim]
+    return m / (np.linalg.norm(m, axis=1, keepdims=True) + 1e-9)
+
+# --- migration ---
+
+def _pass(src: int, dst: int, reembed: bool, batch: int, log: Callable) -> Dict:
+    from . import store
+    out = {"written": 0, "skipped": 0}
+    after = ""
+    while True:
+        rows = store.profile_pending(src, dst, after, batch)
+        if not rows:
+            return out
+        after = rows[-1]["id"]
+        if reembed:
+            from .embedder import embed_texts
+            todo = [r for r in rows if r["text"]]
+            vecs = embed_texts([r["text"] for r in todo], dim=dst)
+        else:
+            # A source vector computed from older text (or missing) would be wrong here; --reembed covers those
+            todo = [r for r in rows if r["vec"] is not None and len(r["vec"]) >= dst
+                    and (r["src_hash"] is None or r["src_hash"] == r["hash"])]
+            vecs = truncate([r["vec"] for r in todo], dst).tolist() if todo else []
+        store.profile_write(dst, [{"id": r["id"], "hash": r["hash"], "vec": v} for r, v in zip(todo, vecs)])
+        out["written"] += len(todo)
+        out["skipped"] += len(rows) - len(todo)
+        log(f"  {out['written']} written, {out['skipped']} skipped (at {after})")
+
+def migrate(dim: int, reembed: bool = False, batch: int = 500, log: Callable = print,
+            timeout: float = 3600) -> Dict:
+    """
+    Fills profile `dim` from the active one (EMBED_DIM) and brings its vector index online.
+    Raises RuntimeError if the index fails or is still populating after `timeout` seconds.
+    """
+    from . import store
+    if not reembed and dim > EMBED_DIM:
+        raise ValueError(f"cannot truncate {EMBED_DIM}-dimension vectors to {dim}; use --reembed")
+    request_args(dim)
+    t0 = time.perf_counter()
+    log(f"filling {names(dim)[0]} from {'chunk text' if reembed else names(EMBED_DIM)[0]}")
+    report = {"dim": dim, "first_pass": _pass(EMBED_DIM, dim, reembed, batch, log)}
+    store.create_vector_index(dim)
+    index, deadline = names(dim)[1], time.monotonic() + timeout
+    while True:
+        state = store.vector_index_state(index)
+        if state is None or state["state"] == "ONLINE":
+            break
+        if state["state"] == "FAILED":
+            raise RuntimeError(f"{index} failed to populate: {state.get('failure') or 'no failure message'}; "
+                               f"drop it with `python -m rag.embed_profile drop --dim {dim}` and migrate again")
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"{index} is still {state['state']} ({state['pct'] or 0:.0f}%) after {timeout:.0f}s; "
+                               "run migrate again to resume")
+        log(f"  {index}: {state['state']} {state['pct'] or 0:.0f}%")
+        time.sleep(2)
+    report["catch_up"] = _pass(EMBED_DIM, dim, reembed, batch, log)
+    report["seconds"] = round(time.perf_counter() - t0, 1)
+    return report
+
+def drop(dim: int, batch: int = 5000, log: Callable = print) -> int:
+    """Drops profile `dim`'s vector index and removes its property from every chunk."""
+    from . import store
+    if dim == EMBED_DIM:
+        raise ValueError(f"{dim} is the active profile (EMBED_DIM)")
+    store.drop_vector_index(dim)
+    removed = 0
+    while True:
+        n = store.profile_remove(dim, batch)
+        removed += n
+        if not n:
+            return removed
+        log(f"  removed from {removed} chunks")
+
+def main():
+    import argparse
+    ap = argparse.ArgumentParser(prog="python -m rag.embed_profile")
+    ap.add_argument("cmd", choices=["status", "migrate", "drop"])
+    ap.add_argument("--dim", type=int)
+    ap.add_argument("--reembed", action="store_true", help="embed chunk texts again instead of truncating")
+    ap.add_argument("--batch", type=int, default=500)
+    ap.add_argument("--timeout", type=float, default=3600, help="seconds to wait for the new index to come online")
+    a = ap.parse_args()
+    from . import store
+    if a.cmd != "status" and not a.dim:
+        ap.error(f"{a.cmd} needs --dim")
+    if a.cmd == "migrate":
+        print(json.dumps(migrate(a.dim, a.reembed, a.batch, timeout=a.timeout), indent=2))
+    elif a.cmd == "drop":
+        print(f"removed {names(a.dim)[0]} from {drop(a.dim)} chunks")
+    prop, index = names()
+    print(json.dumps({"model": EMBED_MODEL, "active": {"dim": EMBED_DIM, "property": prop, "index": index},
+                      "profiles": store.vector_profiles()}, indent=2))
+
+if __name__ == "__main__":
+    main()
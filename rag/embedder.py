@@ -0,0 +1,91 @@
+import random, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+from config import EMBED_MODEL, EMBED_DIM, EMBED_BATCH_ITEMS, EMBED_BATCH_TOKENS, EMBED_CONCURRENCY, EMBED_MAX_RETRIES
+from . import embed_cache
+from .embed_profile import cache_model, request_args
+from .tracing import traced
+from .composer import get_client
+
+# We do our own backoff so retries are counted and Retry-After is honoured per batch.
+# Like composer.get_client, the client (and the openai package) is only created on first use.
+_client = None
+_client_lock = threading.Lock()
+
+def _get_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = get_client().with_options(max_retries=0)
+        return _client
+
+def _retryable() -> tuple:
+    # Only evaluated once a request has failed, so openai is loaded by then
+    from openai import RateLimitError, APIConnectionError, APITimeoutError, InternalServerError
+    return (RateLimitError, APIConnectionError, APITimeoutError, InternalServerError)
+# Batches run on a thread pool and share the caller's stats dict
+_stats_lock = threading.Lock()
+
+def _approx_tokens(text: str) -> int:
+    # ~4 chars/token for English; 3 keeps us safely under the request limit
+    return len(text) // 3 + 1
+
+def _batches(texts: List[str], max_items: int, max_tokens: int) -> List[List[int]]:
+    out, cur, cur_tok = [], [], 0
+    for i, t in enumerate(texts):
+        tok = _approx_tokens(t)
+        if cur and (len(cur) >= max_items or cur_tok + tok > max_tokens):
+            out.append(cur); cur, cur_tok = [], 0
+        cur.append(i); cur_tok += tok
+    if cur:
+        out.append(cur)
+    return out
+
+def _retry_after(err: Exception) -> Optional[float]:
+    try:
+        return float(err.response.headers.get("retry-after"))
+    except Exception:
+        return None
+
+def _embed_batch(batch: List[str], stats: Dict, dim: int = EMBED_DIM) -> List[List[float]]:
+    delay = 0.5
+    for attempt in range(EMBED_MAX_RETRIES + 1):
+        try:
+            res = _get_client().embeddings.create(model=EMBED_MODEL, input=batch, **request_args(dim))
+            return [d.embedding for d in sorted(res.data, key=lambda d: d.index)]
+        except _retryable() as e:
+            if attempt == EMBED_MAX_RETRIES:
+                raise
+            with _stats_lock:
+                stats["retries"] += 1
+            time.sleep(_retry_after(e) or delay * (1 + random.random()))
+            delay = min(delay * 2, 30.0)
+
+@traced("openai.embed_texts")
+def embed_texts(texts: List[str], stats: Optional[Dict] = None, dim: int = EMBED_DIM) -> List[List[float]]:
+    """
+    Embeds `texts` in as few requests as the item/token limits allow, running up to
+    EMBED_CONCURRENCY requests at once. Output order matches input order.
+    Texts already in the embedding cache are not sent.
+    `dim` picks the embedding profile (rag.embed_profile); migrations embed for a profile not yet active.
+    If `stats` is given it is filled with chunks, cache_hits, batches, retries, seconds and chunks_per_sec.
+    """
+    stats = stats if stats is not None else {}
+    stats.update(chunks=len(texts), cache_hits=0, batches=0, retries=0, seconds=0.0, chunks_per_sec=0.0)
+    if not texts:
+        return []
+    t0 = time.perf_counter()
+    out: List[Optional[List[float]]] = embed_cache.get_many(cache_model(dim), texts, source="ingest")
+    todo = [i for i, v in enumerate(out) if v is None]
+    stats["cache_hits"] = len(texts) - len(todo)
+    groups = [[todo[j] for j in g] for g in _batches([texts[i] for i in todo], EMBED_BATCH_ITEMS, EMBED_BATCH_TOKENS)]
+    stats["batches"] = len(groups)
+    with ThreadPoolExecutor(max_workers=max(1, EMBED_CONCURRENCY)) as pool:
+        results = pool.map(lambda g: _embed_batch([texts[i] for i in g], stats, dim), groups)
+        for g, vecs in zip(groups, results):
+            for i, v in zip(g, vecs):
+                out[i] = v
+            embed_cache.put_many(cache_model(dim), [texts[i] for i in g], vecs)
+    stats["seconds"] = time.perf_counter() - t0
+    stats["chunks_per_sec"] = len(texts) / stats["seconds"] if stats["seconds"] else 0.0
+    return out
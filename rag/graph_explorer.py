@@ -1,94 +1,247 @@
-from __future__ import annotations
-from typing import List, Dict
-from neo4j import GraphDatabase
-from pyvis.network import Network
-import json, os, tempfile
-from config import NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD
-
-driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
-
-def _first_label(labels: List[str]) -> str:
-    return labels[0] if labels else "Node"
-
-def _node_label(props: Dict, labels: List[str]) -> str:
-    # Prefer a human title if present, else first label or id
-    for k in ("title", "name", "id"):
-        if k in props and isinstance(props[k], (str, int, float)):
-            return str(props[k])
-    return _first_label(labels)
-
-def _tooltip(props: Dict, labels: List[str]) -> str:
-    # Pretty JSON tooltip
-    return f"<b>{', '.join(labels) or 'Node'}</b><br/><pre style='white-space:pre-wrap'>{json.dumps(props, indent=2)[:4000]}</pre>"
-
-def render_graph_html(max_nodes: int = 1000) -> str:
-    """
-    Returns a path to a temporary HTML file with the interactive graph.
-    Only the first `max_nodes` nodes (ordered by internal id) are included,
-    and relationships only between those nodes.
-    """
-    with driver.session() as s:
-        # 1) Pick a node set (cap to avoid OOM on big graphs)
-        node_rows = s.run(
-            "MATCH (n) RETURN id(n) AS id, labels(n) AS labels, properties(n) AS props ORDER BY id(n) LIMIT $limit",
-            limit=max_nodes,
-        ).data()
-        node_ids = [r["id"] for r in node_rows] or [-1]
-
-        # 2) Relationships among those nodes
-        rel_rows = s.run(
-            """
-            MATCH (n)-[r]->(m)
-            WHERE id(n) IN $ids AND id(m) IN $ids
-            RETURN id(r) AS id, id(n) AS src, id(m) AS dst, type(r) AS type, properties(r) AS props
-            """,
-            ids=node_ids,
-        ).data()
-
-    net = Network(height="780px", width="100%", directed=True, bgcolor="#ffffff")
-    net.force_atlas_2based(gravity=-30)
-
-    # Add nodes
-    for r in node_rows:
-        nid = r["id"]
-        labels = r["labels"] or []
-        props = r["props"] or {}
-        net.add_node(
-            nid,
-            label=_node_label(props, labels),
-            title=_tooltip(props, labels),
-            shape="dot",
-            size=12,
-        )
-
-    # Add edges
-    for r in rel_rows:
-        net.add_edge(
-            r["src"],
-            r["dst"],
-            label=r["type"],
-            title=f"<b>{r['type']}</b><br/><pre style='white-space:pre-wrap'>{json.dumps(r.get('props', {}), indent=2)[:2000]}</pre>",
-            arrows="to",
-            physics=True,
-        )
-
-    # --- FIX: set_options must be JSON, not JS ---
-    net.set_options("""
-    {
-      "nodes": { "font": { "size": 12 } },
-      "edges": { "smooth": { "type": "dynamic" } },
-      "physics": {
-        "solver": "forceAtlas2Based",
-        "stabilization": { "iterations": 200 }
-      }
-    }
-    """)
-
-    # Write tmp HTML and return path
-    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".html")
-    tmp.close()
-    # Streamlit-safe render (no notebook template, no browser popup)
-    net.write_html(tmp.name, open_browser=False, notebook=False)
-    return tmp.name
-
-
+"""
+Graph explorer for the Admin panel.
+
+Views are built server-side from small projections, never properties(n): a Chunk's
+embedding alone is 1536 floats. The overview is one node per CaseStudy sized by its
+chunk count, paged by title. Expanding a case study adds its chunks (order, page,
+section and a short text preview), also paged; expanding any other node adds its
+neighbours, up to a limit. Positions are computed here and the browser physics is
+off, so large pages render without a layout pass.
+
+explore() serves the Admin panel: the counts, the overview page and the expanded
+chunk pages are fetched once per view and used both for its controls and, when the
+view isn't cached, for the HTML.
+
+Rendered HTML is cached in memory and under GRAPH_CACHE_DIR, keyed by the view and a
+graph stamp: the corpus version that ingest bumps, plus node and relationship
+counts (from Neo4j's count store) to catch writes made outside the app, such as the
+Colab notebook. Repeated views are a file read.
+"""
+from __future__ import annotations
+from collections import OrderedDict
+from typing import Dict, List, Optional
+import hashlib, html, json, math, os, tempfile, threading
+from pyvis.network import Network
+from config import GRAPH_PAGE_SIZE, GRAPH_CACHE_DIR
+from . import db
+from .store import corpus_version
+
+PREVIEW_CHARS = 160
+NEIGHBOR_LIMIT = 50
+_MEMORY_ENTRIES = 32
+
+OVERVIEW = """
+
+MATCH (cs:CaseStudy)
+WITH cs ORDER BY cs.title, cs.case_id SKIP $skip LIMIT $limit
+RETURN elementId(cs) AS id, cs.case_id AS case_id, cs.title AS title, cs.url AS url,
+       COUNT { (cs)-[:HAS_CHUNK]->() } AS chunks
+"""
+
+COUNTS = """
+
+CALL { MATCH (cs:CaseStudy) RETURN count(cs) AS cases }
+CALL { MATCH (c:Chunk) RETURN count(c) AS chunks }
+CALL { MATCH (n) RETURN count(n) AS nodes }
+CALL { MATCH ()-[r]->() RETURN count(r) AS rels }
+RETURN cases, chunks, nodes, rels
+"""
+
+CASE_CHUNKS = """
+
+MATCH (cs:CaseStudy {case_id: $case_id})-[:HAS_CHUNK]->(c:Chunk)
+WITH cs, c ORDER BY c.order SKIP $skip LIMIT $limit
+RETURN elementId(cs) AS case_node, elementId(c) AS id, c.chunk_id AS chunk_id, c.order AS ord,
+       c.page AS page, c.section AS section, left(c.text, $preview) AS preview
+"""
+
+NEIGHBORS = """
+
+MATCH (n)-[r]-(m) WHERE elementId(n) = $id
+WITH n, r, m LIMIT $limit
+RETURN coalesce(n.title, n.name, n.chunk_id, n.case_id, n.key) AS center,
+       elementId(m) AS id, labels(m) AS labels, type(r) AS type, startNode(r) = n AS outgoing,
+       coalesce(m.title, m.name, m.chunk_id, m.case_id, m.key) AS name,
+       left(coalesce(m.text, ''), $preview) AS preview
+"""
+
+_memory: "OrderedDict[str, str]" = OrderedDict()
+_memory_lock = threading.Lock()
+
+# --- data ---
+
+def graph_stamp(c: Optional[Dict] = None) -> str:
+    # `c`: counts() already fetched for this view
+    c = c or db.read_single(COUNTS)
+    return f"v{corpus_version()}-n{c['nodes']}-r{c['rels']}"
+
+def counts() -> Dict:
+    return dict(db.read_single(COUNTS))
+
+def overview(page: int = 0, page_size: int = GRAPH_PAGE_SIZE) -> List[Dict]:
+    return db.read(OVERVIEW, skip=page * page_size, limit=page_size)
+
+def case_chunks(case_id: str, page: int = 0, page_size: int = GRAPH_PAGE_SIZE) -> List[Dict]:
+    return db.read(CASE_CHUNKS, case_id=case_id, skip=page * page_size, limit=page_size, preview=PREVIEW_CHARS)
+
+def neighbors(node_id: str, limit: int = NEIGHBOR_LIMIT) -> List[Dict]:
+    return db.read(NEIGHBORS, id=node_id, limit=limit, preview=PREVIEW_CHARS)
+
+# --- layout + HTML ---
+
+def _ring(n: int, radius: float, cx: float = 0.0, cy: float = 0.0, start: float = 0.0):
+    # Evenly spaced points on a circle; rings grow with n so nodes keep their spacing
+    radius = max(radius, 18.0 * n / (2 * math.pi))
+    return [(cx + radius * math.cos(start + 2 * math.pi * i / max(n, 1)),
+             cy + radius * math.sin(start + 2 * math.pi * i / max(n, 1))) for i in range(n)]
+
+def _tip(title: str, lines: List[str]) -> str:
+    return f"<b>{html.escape(title)}</b>" + "".join(f"<br/>{html.escape(str(l))}" for l in lines if l)
+
+def _build(cases: List[Dict], expanded: Dict[str, List[Dict]], around: Optional[Dict] = None) -> Dict:
+    nodes, edges = [], []
+    pos = _ring(len(cases), 300.0)
+    for (x, y), c in zip(pos, cases):
+        nodes.append({"id": c["id"], "label": c["title"] or c["case_id"], "x": x, "y": y, "shape": "dot",
+                      "size": 10 + 4 * math.log1p(c["chunks"] or 0), "color": "#1f77b4",
+                      "title": _tip(c["title"] or c["case_id"], [c["case_id"], f"{c['chunks']} chunks", c.get("url")])})
+        rows = expanded.get(c["case_id"]) or []
+        if not rows:
+            continue
+        out = math.atan2(y, x)
+        for (cx_, cy_), r in zip(_ring(len(rows), 90.0, x * 1.6, y * 1.6, out), rows):
+            where = [f"order {r['ord']}", f"page {r['page']}" if r.get("page") else None, r.get("section")]
+            nodes.append({"id": r["id"], "label": str(r["ord"]), "x": cx_, "y": cy_, "shape": "dot", "size": 6,
+                          "color": "#ff7f0e", "title": _tip(r["chunk_id"], where + [(r["preview"] or "") + "…"])})
+            edges.append({"from": c["id"], "to": r["id"]})
+    if around:
+        center = around["node"]
+        if not any(n["id"] == center["id"] for n in nodes):
+            nodes.append({"id": center["id"], "label": center.get("name") or "node", "x": 0, "y": 0,
+                          "shape": "dot", "size": 12, "color": "#2ca02c", "title": _tip(center.get("name") or "", [])})
+        known = {n["id"] for n in nodes}
+        for (x, y), r in zip(_ring(len(around["rows"]), 200.0), around["rows"]):
+            if r["id"] not in known:
+                nodes.append({"id": r["id"], "label": r["name"] or (r["labels"] or ["node"])[0], "x": x, "y": y,
+                              "shape": "dot", "size": 7, "color": "#9467bd",
+                              "title": _tip(", ".join(r["labels"] or []), [r["name"], r["preview"]])})
+                known.add(r["id"])
+            a, b = (center["id"], r["id"]) if r["outgoing"] else (r["id"], center["id"])
+            edges.append({"from": a, "to": b, "label": r["type"]})
+    return {"nodes": nodes, "edges": edges}
+
+def _html(graph: Dict) -> str:
+    net = Network(height="780px", width="100%", directed=True, bgcolor="#ffffff")
+    net.toggle_physics(False)  # positions come from _build
+    for n in graph["nodes"]:
+        net.add_node(n.pop("id"), **n)
+    for e in graph["edges"]:
+        net.add_edge(e["from"], e["to"], title=e.get("label"), label=e.get("label"), arrows="to", color="#bbbbbb")
+    net.set_options("""
+    {
+      "nodes": { "font": { "size": 11 } },
+      "edges": { "font": { "size": 9 }, "smooth": false },
+      "physics": { "enabled": false },
+      "interaction": { "hover": true, "tooltipDelay": 100 }
+    }
+    """)
+    return net.generate_html(notebook=False)
+
+# --- cached views ---
+
+def _cache_get(key: str) -> Optional[str]:
+    with _memory_lock:
+        if key in _memory:
+            _memory.move_to_end(key)
+            return _memory[key]
+    path = os.path.join(GRAPH_CACHE_DIR, key + ".html")
+    try:
+        with open(path, encoding="utf-8") as f:
+            out = f.read()
+    except OSError:
+        return None
+    _cache_put(key, out, disk=False)
+    return out
+
+def _cache_put(key: str, page: str, disk: bool = True):
+    with _memory_lock:
+        _memory[key] = page
+        _memory.move_to_end(key)
+        while len(_memory) > _MEMORY_ENTRIES:
+            _memory.popitem(last=False)
+    if disk:
+        os.makedirs(GRAPH_CACHE_DIR, exist_ok=True)
+        stamp = key.rsplit("-", 1)[0]
+        for name in os.listdir(GRAPH_CACHE_DIR):
+            if name.endswith(".html") and not name.startswith(stamp + "-"):
+                try:
+                    os.remove(os.path.join(GRAPH_CACHE_DIR, name))  # views of an older graph
+                except OSError:
+                    pass
+        tmp = os.path.join(GRAPH_CACHE_DIR, f".{key}.{os.getpid()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(page)
+        os.replace(tmp, os.path.join(GRAPH_CACHE_DIR, key + ".html"))
+
+def _key(stamp: str, page: int, chunk_pages: Dict[str, int], around: Optional[str], page_size: int) -> str:
+    view = json.dumps({"page": page, "expand": sorted(chunk_pages.items()), "around": around, "size": page_size})
+    return f"{stamp}-{hashlib.sha1(view.encode()).hexdigest()[:16]}"
+
+def _around(node_id: Optional[str]) -> Optional[Dict]:
+    if not node_id:
+        return None
+    rows = neighbors(node_id)
+    return {"node": {"id": node_id, "name": rows[0]["center"] if rows else None}, "rows": rows}
+
+def explore(page: int = 0, expand: Optional[List[str]] = None, chunk_pages: Optional[Dict[str, int]] = None,
+            around: Optional[str] = None, page_size: int = GRAPH_PAGE_SIZE) -> Dict:
+    """
+    Everything the Admin panel shows for one view, from one round of queries:
+    'counts', 'cases' (overview page `page`), 'chunks' ({case_id: rows} for each case
+    study in `expand`, at its page in `chunk_pages`, default 0), 'html', 'stamp' and
+    'cached'. `around` is the elementId of a node whose neighbours are added; they are
+    only queried when the view isn't cached.
+    """
+    c = counts()
+    stamp = graph_stamp(c)
+    cases = overview(page, page_size)
+    pages = {cid: (chunk_pages or {}).get(cid, 0) for cid in expand or []}
+    chunks = {cid: case_chunks(cid, p, page_size) for cid, p in pages.items()}
+    key = _key(stamp, page, pages, around, page_size)
+    out = _cache_get(key)
+    cached = out is not None
+    if out is None:
+        out = _html(_build(cases, chunks, _around(around)))
+        _cache_put(key, out)
+    return {"counts": c, "cases": cases, "chunks": chunks, "html": out, "stamp": stamp, "cached": cached}
+
+def render_html(page: int = 0, expand: Optional[List[str]] = None, around: Optional[str] = None,
+                page_size: int = GRAPH_PAGE_SIZE, stats: Optional[Dict] = None,
+                chunk_pages: Optional[Dict[str, int]] = None) -> str:
+    """
+    HTML only, as in explore(), but a cached view costs just the stamp query.
+    `stats`, if given, receives 'stamp' and 'cached'.
+    """
+    stamp = graph_stamp()
+    pages = {cid: (chunk_pages or {}).get(cid, 0) for cid in expand or []}
+    key = _key(stamp, page, pages, around, page_size)
+    out = _cache_get(key)
+    if stats is not None:
+        stats.update(stamp=stamp, cached=out is not None)
+    if out is not None:
+        return out
+    cases = overview(page, page_size)
+    chunks = {cid: case_chunks(cid, p, page_size) for cid, p in pages.items()}
+    out = _html(_build(cases, chunks, _around(around)))
+    _cache_put(key, out)
+    return out
+
+def render_graph_html(max_nodes: int = 1000) -> str:
+    """
+    Returns a path to a temporary HTML file with the case-study overview (first
+    `max_nodes` case studies). Kept for callers of the old full-graph view.
+    """
+    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".html", mode="w", encoding="utf-8")
+    with tmp:
+        tmp.write(render_html(page_size=max_nodes))
+    return tmp.name
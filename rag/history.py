@@ -0,0 +1,81 @@
+import sys, threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from config import HISTORY_MAX_TURNS, HISTORY_CHUNK_CACHE_MB
+
+# Chat history kept small. A turn holds the question, the answer and its sources as
+# [chunk_id, score] pairs; the chunk text, position and case study are stored once per
+# process in a cache keyed by chunk_id and shared by every session, so sessions that
+# cite the same chunks hold one copy between them. The cache is an LRU bounded by
+# HISTORY_CHUNK_CACHE_MB; a source evicted from it is read again from Neo4j when an old
+# turn is shown. Each session keeps at most HISTORY_MAX_TURNS turns.
+
+SOURCES_PER_TURN = 3
+_FIELDS = ("chunk_id", "case_id", "title", "url", "text", "order", "start", "end", "page", "section")
+
+_lock = threading.Lock()
+_chunks: "OrderedDict[str, Dict]" = OrderedDict()
+_bytes = 0
+_stats = {"hits": 0, "misses": 0, "fetched": 0, "evicted": 0}
+
+def _size(rec: Dict) -> int:
+    return sum(sys.getsizeof(v) for v in rec.values()) + sys.getsizeof(rec)
+
+def _put(cid: str, rec: Dict):
+    # Caller holds _lock
+    global _bytes
+    old = _chunks.pop(cid, None)
+    if old is not None:
+        _bytes -= old["_size"]
+    rec["_size"] = _size(rec)
+    _chunks[cid] = rec
+    _bytes += rec["_size"]
+    while _chunks and _bytes > HISTORY_CHUNK_CACHE_MB * 1024 * 1024:
+        _bytes -= _chunks.popitem(last=False)[1]["_size"]
+        _stats["evicted"] += 1
+
+def remember(chunks: List[Dict]):
+    """Stores retrieved candidates (retriever.retrieve_topn rows) in the shared cache."""
+    with _lock:
+        for c in chunks:
+            _put(c["cid"], {"chunk_id": c["cid"], **{f: c.get(f) for f in _FIELDS[1:]}})
+
+def source(cid: str) -> Optional[Dict]:
+    """A cited chunk with its case study, from the shared cache or else Neo4j; None if it no longer exists."""
+    with _lock:
+        rec = _chunks.get(cid)
+        if rec is not None:
+            _chunks.move_to_end(cid)
+            _stats["hits"] += 1
+            return rec
+        _stats["misses"] += 1
+    from .store import get_context
+    row = get_context(cid)
+    if row is None:
+        return None
+    rec = {"chunk_id": cid, "case_id": row["case_id"], "title": row["title"], "url": row["url"], "text": row["text"],
+           "order": row["ord"], "start": row["s"], "end": row["e"], "page": row["page"], "section": row["section"]}
+    with _lock:
+        _put(cid, rec)
+        _stats["fetched"] += 1
+    return rec
+
+def make_turn(question: str, answer: str, grounded: bool, top: List[Dict],
+              external_link: Optional[str] = None, timing: Optional[Dict] = None) -> Dict:
+    """A history entry; sources are the first SOURCES_PER_TURN chunks of `top` when grounded."""
+    cited = top[:SOURCES_PER_TURN] if grounded else []
+    remember(cited)
+    return {"q": question, "answer": answer, "grounded": grounded, "external_link": external_link,
+            "timing": timing or {}, "sources": [[c["cid"], round(float(c["hybrid"]), 3)] for c in cited]}
+
+def append(turns: List[Dict], turn: Dict) -> int:
+    """Adds `turn`, dropping the oldest beyond HISTORY_MAX_TURNS; returns how many were dropped."""
+    turns.append(turn)
+    drop = max(0, len(turns) - HISTORY_MAX_TURNS)
+    del turns[:drop]
+    return drop
+
+def stats() -> Dict:
+    with _lock:
+        total = _stats["hits"] + _stats["misses"]
+        return {**_stats, "chunks": len(_chunks), "bytes": _bytes, "hit_rate": _stats["hits"] / total if total else 0.0}
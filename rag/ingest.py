@@ -0,0 +1,267 @@
+import argparse, csv, hashlib, json, os, re, sys, time
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Union
+from config import (PDF_WORKERS, PDF_PAGES_PER_TASK, INGEST_WINDOW_CHUNKS, CHUNK_MODE, CHUNK_TOKENS,
+                    CHUNK_OVERLAP_TOKENS, VECTOR_BACKEND, FULLTEXT_BACKEND)
+from .store import upsert_chunks, get_case_hashes, finish_case, bump_corpus_version
+from .embedder import embed_texts
+from .pdf_pages import iter_pages, page_count
+from .chunking import Unit, chunk_units
+from . import answer_cache, ann_index, bm25
+
+# Headless ingestion pipeline: no Streamlit here, so the job workers and CLIs can use it.
+#
+# Bulk loading (see main):
+#   python -m rag.ingest ./case_studies --workers 4
+#   python -m rag.ingest manifest.csv --report load.json
+
+def _is_pdf(path: str) -> bool:
+    return path.lower().endswith(".pdf")
+
+def read_md(path: str) -> str:
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+def iter_units(paths: List[str], on_page: Optional[Callable[[int, int], None]] = None,
+               layout: bool = False) -> Iterator[Unit]:
+    """
+    Streams the files as chunking units (text, page, kind) whose texts join to
+    "\n".join of the files' text; PDF pages come from the extraction pool as they
+    finish, as layout blocks if `layout`. `on_page(done, total)` counts pages over all
+    files (a Markdown file counts as one page).
+    """
+    counts = [page_count(p) if _is_pdf(p) else 1 for p in paths]
+    total, before = sum(counts), 0
+    for k, (path, n) in enumerate(zip(paths, counts)):
+        if k:
+            yield "\n", None, "text"
+        if _is_pdf(path):
+            hook = (lambda done, _, base=before: on_page(base + done, total)) if on_page else None
+            pages = iter_pages(path, PDF_WORKERS, PDF_PAGES_PER_TASK, on_page=hook, layout=layout)
+            for j, page in enumerate(pages, start=1):
+                if j > 1:
+                    yield "\n", j, "text"
+                if layout:
+                    for text, kind in page:
+                        yield text, j, kind
+                else:
+                    yield page, j, "text"
+        else:
+            yield read_md(path), None, "text"
+            if on_page: on_page(before + 1, total)
+        before += n
+
+def _sha(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def _add_stats(total: Dict, part: Dict):
+    # Sums per-window embed/write stats; throughput is recomputed over the sums
+    for k, v in part.items():
+        if k != "chunks_per_sec" and isinstance(v, (int, float)):
+            total[k] = total.get(k, 0) + v
+    if total.get("seconds"):
+        total["chunks_per_sec"] = total.get("chunks", 0) / total["seconds"]
+
+def ingest_text(case: dict, text: Union[str, Iterable[Unit]],
+                progress: Optional[Callable[[str, Optional[float]], None]] = None,
+                mode: Optional[str] = None) -> Dict:
+    """
+    Brings one CaseStudy in Neo4j in line with `text`, touching only what changed.
+    Chunks whose content hash and offsets match what is stored are skipped, chunks that
+    only moved keep their stored embedding, and chunks past the new end are deleted.
+    Returns a report with counts of embeddings/writes done and avoided.
+
+    `text` may be a string or a unit stream (e.g. iter_units), chunked with `mode`
+    (default CHUNK_MODE, see rag.chunking) as it arrives; chunks are embedded and
+    written INGEST_WINDOW_CHUNKS at a time, so memory stays bounded for large
+    documents. `progress(stage, fraction)` is called as each window is embedded and
+    written and before the final cleanup; fraction is None for streams, whose length
+    isn't known up front.
+    """
+    progress = progress or (lambda stage, frac: None)
+    case_id = case["case_id"]
+    n_chars = len(text) if isinstance(text, str) else None
+    units = [(text, None, "text")] if isinstance(text, str) else text
+    stored_doc, stored = get_case_hashes(case_id)
+    hasher = hashlib.sha256()
+    report = {"chunks": 0, "embedded": 0, "written": 0, "deleted": 0,
+              "embeds_avoided": 0, "writes_avoided": 0, "embed": {}, "write": {}}
+    keep: List[str] = []
+    window: List[Dict] = []
+    wrote_case = False
+
+    def hashed(units):
+        for u in units:
+            hasher.update(u[0].encode("utf-8"))
+            yield u
+
+    def flush(end: int):
+        nonlocal wrote_case
+        to_embed = [r for r in window if r.pop("_new")]
+        frac = 0.9 * end / n_chars if n_chars else None
+        progress("embed", frac)
+        embed_stats: Dict = {}
+        vecs = embed_texts([r["text"] for r in to_embed], embed_stats)
+        for r, v in zip(to_embed, vecs):
+            r["embedding"] = v
+        progress("write", frac)
+        write_stats: Dict = {}
+        # Nothing stored yet -> plain CREATEs are safe and faster
+        upsert_chunks(case, window, bulk=not stored, stats=write_stats)
+        if VECTOR_BACKEND == "local" and to_embed:
+            ann_index.get().upsert([r["chunk_id"] for r in to_embed], [r["embedding"] for r in to_embed])
+        if FULLTEXT_BACKEND == "local" and to_embed:
+            bm25.get().upsert((r["chunk_id"], r["text"]) for r in to_embed)
+        _add_stats(report["embed"], embed_stats)
+        _add_stats(report["write"], write_stats)
+        report["embedded"] += len(to_embed)
+        report["written"] += len(window)
+        wrote_case = True
+        window.clear()
+
+    pieces = chunk_units(hashed(units), mode or CHUNK_MODE, CHUNK_TOKENS, CHUNK_OVERLAP_TOKENS)
+    for order, (chunk, s, e, page, section) in enumerate(pieces):
+        cid = f"{case_id}-{order:04d}"
+        h = _sha(chunk)
+        keep.append(cid)
+        report["chunks"] += 1
+        old = stored.get(cid)
+        if old == (h, s, e):
+            continue
+        # Chunks that only moved keep their stored embedding (None -> coalesce in the write)
+        window.append({"chunk_id": cid, "text": chunk, "order": int(order), "start": int(s), "end": int(e),
+                       "page": page, "section": section, "content_hash": h, "embedding": None,
+                       "_new": old is None or old[0] != h})
+        if len(window) >= INGEST_WINDOW_CHUNKS:
+            flush(e)
+    if window or not stored and not wrote_case:
+        flush(n_chars or 0)
+
+    doc_hash = hasher.hexdigest()
+    if report["written"] or stored_doc != doc_hash or len(stored) != len(keep):
+        progress("finish", 0.9 if n_chars else None)
+        report["deleted"] = finish_case(case_id, keep, doc_hash)
+        gone = set(stored) - set(keep) if report["deleted"] else set()
+        if VECTOR_BACKEND == "local" and gone:
+            ann_index.get().delete(gone)
+        if FULLTEXT_BACKEND == "local" and gone:
+            bm25.get().delete(gone)
+    report.update(embeds_avoided=report["chunks"] - report["embedded"],
+                  writes_avoided=report["chunks"] - report["written"])
+    if report["written"] or report["deleted"]:
+        answer_cache.invalidate_case(case_id)
+        bump_corpus_version()
+    return report
+
+# --- bulk loader CLI ---
+
+def _slug(text: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "-", text.lower()).strip("-")
+
+def _cases_from_dir(root: str) -> List[Dict]:
+    # Every PDF/Markdown file under `root` is one CaseStudy named after the file
+    cases = []
+    for dirpath, _, files in os.walk(root):
+        for name in sorted(files):
+            if name.lower().endswith((".pdf", ".md")):
+                path = os.path.join(dirpath, name)
+                stem = os.path.splitext(os.path.relpath(path, root))[0]
+                cases.append({"case_id": _slug(stem), "title": re.sub(r"[-_]+", " ", os.path.basename(stem)),
+                              "url": None, "paths": [os.path.abspath(path)]})
+    return cases
+
+def _cases_from_manifest(path: str) -> List[Dict]:
+    """
+    CSV (header row) or JSONL with `path` (or `file`) plus optional title, url and
+    case_id. Paths are relative to the manifest; rows sharing a case_id are one case.
+    """
+    with open(path, encoding="utf-8", newline="") as f:
+        rows = list(csv.DictReader(f)) if path.lower().endswith(".csv") else [json.loads(l) for l in f if l.strip()]
+    base, by_id = os.path.dirname(os.path.abspath(path)), {}
+    for i, r in enumerate(rows, start=1):
+        file = r.get("path") or r.get("file")
+        if not file:
+            raise ValueError(f"{path}: row {i} has no path")
+        file = os.path.join(base, file)
+        stem = os.path.splitext(os.path.basename(file))[0]
+        case_id = r.get("case_id") or _slug(r.get("title") or stem)
+        case = by_id.setdefault(case_id, {"case_id": case_id, "title": r.get("title") or stem,
+                                          "url": r.get("url") or None, "paths": []})
+        case["paths"].append(file)
+    return list(by_id.values())
+
+def _source_key(case: Dict) -> str:
+    # Same files, unchanged on disk, same chunking -> same key, so a rerun skips them
+    stat = [(p, os.stat(p).st_size, os.stat(p).st_mtime_ns) for p in case["paths"]]
+    return _sha(json.dumps([case["case_id"], case["title"], case["url"], stat, CHUNK_MODE,
+                            CHUNK_TOKENS, CHUNK_OVERLAP_TOKENS]))
+
+def main():
+    ap = argparse.ArgumentParser(prog="python -m rag.ingest",
+                                 description="Load a directory or manifest of case studies through the job queue.")
+    ap.add_argument("source", help="directory of PDF/Markdown files, or a .csv/.jsonl manifest")
+    ap.add_argument("--workers", type=int, default=4, help="cases ingested concurrently by this process")
+    ap.add_argument("--report", help="write the final report as JSON here")
+    ap.add_argument("--interval", type=float, default=10, help="seconds between progress lines")
+    a = ap.parse_args()
+    from . import jobs
+
+    cases = _cases_from_dir(a.source) if os.path.isdir(a.source) else _cases_from_manifest(a.source)
+    missing = [p for c in cases for p in c["paths"] if not os.path.exists(p)]
+    if missing:
+        sys.exit(f"{len(missing)} file(s) not found, e.g. {missing[0]}")
+
+    # Resume: sources already loaded are skipped, unfinished jobs from an earlier run
+    # are picked up where they are, failed ones get a fresh set of attempts
+    jobs.release_dead()
+    ids, skipped, resumed = [], 0, 0
+    for c in cases:
+        key = _source_key(c)
+        prev = jobs.find_source(key)
+        if prev and prev["status"] == "done":
+            skipped += 1
+            continue
+        if prev:
+            if prev["status"] == "failed":
+                jobs.requeue(prev["id"])
+            ids.append(prev["id"]); resumed += 1
+            continue
+        ids.append(jobs.enqueue_paths({k: c[k] for k in ("case_id", "title", "url")}, c["paths"], key))
+    print(f"{len(cases)} cases: {len(ids) - resumed} queued, {resumed} resumed, {skipped} already loaded")
+
+    t0, last = time.time(), 0.0
+    jobs.start_workers(a.workers)
+    while True:
+        rows = jobs.list_jobs(ids=ids)
+        done = [r for r in rows if r["status"] == "done"]
+        failed = [r for r in rows if r["status"] == "failed"]
+        chunks = sum(r["report"].get("chunks", 0) for r in done)
+        finished = len(done) + len(failed) == len(ids)
+        if finished or time.time() - last >= a.interval:
+            last, el = time.time(), time.time() - t0
+            print(f"[{el:7.0f}s] done {len(done)}/{len(ids)}  failed {len(failed)}  "
+                  f"{chunks} chunks  {chunks / el if el else 0:.1f} chunks/s", flush=True)
+        if finished:
+            break
+        time.sleep(1)
+
+    elapsed = time.time() - t0
+    total = lambda key: sum(r["report"].get(key, 0) for r in done)
+    stage = lambda part, key: sum(r["report"].get(part, {}).get(key, 0) for r in done)
+    report = {
+        "cases": len(cases), "done": len(done), "failed": len(failed), "skipped": skipped,
+        "seconds": round(elapsed, 1),
+        "cases_per_min": round(len(done) / elapsed * 60, 1) if elapsed else 0.0,
+        "chunks": total("chunks"), "embedded": total("embedded"), "written": total("written"),
+        "embeds_avoided": total("embeds_avoided"), "writes_avoided": total("writes_avoided"),
+        "chunks_per_sec": round(total("chunks") / elapsed, 1) if elapsed else 0.0,
+        "embed_seconds": round(stage("embed", "seconds"), 1), "write_seconds": round(stage("write", "seconds"), 1),
+        "failures": [{"job": r["id"], "case_id": r["case_id"], "error": r["error"]} for r in failed],
+    }
+    print(json.dumps(report, indent=2))
+    if a.report:
+        with open(a.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
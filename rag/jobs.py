@@ -0,0 +1,273 @@
+"""
+Persistent ingestion job queue (SQLite) and its workers.
+
+Uploads are spooled to disk and enqueued; workers claim jobs one at a time, run
+them through rag.ingest and record progress, so ingestion survives browser
+refreshes and app restarts. Workers run in-process (JOBS_INPROCESS_WORKERS) or
+as a separate process sharing the same queue file:
+
+    python -m rag.jobs worker --threads 2
+    python -m rag.jobs status
+
+A job whose worker stops heart-beating is reclaimed after JOBS_STALE_SECONDS. A job
+that fails is retried after JOBS_RETRY_BACKOFF seconds, doubled for each further
+attempt, and marked failed after JOBS_MAX_ATTEMPTS.
+Re-running it is cheap because ingest_text skips chunks that were already written.
+"""
+import argparse, json, os, socket, sqlite3, threading, time, uuid
+from typing import Dict, List, Optional, Tuple
+from config import JOBS_DB_PATH, JOBS_SPOOL_DIR, JOBS_STALE_SECONDS, JOBS_MAX_ATTEMPTS, JOBS_RETRY_BACKOFF, CHUNK_MODE
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id        INTEGER PRIMARY KEY AUTOINCREMENT,
+    case_id   TEXT NOT NULL,
+    title     TEXT,
+    url       TEXT,
+    files     TEXT NOT NULL,          -- JSON list of spooled file paths
+    status    TEXT NOT NULL,          -- queued | running | done | failed
+    stage     TEXT,
+    progress  REAL DEFAULT 0,
+    attempts  INTEGER DEFAULT 0,
+    worker    TEXT,
+    report    TEXT,                   -- JSON ingest report
+    error     TEXT,
+    created   REAL NOT NULL,
+    started   REAL,
+    finished  REAL,
+    heartbeat REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs(status, id);
+"""
+
+# Columns added after the first release; applied to existing queue files on open
+MIGRATIONS = [
+    ("source_key", "ALTER TABLE jobs ADD COLUMN source_key TEXT",
+     "CREATE INDEX IF NOT EXISTS jobs_source ON jobs(source_key, id)"),
+    ("not_before", "ALTER TABLE jobs ADD COLUMN not_before REAL"),  # earliest retry of a failed job
+]
+
+_local = threading.local()
+
+def _db() -> sqlite3.Connection:
+    # One connection per thread; WAL lets the app and CLI workers share the file
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        os.makedirs(os.path.dirname(JOBS_DB_PATH) or ".", exist_ok=True)
+        conn = sqlite3.connect(JOBS_DB_PATH, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        cols = {r["name"] for r in conn.execute("PRAGMA table_info(jobs)")}
+        for col, *ddl in MIGRATIONS:
+            if col not in cols:
+                for stmt in ddl:
+                    conn.execute(stmt)
+        _local.conn = conn
+    return conn
+
+def enqueue(case: dict, files: List[Tuple[str, bytes]]) -> int:
+    """Spools (filename, content) pairs and queues them as one CaseStudy. Returns the job id."""
+    spool = os.path.join(JOBS_SPOOL_DIR, uuid.uuid4().hex)
+    os.makedirs(spool, exist_ok=True)
+    paths = []
+    for i, (name, data) in enumerate(files):
+        path = os.path.join(spool, f"{i:03d}-{os.path.basename(name)}")
+        with open(path, "wb") as f:
+            f.write(data)
+        paths.append(path)
+    return enqueue_paths(case, paths)
+
+def enqueue_paths(case: dict, paths: List[str], source_key: Optional[str] = None) -> int:
+    """
+    Queues files already on disk (e.g. a bulk load) without copying them; they are
+    never deleted. `source_key` identifies the source version for find_source.
+    """
+    cur = _db().execute(
+        "INSERT INTO jobs(case_id, title, url, files, status, created, source_key) VALUES (?,?,?,?, 'queued', ?, ?)",
+        (case["case_id"], case.get("title"), case.get("url"), json.dumps(paths), time.time(), source_key),
+    )
+    return cur.lastrowid
+
+def find_source(source_key: str) -> Optional[Dict]:
+    # Latest job queued for this source version, if any
+    row = _db().execute("SELECT * FROM jobs WHERE source_key=? ORDER BY id DESC LIMIT 1", (source_key,)).fetchone()
+    return dict(row) if row else None
+
+def requeue(job_id: int):
+    _db().execute("UPDATE jobs SET status='queued', attempts=0, error=NULL, finished=NULL, not_before=NULL WHERE id=?", (job_id,))
+
+def _spooled(path: str) -> bool:
+    spool = os.path.abspath(JOBS_SPOOL_DIR)
+    return os.path.commonpath([spool, os.path.abspath(path)]) == spool
+
+def claim(worker: str) -> Optional[Dict]:
+    db = _db()
+    now = time.time()
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        # Jobs whose worker died too many times are given up on rather than reclaimed again
+        db.execute("UPDATE jobs SET status='failed', error='worker stopped responding', finished=? "
+                   "WHERE status='running' AND heartbeat < ? AND attempts >= ?",
+                   (now, now - JOBS_STALE_SECONDS, JOBS_MAX_ATTEMPTS))
+        row = db.execute(
+            "SELECT * FROM jobs WHERE (status='queued' AND COALESCE(not_before, 0) <= ?) "
+            "OR (status='running' AND heartbeat < ?) ORDER BY id LIMIT 1",
+            (now, now - JOBS_STALE_SECONDS),
+        ).fetchone()
+        if row is None:
+            db.execute("COMMIT")
+            return None
+        db.execute(
+            "UPDATE jobs SET status='running', worker=?, started=?, heartbeat=?, stage='read', progress=0, "
+            "attempts=attempts+1 WHERE id=?",
+            (worker, now, now, row["id"]),
+        )
+        db.execute("COMMIT")
+    except Exception:
+        db.execute("ROLLBACK")
+        raise
+    return dict(row)
+
+def _progress(job_id: int, stage: str, frac: float):
+    _db().execute("UPDATE jobs SET stage=?, progress=?, heartbeat=? WHERE id=?", (stage, frac, time.time(), job_id))
+
+def _tracker(job_id: int):
+    # Pages extracted drive the progress fraction, ingest_text the stage; page ticks
+    # are written at most once a second, stage changes immediately.
+    state = {"stage": "read", "frac": 0.0, "t": 0.0}
+    def update(stage: Optional[str] = None, frac: Optional[float] = None):
+        if frac is not None:
+            state["frac"] = frac
+        now = time.time()
+        if (stage and stage != state["stage"]) or now - state["t"] >= 1:
+            state["stage"] = stage or state["stage"]
+            state["t"] = now
+            _progress(job_id, state["stage"], state["frac"])
+    return update
+
+def run_job(job: Dict):
+    # Imported here: the app starts its workers at boot, and ingestion (PyMuPDF, the
+    # OpenAI client) should not be loaded until there is a job to run
+    from .ingest import ingest_text, iter_units
+    jid = job["id"]
+    try:
+        paths = json.loads(job["files"])
+        update = _tracker(jid)
+        units = iter_units(paths, on_page=lambda done, total: update(frac=0.9 * done / total),
+                           layout=CHUNK_MODE == "layout")
+        report = ingest_text({"case_id": job["case_id"], "title": job["title"], "url": job["url"]}, units,
+                             progress=lambda stage, frac: update(stage, frac))
+        _db().execute("UPDATE jobs SET status='done', stage='done', progress=1, report=?, error=NULL, finished=? "
+                      "WHERE id=?", (json.dumps(report), time.time(), jid))
+        spooled = [p for p in paths if _spooled(p)]
+        for p in spooled:
+            try:
+                os.remove(p)
+            except OSError:
+                pass
+        try:
+            os.rmdir(os.path.dirname(spooled[0]))
+        except (OSError, IndexError):
+            pass
+    except Exception as e:
+        # Retry later unless we've run out of attempts; the spooled files stay for the retry.
+        # Backing off keeps a rate limit or outage that outlasts the embedder's own retries
+        # from using up every attempt within seconds.
+        attempts, now = job["attempts"] + 1, time.time()
+        status = "queued" if attempts < JOBS_MAX_ATTEMPTS else "failed"
+        _db().execute("UPDATE jobs SET status=?, error=?, finished=?, not_before=? WHERE id=?",
+                      (status, f"{type(e).__name__}: {e}", now, now + JOBS_RETRY_BACKOFF * 2 ** (attempts - 1), jid))
+
+def work_forever(worker: str, poll: float = 1.0, stop: Optional[threading.Event] = None):
+    stop = stop or threading.Event()
+    while not stop.is_set():
+        job = claim(worker)
+        if job is None:
+            stop.wait(poll)
+            continue
+        run_job(job)
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def release_dead() -> int:
+    """
+    Requeues running jobs whose worker was a process on this host that has since
+    exited, so a restart picks them up now instead of after JOBS_STALE_SECONDS.
+    """
+    host, released = socket.gethostname(), 0
+    for r in _db().execute("SELECT id, worker FROM jobs WHERE status='running'").fetchall():
+        w_host, _, rest = (r["worker"] or "").rpartition(":")[0].rpartition(":")
+        if w_host == host and rest.isdigit() and int(rest) != os.getpid() and not _alive(int(rest)):
+            _db().execute("UPDATE jobs SET status='queued' WHERE id=? AND status='running'", (r["id"],))
+            released += 1
+    return released
+
+_started = False
+_start_lock = threading.Lock()
+
+def start_workers(n: int):
+    """Starts `n` daemon worker threads in this process (once; later calls are no-ops)."""
+    global _started
+    with _start_lock:
+        if _started or n <= 0:
+            return
+        _started = True
+        release_dead()
+        base = f"{socket.gethostname()}:{os.getpid()}"
+        for i in range(n):
+            threading.Thread(target=work_forever, args=(f"{base}:{i}",), name=f"ingest-worker-{i}",
+                             daemon=True).start()
+
+def list_jobs(limit: int = 20, ids: Optional[List[int]] = None) -> List[Dict]:
+    if ids is not None:
+        rows = []
+        for i in range(0, len(ids), 500):
+            part = ids[i:i + 500]
+            rows += _db().execute(f"SELECT * FROM jobs WHERE id IN ({','.join('?' * len(part))})", part).fetchall()
+    else:
+        rows = _db().execute("SELECT * FROM jobs ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+    out = []
+    for r in rows:
+        d = dict(r)
+        rep = json.loads(d["report"]) if d["report"] else {}
+        end = d["finished"] if d["status"] in ("done", "failed") else time.time()
+        d["seconds"] = (end - d["started"]) if d["started"] and end else None
+        d["chunks"] = rep.get("chunks")
+        d["chunks_per_sec"] = rep["chunks"] / d["seconds"] if rep.get("chunks") and d["seconds"] else None
+        d["report"] = rep
+        out.append(d)
+    return out
+
+def main():
+    ap = argparse.ArgumentParser(prog="python -m rag.jobs")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    w = sub.add_parser("worker", help="process queued ingestion jobs until interrupted")
+    w.add_argument("--threads", type=int, default=1)
+    sub.add_parser("status", help="show recent jobs")
+    a = ap.parse_args()
+    if a.cmd == "status":
+        for j in list_jobs():
+            rate = f"{j['chunks_per_sec']:.1f} chunks/s" if j["chunks_per_sec"] else ""
+            print(f"#{j['id']:<5} {j['status']:<8} {j['stage'] or '':<7} {j['case_id']:<40} {rate} {j['error'] or ''}")
+        return
+    release_dead()
+    base = f"{socket.gethostname()}:{os.getpid()}"
+    threads = [threading.Thread(target=work_forever, args=(f"{base}:{i}",), daemon=True) for i in range(a.threads)]
+    for t in threads:
+        t.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
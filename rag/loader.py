@@ -1,57 +1,35 @@
 import streamlit as st
-import fitz  # PyMuPDF
-from .store import upsert_chunk
-from .composer import embed_query
-
-CHARS = 1400
-OVERLAP = 200
-
-def _chunks(text: str):
-    i = 0; n = len(text)
-    while i < n:
-        j = min(i+CHARS, n)
-        yield text[i:j], i, j
-        i += CHARS - OVERLAP if i+CHARS < n else j
-
-def _read_pdf(file) -> str:
-    doc = fitz.open(stream=file.read(), filetype="pdf")
-    out = []
-    for p in doc:
-        out.append(p.get_text())
-    return "\n".join(out)
-
-def _read_md(file) -> str:
-    return file.read().decode("utf-8")
-
-@st.cache_data(show_spinner=False)
-def _embed(text: str):
-    # Reuse query embedding for MVP
-    return embed_query(text)
+from . import jobs
 
 def upload_and_ingest():
     files = st.file_uploader("Upload PDF or Markdown", type=["pdf","md"], accept_multiple_files=True)
-    if not files:
+    if files:
+        title = st.text_input("Case Study Title", value="Untitled Case Study")
+        url = st.text_input("Source URL (optional)")
+        case_id = st.text_input("Case ID", value=title.lower().replace(" ", "-"))
+        if st.button("Ingest"):
+            # All files in one upload make up the one case study; a background worker does the rest
+            jid = jobs.enqueue({"case_id": case_id, "title": title, "url": url},
+                               [(f.name, f.getvalue()) for f in files])
+            st.success(f"Queued as job #{jid}. You can keep using the app while it runs.")
+    ingest_status()
+
+def _status_table():
+    rows = jobs.list_jobs(limit=10)
+    if not rows:
         return
-    title = st.text_input("Case Study Title", value="Untitled Case Study")
-    url = st.text_input("Source URL (optional)")
-    case_id = st.text_input("Case ID", value=title.lower().replace(" ", "-"))
-    if st.button("Ingest"):
-        for f in files:
-            text = _read_pdf(f) if f.type == 'application/pdf' else _read_md(f)
-            order = 0
-            for chunk, s, e in _chunks(text):
-                cid = f"{case_id}-{order:04d}"
-                vec = _embed(chunk)
-                upsert_chunk({
-                    "case_id": case_id,
-                    "title": title,
-                    "url": url,
-                    "chunk_id": cid,
-                    "text": chunk,
-                    "order": int(order),
-                    "start": int(s),
-                    "end": int(e),
-                    "embedding": vec
-                })
-                order += 1
-        st.success("Ingestion complete.")
+    st.caption("Ingestion jobs")
+    st.dataframe([{
+        "job": r["id"],
+        "case": r["case_id"],
+        "status": r["status"],
+        "stage": r["stage"],
+        "progress": f"{(r['progress'] or 0):.0%}",
+        "chunks": r["chunks"],
+        "chunks/s": round(r["chunks_per_sec"], 1) if r["chunks_per_sec"] else None,
+        "embeds avoided": r["report"].get("embeds_avoided"),
+        "error": r["error"],
+    } for r in rows], hide_index=True, use_container_width=True)
+
+# Refresh just this panel every few seconds while the rest of the page stays put
+ingest_status = st.fragment(run_every=3)(_status_table) if hasattr(st, "fragment") else _status_table
@@ -0,0 +1,167 @@
+"""
+Shared persistence for the in-process index mirrors (rag.ann_index, rag.bm25).
+
+An index directory holds numbered generations; CURRENT names the live one. A
+generation is a read-only snapshot, written by the subclass, plus an append-only
+journal of upserts/deletes made since. Writers append under a file lock; every
+process replays records it hasn't seen before reading, so a write by a worker
+process shows up everywhere without a reload. When the journal outgrows what the
+subclass allows, the writer folds everything into a new generation.
+"""
+import os, struct, threading, time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import fcntl  # cross-process writer lock; Windows falls back to the thread lock only
+except ImportError:
+    fcntl = None
+
+_RECORD = struct.Struct("<BI")  # op, payload length
+UPSERT, DELETE = 1, 2
+
+class JournaledIndex:
+    KINDS: Dict[str, str] = {}  # snapshot file kind -> extension, set by subclasses
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.RLock()
+        self._gen: Optional[int] = None
+        self._offset = 0
+        self._checked = 0.0
+        self._load()
+
+    # --- subclass hooks ---
+    def _reset(self, gen: Optional[int]):
+        """Loads generation `gen`'s snapshot (None: start empty) and clears journal state."""
+        raise NotImplementedError
+
+    def _apply(self, op: int, payload: bytes):
+        raise NotImplementedError
+
+    def _write_snapshot(self, gen: int, rows: Iterable, count: Optional[int]):
+        """Writes generation `gen`'s snapshot files from rows (see the subclass)."""
+        raise NotImplementedError
+
+    def _live_rows(self) -> List:
+        """Current contents as rows for _write_snapshot, used when compacting."""
+        raise NotImplementedError
+
+    def _journal_rows(self) -> int:
+        """Rows added or removed since the snapshot; compared with _snapshot_rows."""
+        raise NotImplementedError
+
+    def _snapshot_rows(self) -> int:
+        raise NotImplementedError
+
+    # --- files ---
+    def _file(self, kind: str, gen: int) -> str:
+        ext = "bin" if kind == "journal" else self.KINDS[kind]
+        return os.path.join(self.path, f"{kind}-{gen}.{ext}")
+
+    def _current(self) -> Optional[int]:
+        try:
+            with open(os.path.join(self.path, "CURRENT"), encoding="utf-8") as f:
+                return int(f.read().strip())
+        except (OSError, ValueError):
+            return None
+
+    def exists(self) -> bool:
+        return self._current() is not None
+
+    class _WriteLock:
+        def __init__(self, index: "JournaledIndex"):
+            self.index = index
+        def __enter__(self):
+            self.index._lock.acquire()
+            os.makedirs(self.index.path, exist_ok=True)
+            self.f = open(os.path.join(self.index.path, "LOCK"), "a")
+            if fcntl: fcntl.flock(self.f, fcntl.LOCK_EX)
+        def __exit__(self, *exc):
+            if fcntl: fcntl.flock(self.f, fcntl.LOCK_UN)
+            self.f.close()
+            self.index._lock.release()
+
+    # --- load / replay ---
+    def _load(self):
+        with self._lock:
+            self._gen = self._current()
+            self._offset = 0
+            self._reset(self._gen)
+            self._replay()
+
+    def _replay(self):
+        # Applies journal records appended since the last look; a half-written tail is left for next time
+        if self._gen is None:
+            return
+        try:
+            with open(self._file("journal", self._gen), "rb") as f:
+                f.seek(self._offset)
+                data = f.read()
+        except FileNotFoundError:
+            return
+        pos = 0
+        while pos + _RECORD.size <= len(data):
+            op, n = _RECORD.unpack_from(data, pos)
+            end = pos + _RECORD.size + n
+            if end > len(data):
+                break
+            self._apply(op, data[pos + _RECORD.size:end])
+            pos = end
+        self._offset += pos
+
+    def refresh(self, max_age: float = 1.0):
+        # Picks up other processes' writes; at most one stat per `max_age` seconds
+        now = time.time()
+        if now - self._checked < max_age:
+            return
+        self._checked = now
+        with self._lock:
+            if self._current() != self._gen:
+                self._load()
+            else:
+                self._replay()
+
+    # --- writes ---
+    def _append(self, records: List[Tuple[int, bytes]]):
+        if not records:
+            return
+        buf = b"".join(_RECORD.pack(op, len(p)) + p for op, p in records)
+        with self._WriteLock(self):
+            if self._current() != self._gen:
+                self._load()
+            if self._gen is None:
+                self._snapshot([], 0)
+            self._replay()  # catch up first so our offset stays at a record boundary
+            with open(self._file("journal", self._gen), "ab") as f:
+                f.write(buf)
+            self._replay()
+            if self._journal_rows() > max(1024, self._snapshot_rows() // 4):
+                self._snapshot(self._live_rows(), None)
+
+    def _snapshot(self, rows: Iterable, count: Optional[int]):
+        # Caller holds the write lock. Writes generation g+1 and switches CURRENT to it.
+        gen = (self._current() or 0) + 1
+        os.makedirs(self.path, exist_ok=True)
+        self._write_snapshot(gen, rows, count)
+        open(self._file("journal", gen), "wb").close()
+        with open(os.path.join(self.path, "CURRENT.tmp"), "w", encoding="utf-8") as f:
+            f.write(str(gen))
+        os.replace(os.path.join(self.path, "CURRENT.tmp"), os.path.join(self.path, "CURRENT"))
+        old = self._gen
+        self._load()
+        if old is not None:
+            for kind in list(self.KINDS) + ["journal"]:
+                try:
+                    os.remove(self._file(kind, old))
+                except OSError:
+                    pass  # a reader on another platform may still hold it open
+
+    def compact(self):
+        with self._WriteLock(self):
+            self._replay()
+            self._snapshot(self._live_rows(), None)
+
+    def rebuild(self, rows: Iterable, count: Optional[int] = None):
+        """Replaces the index contents with `rows` (see the subclass for their shape)."""
+        with self._WriteLock(self):
+            self._snapshot(rows, count)
@@ -7,6 +7,8 @@ class Chunk(BaseModel):
     order: int
     char_start: int
     char_end: int
+    page: Optional[int] = None
+    section: Optional[str] = None
 
 class CaseStudy(BaseModel):
     case_id: str
@@ -0,0 +1,90 @@
+"""
+Context packing for the grounded-answer prompt.
+
+Retrieved chunks overlap their neighbours by up to OVERLAP characters (and CHUNK_OVERLAP_TOKENS
+in the other modes), and MMR can pick two neighbours from the same case study. Sending them
+as they are repeats that text in the prompt. pack() merges chunks of the same CaseStudy whose
+character ranges overlap or touch into one source, keeping their text once, then fits the
+sources into CONTEXT_TOKEN_BUDGET in relevance order, trimming the first one that doesn't
+fit and leaving out everything ranked below it. Chunk text is document[start:end] (see rag.chunking), so merging is a slice;
+chunks whose text doesn't line up with their offsets are left alone.
+"""
+import re
+from typing import Dict, List, Optional
+from .chunking import count_tokens
+
+MIN_TRIMMED_TOKENS = 64  # a source cut shorter than this is dropped instead
+_CUT = re.compile(r"[.!?]\s|\n")
+
+def _merge(a: dict, b: dict) -> Optional[dict]:
+    # b starts inside or right after a (same case); None if the texts don't line up
+    if b['end'] <= a['end']:
+        inner = a['text'][b['start'] - a['start']:b['end'] - a['start']]
+        return {**a, 'cids': a['cids'] + b['cids']} if inner == b['text'] else None
+    shared = a['end'] - b['start']
+    if a['text'][len(a['text']) - shared:] != b['text'][:shared] or len(a['text']) != a['end'] - a['start']:
+        return None
+    return {**a, 'text': a['text'] + b['text'][shared:], 'end': b['end'], 'cids': a['cids'] + b['cids']}
+
+def _trim(text: str, tokens: int) -> str:
+    # Longest head of `text` within `tokens`, cut back to a sentence or line end when there is one
+    n = count_tokens(text)
+    cut = int(len(text) * tokens / max(n, 1))
+    while cut > 0 and count_tokens(text[:cut]) > tokens - 1:
+        cut = int(cut * 0.9)
+    head = text[:cut]
+    ends = [m.end() for m in _CUT.finditer(head)]
+    if ends and ends[-1] > cut // 2:
+        head = head[:ends[-1]]
+    return head.rstrip() + " …"
+
+def pack(chunks: List[dict], budget: int = 0, stats: Optional[Dict] = None) -> List[dict]:
+    """
+    Chunks (in relevance order) -> sources for the prompt, still in relevance order of
+    their best chunk. Each source is a chunk dict with merged 'text', 'start', 'end' and
+    the merged chunk ids in 'cids'. budget <= 0: no token limit. `stats`, if given,
+    receives chunks, sources, merged, tokens_in, tokens_out, trimmed and dropped.
+    """
+    rank = {id(c): i for i, c in enumerate(chunks)}
+    by_case: Dict = {}
+    for c in chunks:
+        by_case.setdefault(c.get('case_id'), []).append(c)
+    sources = []
+    for case_id, cs in by_case.items():
+        cs.sort(key=lambda c: (c['start'], c['end']))
+        cur, cur_rank = None, 0
+        for c in cs:
+            item = {**c, 'cids': [c['cid']]}
+            merged = None
+            if cur is not None and case_id is not None and c['start'] <= cur['end']:
+                merged = _merge(cur, item)
+            if merged is not None:
+                cur, cur_rank = merged, min(cur_rank, rank[id(c)])
+                continue
+            if cur is not None:
+                sources.append((cur_rank, cur))
+            cur, cur_rank = item, rank[id(c)]
+        if cur is not None:
+            sources.append((cur_rank, cur))
+    sources = [s for _, s in sorted(sources, key=lambda x: x[0])]
+
+    tokens_in = sum(count_tokens(c['text']) for c in chunks)
+    out, used, trimmed = [], 0, 0
+    for s in sources:
+        n = count_tokens(s['text'])
+        if budget > 0 and used + n > budget:
+            # The first source that doesn't fit is trimmed (or dropped) and packing stops there:
+            # letting smaller, less relevant sources take the room left would break relevance order
+            room = budget - used
+            if room >= MIN_TRIMMED_TOKENS:
+                out.append({**s, 'text': _trim(s['text'], room)})
+                used += count_tokens(out[-1]['text'])
+                trimmed += 1
+            break
+        out.append(s)
+        used += n
+    dropped = len(sources) - len(out)
+    if stats is not None:
+        stats.update(chunks=len(chunks), sources=len(out), merged=len(chunks) - len(sources),
+                     tokens_in=tokens_in, tokens_out=used, trimmed=trimmed, dropped=dropped)
+    return out
@@ -0,0 +1,98 @@
+"""
+Page-parallel PDF text extraction.
+
+Pages are extracted in a process pool, a range of pages per task, and yielded in
+page order as they complete. Only a bounded number of tasks is in flight, so a
+caller consuming the pages as a stream holds a window of pages, not the document.
+
+Deliberately imports nothing but PyMuPDF: pool workers are spawned and import
+this module, and they should not pull in config, the Neo4j driver or OpenAI.
+"""
+import multiprocessing, os, threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterator, List, Optional, Tuple
+import fitz  # PyMuPDF
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_size = 0
+_pool_lock = threading.Lock()
+
+def page_count(path: str) -> int:
+    with fitz.open(path) as doc:
+        return doc.page_count
+
+def page_blocks(page) -> List[Tuple[str, str]]:
+    """
+    A page as (text, kind) layout blocks in reading order, kind "block" or "heading".
+    A short block set in a clearly larger font than the page's body text is a heading.
+    """
+    blocks, sizes = [], []
+    for b in page.get_text("dict", sort=True)["blocks"]:
+        if b.get("type") != 0:
+            continue
+        lines = ["".join(sp["text"] for sp in ln["spans"]) for ln in b["lines"]]
+        text = "\n".join(lines).strip()
+        if not text:
+            continue
+        size = max((sp["size"] for ln in b["lines"] for sp in ln["spans"]), default=0.0)
+        blocks.append((text + "\n", size))
+        sizes += [size] * len(text)
+    if not blocks:
+        return []
+    body = sorted(sizes)[len(sizes) // 2]  # char-weighted median font size
+    return [(t, "heading" if size >= 1.2 * body and len(t) < 160 else "block") for t, size in blocks]
+
+def _extract(path: str, start: int, end: int, layout: bool = False) -> list:
+    # Runs in a pool worker; each task opens its own handle on the (spooled) file
+    with fitz.open(path) as doc:
+        return [page_blocks(doc[i]) if layout else doc[i].get_text() for i in range(start, end)]
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    # One pool per process, reused across jobs; "spawn" because the ingest workers
+    # calling this are threads, and forking a threaded process is unsafe.
+    global _pool, _pool_size
+    with _pool_lock:
+        if _pool is None or _pool_size != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+            _pool_size = workers
+        return _pool
+
+def iter_pages(path: str, workers: int = 0, pages_per_task: int = 16,
+               on_page: Optional[Callable[[int, int], None]] = None, layout: bool = False) -> Iterator:
+    """
+    Yields the text of each page of `path`, in order (with `layout`, the page's
+    page_blocks instead). `workers` <= 0 means one per CPU; documents of at most two
+    tasks' worth of pages are read serially, where a pool would cost more than it
+    saves. `on_page(done, total)` is called after each page.
+    """
+    workers = workers if workers > 0 else (os.cpu_count() or 1)
+    total = page_count(path)
+    done = 0
+    if workers <= 1 or total <= 2 * pages_per_task:
+        with fitz.open(path) as doc:
+            for page in doc:
+                done += 1
+                yield page_blocks(page) if layout else page.get_text()
+                if on_page: on_page(done, total)
+        return
+
+    pool = _get_pool(workers)
+    ranges = [(s, min(s + pages_per_task, total)) for s in range(0, total, pages_per_task)]
+    ahead = 2 * workers  # tasks in flight; bounds memory to ~ahead * pages_per_task pages
+    pending = [pool.submit(_extract, path, s, e, layout) for s, e in ranges[:ahead]]
+    nxt = len(pending)
+    try:
+        while pending:
+            texts = pending.pop(0).result()
+            if nxt < len(ranges):
+                pending.append(pool.submit(_extract, path, *ranges[nxt], layout))
+                nxt += 1
+            for t in texts:
+                done += 1
+                yield t
+                if on_page: on_page(done, total)
+    finally:
+        for f in pending:
+            f.cancel()
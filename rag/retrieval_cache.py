@@ -0,0 +1,171 @@
+import hashlib, json, os, sqlite3, threading, time, unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from .tracing import traced
+from .store import corpus_version
+from config import (RETRIEVAL_CACHE_ENABLED, RETRIEVAL_CACHE_MB, RETRIEVAL_CACHE_TTL, RETRIEVAL_CACHE_PATH,
+                    RETRIEVAL_CACHE_DISK_MB)
+
+# Ranked retrieval results (retriever.retrieve_topn) for repeated questions, shared by
+# every session in the process and, with RETRIEVAL_CACHE_PATH, by every process using
+# that file. Keyed by the normalized question and the settings that shape the ranking;
+# each entry is tagged with the corpus version (store.corpus_version, bumped by ingest)
+# and dropped when read under a newer one. Memory is an LRU bounded by
+# RETRIEVAL_CACHE_MB; the file is written through and evicted LRU by size.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ret (
+    key       TEXT PRIMARY KEY,
+    version   INTEGER NOT NULL,
+    created   REAL NOT NULL,
+    seconds   REAL NOT NULL,
+    top       TEXT NOT NULL,
+    qvec      BLOB NOT NULL,
+    nbytes    INTEGER NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ret_last_used ON ret(last_used);
+CREATE INDEX IF NOT EXISTS ret_version ON ret(version);
+"""
+
+_lock = threading.Lock()
+_entries: "OrderedDict[str, Dict]" = OrderedDict()
+_bytes = 0
+_conn: Optional[sqlite3.Connection] = None
+_stats = {"hits": 0, "disk_hits": 0, "misses": 0, "stale": 0, "evicted": 0, "saved_seconds": 0.0}
+
+def normalize(question: str) -> str:
+    # Case, Unicode forms, spacing and closing punctuation don't change what is retrieved
+    return " ".join(unicodedata.normalize("NFKC", question).casefold().split()).rstrip("?!. ")
+
+def key(question: str, settings: Dict) -> str:
+    raw = json.dumps({"q": normalize(question), **settings}, sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def _db() -> sqlite3.Connection:
+    global _conn
+    if _conn is None:
+        os.makedirs(os.path.dirname(RETRIEVAL_CACHE_PATH) or ".", exist_ok=True)
+        _conn = sqlite3.connect(RETRIEVAL_CACHE_PATH, check_same_thread=False, timeout=30)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute("PRAGMA synchronous=NORMAL")
+        _conn.executescript(SCHEMA)
+    return _conn
+
+def _result(e: Dict) -> Dict:
+    # Copies, so callers can annotate the chunks without touching the cache
+    return {"top": [dict(c) for c in e["top"]], "best": e["best"], "qvec": e["qvec"].tolist()}
+
+def _remember(k: str, e: Dict):
+    # Caller holds _lock
+    global _bytes
+    old = _entries.pop(k, None)
+    if old is not None:
+        _bytes -= old["nbytes"]
+    _entries[k] = e
+    _bytes += e["nbytes"]
+    while _entries and _bytes > RETRIEVAL_CACHE_MB * 1024 * 1024:
+        _bytes -= _entries.popitem(last=False)[1]["nbytes"]
+        _stats["evicted"] += 1
+
+def _drop(k: str):
+    global _bytes
+    e = _entries.pop(k, None)
+    if e is not None:
+        _bytes -= e["nbytes"]
+
+def _from_disk(k: str, version: int, now: float) -> Tuple[Optional[Dict], bool]:
+    # (entry or None, whether a stale row was dropped); caller holds _lock
+    db = _db()
+    row = db.execute("SELECT version, created, seconds, top, qvec, nbytes FROM ret WHERE key=?", (k,)).fetchone()
+    if row is None:
+        return None, False
+    if row[0] != version or now - row[1] > RETRIEVAL_CACHE_TTL:
+        db.execute("DELETE FROM ret WHERE key=?", (k,))
+        db.commit()
+        return None, True
+    top, best = json.loads(row[3])
+    e = {"version": row[0], "created": row[1], "seconds": row[2], "top": top, "best": best,
+         "qvec": np.frombuffer(row[4], dtype=np.float32), "nbytes": row[5]}
+    _remember(k, e)
+    db.execute("UPDATE ret SET last_used=? WHERE key=?", (now, k))
+    db.commit()
+    _stats["disk_hits"] += 1
+    return e, False
+
+@traced("retrieval_cache.get")
+def get(k: str) -> Optional[Dict]:
+    """{'top', 'best', 'qvec'} stored under `k` for the current corpus version, or None."""
+    if not RETRIEVAL_CACHE_ENABLED:
+        return None
+    version, now = corpus_version(), time.time()
+    with _lock:
+        e, stale = _entries.get(k), False
+        if e is not None and (e["version"] != version or now - e["created"] > RETRIEVAL_CACHE_TTL):
+            _drop(k)
+            e, stale = None, True
+        if e is not None:
+            _stats["hits"] += 1
+        elif RETRIEVAL_CACHE_PATH:
+            e, on_disk = _from_disk(k, version, now)
+            stale = stale or on_disk
+        _stats["stale"] += stale
+        if e is None:
+            _stats["misses"] += 1
+            return None
+        _entries.move_to_end(k)
+        _stats["saved_seconds"] += e["seconds"]
+        return _result(e)
+
+def put(k: str, top: List[Dict], best: float, qvec: List[float], seconds: float):
+    """Stores a retrieve_topn result; `seconds` is what it took, i.e. what a hit saves."""
+    if not RETRIEVAL_CACHE_ENABLED:
+        return
+    version, now = corpus_version(), time.time()
+    top = [{f: v for f, v in c.items() if f != "vec"} for c in top]  # ranking is done; chunk vectors aren't needed
+    blob = json.dumps([top, best], default=float)
+    qv = np.asarray(qvec, dtype=np.float32)
+    e = {"version": version, "created": now, "seconds": seconds, "top": top, "best": best, "qvec": qv,
+         "nbytes": len(blob) + qv.nbytes}
+    with _lock:
+        _remember(k, e)
+        if RETRIEVAL_CACHE_PATH:
+            db = _db()
+            db.execute("DELETE FROM ret WHERE version < ?", (version,))
+            db.execute("INSERT OR REPLACE INTO ret(key, version, created, seconds, top, qvec, nbytes, last_used) "
+                       "VALUES (?,?,?,?,?,?,?,?)", (k, version, now, seconds, blob, qv.tobytes(), e["nbytes"], now))
+            _evict_disk(db)
+            db.commit()
+
+def _evict_disk(db: sqlite3.Connection):
+    # Drop least-recently-used rows until the file's entries are back under 90% of the budget
+    total = db.execute("SELECT COALESCE(SUM(nbytes), 0) FROM ret").fetchone()[0]
+    if total <= RETRIEVAL_CACHE_DISK_MB * 1024 * 1024:
+        return
+    target = int(RETRIEVAL_CACHE_DISK_MB * 1024 * 1024 * 0.9)
+    for k, n in db.execute("SELECT key, nbytes FROM ret ORDER BY last_used").fetchall():
+        if total <= target:
+            break
+        db.execute("DELETE FROM ret WHERE key=?", (k,))
+        total -= n
+
+def clear():
+    global _bytes
+    with _lock:
+        _entries.clear()
+        _bytes = 0
+        if RETRIEVAL_CACHE_PATH:
+            _db().execute("DELETE FROM ret")
+            _db().commit()
+
+def stats() -> Dict:
+    # Counters are per process; disk_entries describes the shared file
+    with _lock:
+        hits = _stats["hits"] + _stats["disk_hits"]
+        total = hits + _stats["misses"]
+        out = {**_stats, "entries": len(_entries), "bytes": _bytes, "hit_rate": hits / total if total else 0.0,
+               "saved_per_hit": _stats["saved_seconds"] / hits if hits else 0.0}
+        if RETRIEVAL_CACHE_ENABLED and RETRIEVAL_CACHE_PATH:
+            out["disk_entries"] = _db().execute("SELECT COUNT(*) FROM ret").fetchone()[0]
+    return out
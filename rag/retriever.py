@@ -1,10 +1,15 @@
+import time
 import numpy as np
-from typing import List, Dict, Tuple
-from config import TOP_K, TOP_N, HYBRID_ACCEPT
-from .store import fulltext, vector, get_context
+from typing import List, Dict, Optional, Tuple
+from config import (TOP_K, TOP_N, HYBRID_ACCEPT, SINGLE_QUERY_RETRIEVAL, ASYNC_RETRIEVAL, FUSION, EMBED_MODEL, EMBED_DIM,
+                    VECTOR_BACKEND, FULLTEXT_BACKEND)
+from .store import fulltext, vector, get_context, hybrid_search
 from .composer import embed_query
+from .tracing import span, traced
+from . import calibration, retrieval_cache
 
 ALPHA = 0.6  # semantic weight
+RRF_K = 60   # reciprocal rank fusion constant
 
 def normalize(scores: List[float]) -> List[float]:
     if not scores: return []
@@ -18,44 +23,117 @@ def cos(a, b):
     return float(np.dot(a,b) / denom)
 
 def mmr(cands: List[Dict], lam: float = 0.7, n: int = TOP_N) -> List[Dict]:
+    # Candidates must be sorted by 'hybrid' (desc) and carry their chunk embedding in 'vec'
     if not cands: return []
-    selected = [cands[0]]
-    remaining = cands[1:]
-    while len(selected) < n and remaining:
-        best_item = None; best_score = -1e9
-        for item in remaining:
-            sim = max([cos(item['vec'], s['vec']) for s in selected] or [0])
-            score = lam*item['hybrid'] - (1-lam)*sim
-            if score > best_score:
-                best_score, best_item = score, item
-        selected.append(best_item)
-        remaining = [r for r in remaining if r is not best_item]
-    return selected
-
-def retrieve_topn(question: str) -> Tuple[List[Dict], float]:
-    qvec = embed_query(question)
+    k = min(n, len(cands))
+    X = np.asarray([c['vec'] for c in cands], dtype=np.float32)
+    X /= np.linalg.norm(X, axis=1, keepdims=True) + 1e-9
+    S = X @ X.T
+    rel = lam * np.fromiter((c['hybrid'] for c in cands), dtype=np.float32, count=len(cands))
+    taken = np.zeros(len(cands), dtype=bool)
+    selected = [0]; taken[0] = True
+    max_sim = S[0].copy()
+    while len(selected) < k:
+        score = rel - (1 - lam) * max_sim
+        score[taken] = -np.inf
+        j = int(np.argmax(score))
+        selected.append(j); taken[j] = True
+        np.maximum(max_sim, S[j], out=max_sim)
+    return [cands[i] for i in selected]
+
+def _multi_query(question: str, qvec: List[float]):
+    # Legacy path: one round trip per index plus one per candidate chunk
     vec_rows = vector(qvec, TOP_K)
     fts_rows = fulltext(question, TOP_K)
+    sem = [(r['chunk']['chunk_id'], r['score']) for r in vec_rows]
+    lex = [(r['chunk']['chunk_id'], r['score']) for r in fts_rows]
+    return sem, lex, get_context
+
+def _single_query(question: str, qvec: List[float]):
+    rows = hybrid_search(question, qvec, TOP_K)
+    sem = [(r['chunk_id'], r['score']) for r in rows if r['src'] == 'sem']
+    lex = [(r['chunk_id'], r['score']) for r in rows if r['src'] == 'lex']
+    ctx = {r['chunk_id']: r for r in rows if r['case_id'] is not None}
+    return sem, lex, ctx.get
+
+def cache_settings() -> Dict:
+    # Everything besides the question and the corpus that decides retrieve_topn's result (rag.retrieval_cache)
+    return {"top_k": TOP_K, "top_n": TOP_N, "alpha": ALPHA, "fusion": FUSION, "rrf_k": RRF_K,
+            "calibration": calibration.stamp() if FUSION == "calibrated" else None,
+            "model": EMBED_MODEL, "dim": EMBED_DIM, "vector": VECTOR_BACKEND, "fulltext": FULLTEXT_BACKEND}
+
+@traced("retrieve")
+def retrieve_topn(question: str, info: Optional[Dict] = None) -> Tuple[List[Dict], float]:
+    # `info`, if given, receives the query embedding ('qvec') for callers such as the answer cache,
+    # and 'cached': whether the result came from the retrieval cache
+    info = info if info is not None else {}
+    key = retrieval_cache.key(question, cache_settings())
+    hit = retrieval_cache.get(key)
+    info['cached'] = hit is not None
+    if hit is not None:
+        info['qvec'] = hit['qvec']
+        return hit['top'], hit['best']
+    t0 = time.perf_counter()
+    top, best = _retrieve(question, info)
+    retrieval_cache.put(key, top, best, info['qvec'], time.perf_counter() - t0)
+    return top, best
+
+def _retrieve(question: str, info: Dict) -> Tuple[List[Dict], float]:
+    if ASYNC_RETRIEVAL:
+        from .async_retriever import retrieve_topn_sync
+        return retrieve_topn_sync(question, info)
+    qvec = embed_query(question)
+    info['qvec'] = qvec
+    gather = _single_query if SINGLE_QUERY_RETRIEVAL else _multi_query
+    sem, lex, get_ctx = gather(question, qvec)
+    return _rank(qvec, sem, lex, get_ctx)
+
+def _rank(qvec: List[float], sem, lex, get_ctx) -> Tuple[List[Dict], float]:
+    # sem/lex: [(chunk_id, raw score)] per index; get_ctx: chunk_id -> context row or None
+    with span("rank"):
+        return _rank_inner(qvec, sem, lex, get_ctx)
 
-    sem_scores = normalize([r['score'] for r in vec_rows])
-    lex_scores = normalize([r['score'] for r in fts_rows])
+# Fusion strategies: (sem, lex) as [(chunk_id, raw score)] per index -> {chunk_id: hybrid score}.
+# Only the ranking inside one result set is comparable across strategies; `best` (and so
+# HYBRID_ACCEPT) is on each strategy's own scale, so config requires it to be set unless FUSION is minmax.
 
+def _weighted(sem, sem_scores, lex, lex_scores) -> Dict[str, float]:
     by_id: Dict[str, Dict] = {}
-    for r, s in zip(vec_rows, sem_scores):
-        cid = r['chunk']['chunk_id']
-        by_id.setdefault(cid, {'sem':0, 'lex':0, 'cid':cid, 'vec':qvec})
+    for (cid, _), s in zip(sem, sem_scores):
+        by_id.setdefault(cid, {'sem':0, 'lex':0})
         by_id[cid]['sem'] = max(by_id[cid]['sem'], s)
-    for r, l in zip(fts_rows, lex_scores):
-        cid = r['chunk']['chunk_id']
-        by_id.setdefault(cid, {'sem':0, 'lex':0, 'cid':cid, 'vec':qvec})
+    for (cid, _), l in zip(lex, lex_scores):
+        by_id.setdefault(cid, {'sem':0, 'lex':0})
         by_id[cid]['lex'] = max(by_id[cid]['lex'], l)
+    return {cid: ALPHA*d['sem'] + (1-ALPHA)*d['lex'] for cid, d in by_id.items()}
+
+def fuse_minmax(sem, lex) -> Dict[str, float]:
+    # Each list scaled to 0..1 on its own: the top hit of a list always scores 1
+    return _weighted(sem, normalize([s for _, s in sem]), lex, normalize([s for _, s in lex]))
+
+def fuse_rrf(sem, lex) -> Dict[str, float]:
+    # Reciprocal rank fusion, scaled so that ranking first in both lists scores 1
+    rrf = lambda hits: [(RRF_K + 1) / (RRF_K + r) for r in range(1, len(hits) + 1)]
+    return _weighted(sem, rrf(sem), lex, rrf(lex))
+
+def fuse_calibrated(sem, lex) -> Dict[str, float]:
+    # Raw scores placed in the corpus' stored score distribution (rag.calibration)
+    cal = calibration.load()
+    return _weighted(sem, calibration.cdf(cal, 'sem', [s for _, s in sem]),
+                     lex, calibration.cdf(cal, 'lex', [s for _, s in lex]))
+
+FUSIONS = {'minmax': fuse_minmax, 'rrf': fuse_rrf, 'calibrated': fuse_calibrated}
+
+def _rank_inner(qvec: List[float], sem, lex, get_ctx) -> Tuple[List[Dict], float]:
+    if FUSION not in FUSIONS:
+        raise ValueError(f"FUSION must be one of {', '.join(FUSIONS)}, not {FUSION!r}")
+    fused = FUSIONS[FUSION](sem, lex)
 
     cands = []
-    for cid, d in by_id.items():
-        rec = get_context(cid)
+    for cid, hybrid in fused.items():
+        rec = get_ctx(cid)
         if not rec: 
             continue
-        hybrid = ALPHA*d['sem'] + (1-ALPHA)*d['lex']
         cands.append({
 
             'hybrid': hybrid,
@@ -76,7 +154,11 @@ def retrieve_topn(question: str) -> Tuple[List[Dict], float]:
 
             'end': rec['e'],
 
-            'vec': qvec
+            'page': rec.get('page'),
+
+            'section': rec.get('section'),
+
+            'vec': rec['vec'] if rec['vec'] is not None else qvec
 
         })
 
@@ -1,33 +1,158 @@
-from neo4j import GraphDatabase
-from typing import List
-from config import NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD
+import time
+from string import Template
+from typing import Dict, List, Optional
+from .tracing import traced
+from . import db
+from .embed_profile import names as profile_names
+from config import WRITE_BATCH_SIZE, VECTOR_BACKEND, FULLTEXT_BACKEND, CORPUS_VERSION_TTL, EMBED_DIM
 
-driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+def get_session(read: bool = False):
+    # Session on the shared pool (rag.db); prefer db.read / db.write for single queries
+    return db.session(read)
 
-def get_session():
-    return driver.session()
+def _profiled(cypher: str, dim: int = EMBED_DIM) -> str:
+    # Fills in ${vec} / ${vec_index}: the Chunk property and vector index of the embedding profile (rag.embed_profile)
+    prop, index = profile_names(dim)
+    return Template(cypher).safe_substitute(vec=prop, vec_index=index)
 
 CREATE_FTS = "CREATE FULLTEXT INDEX chunk_text_fts IF NOT EXISTS FOR (c:Chunk) ON EACH [c.text]"
-CREATE_VEC = "CREATE VECTOR INDEX chunk_vec_idx IF NOT EXISTS FOR (c:Chunk) ON (c.embedding) OPTIONS { indexConfig: {`vector.dimensions`: $dim, `vector.similarity_function`: 'cosine'}}"
+CREATE_VEC = "CREATE VECTOR INDEX ${vec_index} IF NOT EXISTS FOR (c:Chunk) ON (c.${vec}) OPTIONS { indexConfig: {`vector.dimensions`: $dim, `vector.similarity_function`: 'cosine'}}"
+# Uniqueness also gives MERGE/MATCH on these keys an index instead of a label scan
+CREATE_CHUNK_UNIQUE = "CREATE CONSTRAINT chunk_id_unique IF NOT EXISTS FOR (c:Chunk) REQUIRE c.chunk_id IS UNIQUE"
+CREATE_CASE_UNIQUE = "CREATE CONSTRAINT case_id_unique IF NOT EXISTS FOR (cs:CaseStudy) REQUIRE cs.case_id IS UNIQUE"
+CREATE_META_UNIQUE = "CREATE CONSTRAINT meta_key_unique IF NOT EXISTS FOR (m:Meta) REQUIRE m.key IS UNIQUE"
 
 def ensure_indexes(dim: int):
     with get_session() as s:
+        s.run(CREATE_CHUNK_UNIQUE)
+        s.run(CREATE_CASE_UNIQUE)
+        s.run(CREATE_META_UNIQUE)
         s.run(CREATE_FTS)
-        s.run(CREATE_VEC, dim=dim)
+    create_vector_index(dim)
 
-UPSERT_CHUNK = """
+def create_vector_index(dim: int):
+    with get_session() as s:
+        s.run(_profiled(CREATE_VEC, dim), dim=dim)
+
+UPSERT_CHUNK = _profiled("""
 
 MERGE (cs:CaseStudy {case_id: $case_id})
 ON CREATE SET cs.title=$title, cs.url=$url
 MERGE (ch:Chunk {chunk_id: $chunk_id})
-SET ch.text=$text, ch.order=$order, ch.char_start=$start, ch.char_end=$end, ch.embedding=$embedding
+SET ch.text=$text, ch.order=$order, ch.char_start=$start, ch.char_end=$end, ch.${vec}=$embedding, ch.${vec}_hash=null
 MERGE (cs)-[:HAS_CHUNK]->(ch)
 RETURN ch
-"""
+""")
 
 def upsert_chunk(rec: dict):
-    with get_session() as s:
-        s.run(UPSERT_CHUNK, **rec)
+    db.write(UPSERT_CHUNK, **rec)
+
+MERGE_CASE = """
+
+MERGE (cs:CaseStudy {case_id: $case_id})
+ON CREATE SET cs.title=$title, cs.url=$url
+"""
+
+UPSERT_CHUNKS = _profiled("""
+
+MATCH (cs:CaseStudy {case_id: $case_id})
+UNWIND $rows AS r
+MERGE (ch:Chunk {chunk_id: r.chunk_id})
+SET ch.text=r.text, ch.order=r.order, ch.char_start=r.start, ch.char_end=r.end,
+    ch.page=r.page, ch.section=r.section, ch.content_hash=r.content_hash, ch.${vec}=coalesce(r.embedding, ch.${vec}),
+    ch.${vec}_hash=CASE WHEN r.embedding IS NULL THEN ch.${vec}_hash ELSE r.content_hash END
+MERGE (cs)-[:HAS_CHUNK]->(ch)
+""")
+
+# First-time imports only: no existence checks, chunk_id_unique rejects accidental duplicates
+CREATE_CHUNKS = _profiled("""
+
+MATCH (cs:CaseStudy {case_id: $case_id})
+UNWIND $rows AS r
+CREATE (ch:Chunk {chunk_id: r.chunk_id, text: r.text, order: r.order, char_start: r.start,
+                  char_end: r.end, page: r.page, section: r.section, content_hash: r.content_hash,
+                  ${vec}: r.embedding, ${vec}_hash: r.content_hash})
+CREATE (cs)-[:HAS_CHUNK]->(ch)
+""")
+
+@traced("neo4j.upsert_chunks")
+def upsert_chunks(case: dict, rows: List[dict], batch_size: int = WRITE_BATCH_SIZE,
+                  bulk: bool = False, stats: Optional[Dict] = None):
+    """
+    Writes all chunks of one CaseStudy: the CaseStudy is merged once, then chunks go in
+    UNWIND batches of `batch_size`, one write transaction each. `case` needs case_id,
+    title and url; each row needs chunk_id, text, order, start, end, page, section
+    (both may be None), content_hash and embedding (None keeps the stored embedding, for chunks whose text did not change).
+    `bulk=True` uses CREATE instead of MERGE and fails if a chunk_id already exists.
+    """
+    stats = stats if stats is not None else {}
+    stats.update(chunks=len(rows), batches=0, seconds=0.0, chunks_per_sec=0.0)
+    query = CREATE_CHUNKS if bulk else UPSERT_CHUNKS
+    t0 = time.perf_counter()
+    db.write(MERGE_CASE, case_id=case["case_id"], title=case.get("title"), url=case.get("url"))
+    for i in range(0, len(rows), max(1, batch_size)):
+        db.write(query, case_id=case["case_id"], rows=rows[i:i + batch_size])
+        stats["batches"] += 1
+    stats["seconds"] = time.perf_counter() - t0
+    stats["chunks_per_sec"] = len(rows) / stats["seconds"] if stats["seconds"] else 0.0
+
+GET_CASE_HASHES = """
+
+MATCH (cs:CaseStudy {case_id: $case_id})
+OPTIONAL MATCH (cs)-[:HAS_CHUNK]->(ch:Chunk)
+RETURN cs.doc_hash AS doc_hash,
+       [c IN collect(ch) | {chunk_id: c.chunk_id, hash: c.content_hash, start: c.char_start, end: c.char_end}] AS chunks
+"""
+
+def get_case_hashes(case_id: str):
+    # (doc_hash or None, {chunk_id: (content_hash, start, end)}) as stored for this CaseStudy
+    rec = db.read_single(GET_CASE_HASHES, case_id=case_id)
+    if rec is None:
+        return None, {}
+    return rec["doc_hash"], {c["chunk_id"]: (c["hash"], c["start"], c["end"]) for c in rec["chunks"]}
+
+FINISH_CASE = """
+
+MATCH (cs:CaseStudy {case_id: $case_id})
+SET cs.doc_hash = $doc_hash
+WITH cs
+OPTIONAL MATCH (cs)-[:HAS_CHUNK]->(ch:Chunk)
+WHERE NOT ch.chunk_id IN $keep
+DETACH DELETE ch
+RETURN count(ch) AS deleted
+"""
+
+@traced("neo4j.finish_case")
+def finish_case(case_id: str, keep: List[str], doc_hash: str) -> int:
+    # Orphan deletion and the doc_hash stamp commit together, after all chunk writes;
+    # an interrupted ingest leaves the old stamp, so a retry re-diffs everything.
+    return db.write_tx(lambda tx: tx.run(FINISH_CASE, case_id=case_id, keep=keep,
+                                         doc_hash=doc_hash).single()["deleted"])
+
+# Corpus version: bumped by every ingest that changes chunks, so caches of anything derived
+# from the graph (explorer views, retrieval results) can key on it across processes
+BUMP_CORPUS_VERSION = """
+
+MERGE (m:Meta {key: 'corpus'})
+SET m.version = coalesce(m.version, 0) + 1, m.updated = timestamp()
+RETURN m.version AS version
+"""
+
+GET_CORPUS_VERSION = "OPTIONAL MATCH (m:Meta {key: 'corpus'}) RETURN coalesce(m.version, 0) AS version"
+
+_version = {"value": None, "checked": 0.0}
+
+def corpus_version(max_age: float = CORPUS_VERSION_TTL) -> int:
+    # Read at most once per `max_age` seconds per process; bumps from this process show up at once
+    now = time.monotonic()
+    if _version["value"] is None or now - _version["checked"] >= max_age:
+        _version.update(value=db.read_single(GET_CORPUS_VERSION)["version"], checked=now)
+    return _version["value"]
+
+def bump_corpus_version() -> int:
+    v = db.write_tx(lambda tx: tx.run(BUMP_CORPUS_VERSION).single()["version"])
+    _version.update(value=v, checked=time.monotonic())
+    return v
 
 FIND_FTS = """
 
@@ -36,34 +161,262 @@ RETURN node AS chunk, score
 LIMIT $k
 """
 
-FIND_VEC = """
+FIND_VEC = _profiled("""
 
-CALL db.index.vector.queryNodes('chunk_vec_idx', $k, $qvec)
+CALL db.index.vector.queryNodes('${vec_index}', $k, $qvec)
 YIELD node, score
 RETURN node AS chunk, score
-"""
+""")
+
+def lucene_query(q: str) -> str:
+    # The question's terms as a plain OR query: no operators, quotes or wildcards reach Lucene
+    from .bm25 import tokenize
+    return " ".join(tokenize(q))
+
+@traced("neo4j.fulltext")
+def _neo4j_fulltext(q: str, k: int):
+    lq = lucene_query(q)
+    if not lq:
+        return []
+    return db.read(FIND_FTS, q=lq, k=k)
+
+@traced("local.fulltext")
+def _local_fulltext(q: str, k: int):
+    from . import bm25
+    return [{"chunk": {"chunk_id": cid}, "score": score} for cid, score in bm25.get().search(q, k)]
 
 def fulltext(q: str, k: int):
-    with get_session() as s:
-        return s.run(FIND_FTS, q=q, k=k).data()
+    # Same row shape as vector(): chunk["chunk_id"] and score, other properties only from Neo4j
+    return _local_fulltext(q, k) if FULLTEXT_BACKEND == "local" else _neo4j_fulltext(q, k)
+
+@traced("neo4j.vector")
+def _neo4j_vector(qvec: List[float], k: int):
+    return db.read(FIND_VEC, qvec=qvec, k=k)
+
+@traced("local.vector")
+def _local_vector(qvec: List[float], k: int):
+    from . import ann_index
+    return [{"chunk": {"chunk_id": cid}, "score": score} for cid, score in ann_index.get().search(qvec, k)]
 
 def vector(qvec: List[float], k: int):
+    # Rows carry chunk["chunk_id"] and score either way; only Neo4j's include the other chunk properties
+    return _local_vector(qvec, k) if VECTOR_BACKEND == "local" else _neo4j_vector(qvec, k)
+
+COUNT_EMBEDDINGS = _profiled("MATCH (c:Chunk) WHERE c.${vec} IS NOT NULL RETURN count(c) AS n")
+ALL_EMBEDDINGS = _profiled("MATCH (c:Chunk) WHERE c.${vec} IS NOT NULL RETURN c.chunk_id AS id, c.${vec} AS vec")
+
+def count_embeddings() -> int:
+    return db.read_single(COUNT_EMBEDDINGS)["n"]
+
+def iter_embeddings():
+    # Streams (chunk_id, embedding) for every embedded Chunk, for rebuilding the local index
+    with db.session(read=True) as s:
+        for rec in s.run(ALL_EMBEDDINGS):
+            yield rec["id"], rec["vec"]
+
+# Embedding profile migration (rag.embed_profile): keyset pages of chunks whose ${dst} vector is
+# missing or was computed from other text, with what is needed to fill it from ${src} or the text
+PROFILE_PENDING = """
+
+MATCH (c:Chunk) WHERE c.chunk_id > $after
+  AND (c.${dst} IS NULL OR coalesce(c.${dst}_hash, '') <> coalesce(c.content_hash, ''))
+WITH c ORDER BY c.chunk_id LIMIT $n
+RETURN c.chunk_id AS id, c.content_hash AS hash, c.text AS text, c.${src} AS vec, c.${src}_hash AS src_hash
+"""
+
+# Skips chunks whose text changed since they were read
+PROFILE_WRITE = """
+
+UNWIND $rows AS r
+MATCH (c:Chunk {chunk_id: r.id})
+WHERE coalesce(c.content_hash, '') = coalesce(r.hash, '')
+SET c.${dst} = r.vec, c.${dst}_hash = r.hash
+"""
+
+PROFILE_REMOVE = """
+
+MATCH (c:Chunk) WHERE c.${dst} IS NOT NULL OR c.${dst}_hash IS NOT NULL
+WITH c LIMIT $n
+REMOVE c.${dst}, c.${dst}_hash
+RETURN count(c) AS n
+"""
+
+DROP_VEC = "DROP INDEX ${vec_index} IF EXISTS"
+VECTOR_INDEXES = """
+
+SHOW INDEXES YIELD name, type, labelsOrTypes, properties, state, populationPercent, failureMessage
+WHERE type = 'VECTOR' AND 'Chunk' IN labelsOrTypes
+RETURN name, properties[0] AS property, state, populationPercent AS pct, failureMessage AS failure
+"""
+COUNT_PROPERTY = "MATCH (c:Chunk) RETURN count(c) AS chunks, count(c[$prop]) AS filled"
+
+def profile_pending(src: int, dst: int, after: str, n: int) -> List[Dict]:
+    cypher = Template(PROFILE_PENDING).safe_substitute(src=profile_names(src)[0], dst=profile_names(dst)[0])
+    return db.read(cypher, after=after, n=n)
+
+def profile_write(dst: int, rows: List[Dict]):
+    if rows:
+        db.write(Template(PROFILE_WRITE).safe_substitute(dst=profile_names(dst)[0]), rows=rows)
+
+def profile_remove(dim: int, n: int) -> int:
+    cypher = Template(PROFILE_REMOVE).safe_substitute(dst=profile_names(dim)[0])
+    return db.write_tx(lambda tx: tx.run(cypher, n=n).single()["n"])
+
+def drop_vector_index(dim: int):
     with get_session() as s:
-        return s.run(FIND_VEC, qvec=qvec, k=k).data()
+        s.run(_profiled(DROP_VEC, dim))
+
+def vector_index_state(name: str) -> Optional[Dict]:
+    return next((r for r in db.read(VECTOR_INDEXES) if r["name"] == name), None)
 
-GET_CONTEXT = """
+def vector_profiles() -> List[Dict]:
+    # Every vector index on Chunk, with how many chunks have its property
+    out = []
+    for r in db.read(VECTOR_INDEXES):
+        out.append({**r, **dict(db.read_single(COUNT_PROPERTY, prop=r["property"]))})
+    return out
+
+ALL_TEXTS = "MATCH (c:Chunk) RETURN c.chunk_id AS id, c.text AS text"
+
+def iter_texts():
+    # Streams (chunk_id, text) for every Chunk, for rebuilding the local BM25 index
+    with db.session(read=True) as s:
+        for rec in s.run(ALL_TEXTS):
+            yield rec["id"], rec["text"]
+
+SAMPLE_TEXTS = "MATCH (c:Chunk) WITH c, rand() AS r ORDER BY r LIMIT $n RETURN c.text AS text"
+
+def sample_texts(n: int) -> List[str]:
+    # Random chunk texts, for building the fusion calibration (rag.calibration)
+    return [r["text"] for r in db.read(SAMPLE_TEXTS, n=n)]
+
+GET_CONTEXT = _profiled("""
 
 MATCH (cs:CaseStudy)-[:HAS_CHUNK]->(c:Chunk {chunk_id:$chunk_id})
 RETURN cs.case_id AS case_id, cs.title AS title, cs.url AS url,
        c.chunk_id AS chunk_id, c.text AS text, c.order AS ord,
-       c.char_start AS s, c.char_end AS e
-"""
+       c.char_start AS s, c.char_end AS e, c.page AS page, c.section AS section,
+       c.${vec} AS vec
+""")
 
+@traced("neo4j.get_context")
 def get_context(chunk_id: str):
-    with get_session() as s:
-        return s.run(GET_CONTEXT, chunk_id=chunk_id).single()
+    return db.read_single(GET_CONTEXT, chunk_id=chunk_id)
+
+# Vector + full-text hits and their CaseStudy context in a single round trip.
+# Rows carry `src` ('sem' | 'lex') so the caller can normalize each list on its own;
+# chunks without a CaseStudy come back with a null case_id and still count for scaling.
+HYBRID_SEARCH = _profiled("""
+
+CALL {
+    CALL db.index.vector.queryNodes('${vec_index}', $k, $qvec) YIELD node, score
+    RETURN node, score, 'sem' AS src
+    UNION ALL
+    CALL db.index.fulltext.queryNodes('chunk_text_fts', $q) YIELD node, score
+    RETURN node, score, 'lex' AS src
+    LIMIT $k
+}
+OPTIONAL MATCH (cs:CaseStudy)-[:HAS_CHUNK]->(node)
+RETURN src, score,
+       cs.case_id AS case_id, cs.title AS title, cs.url AS url,
+       node.chunk_id AS chunk_id, node.text AS text, node.order AS ord,
+       node.char_start AS s, node.char_end AS e, node.page AS page,
+       node.section AS section, node.${vec} AS vec
+""")
+
+# Same row shape as HYBRID_SEARCH, one index each, for callers that run them concurrently
+FTS_WITH_CONTEXT = _profiled("""
+
+CALL db.index.fulltext.queryNodes('chunk_text_fts', $q) YIELD node, score
+WITH node, score LIMIT $k
+OPTIONAL MATCH (cs:CaseStudy)-[:HAS_CHUNK]->(node)
+RETURN 'lex' AS src, score,
+       cs.case_id AS case_id, cs.title AS title, cs.url AS url,
+       node.chunk_id AS chunk_id, node.text AS text, node.order AS ord,
+       node.char_start AS s, node.char_end AS e, node.page AS page,
+       node.section AS section, node.${vec} AS vec
+""")
+
+VEC_WITH_CONTEXT = _profiled("""
+
+CALL db.index.vector.queryNodes('${vec_index}', $k, $qvec) YIELD node, score
+OPTIONAL MATCH (cs:CaseStudy)-[:HAS_CHUNK]->(node)
+RETURN 'sem' AS src, score,
+       cs.case_id AS case_id, cs.title AS title, cs.url AS url,
+       node.chunk_id AS chunk_id, node.text AS text, node.order AS ord,
+       node.char_start AS s, node.char_end AS e, node.page AS page,
+       node.section AS section, node.${vec} AS vec
+""")
+
+# Hits found by the local indexes ($hits: [{id, score, src}]) joined with full-text hits and context
+HYBRID_SEARCH_LOCAL = _profiled("""
+
+CALL {
+    UNWIND $hits AS h
+    MATCH (node:Chunk {chunk_id: h.id})
+    RETURN node, h.score AS score, h.src AS src
+    UNION ALL
+    CALL db.index.fulltext.queryNodes('chunk_text_fts', $q) YIELD node, score
+    RETURN node, score, 'lex' AS src
+    LIMIT $k
+}
+OPTIONAL MATCH (cs:CaseStudy)-[:HAS_CHUNK]->(node)
+RETURN src, score,
+       cs.case_id AS case_id, cs.title AS title, cs.url AS url,
+       node.chunk_id AS chunk_id, node.text AS text, node.order AS ord,
+       node.char_start AS s, node.char_end AS e, node.page AS page,
+       node.section AS section, node.${vec} AS vec
+""")
+
+# Same, joined with vector hits from the Neo4j vector index instead (local full-text, remote vector index)
+HYBRID_SEARCH_LOCAL_LEX = _profiled("""
+
+CALL {
+    UNWIND $hits AS h
+    MATCH (node:Chunk {chunk_id: h.id})
+    RETURN node, h.score AS score, h.src AS src
+    UNION ALL
+    CALL db.index.vector.queryNodes('${vec_index}', $k, $qvec) YIELD node, score
+    RETURN node, score, 'sem' AS src
+}
+OPTIONAL MATCH (cs:CaseStudy)-[:HAS_CHUNK]->(node)
+RETURN src, score,
+       cs.case_id AS case_id, cs.title AS title, cs.url AS url,
+       node.chunk_id AS chunk_id, node.text AS text, node.order AS ord,
+       node.char_start AS s, node.char_end AS e, node.page AS page,
+       node.section AS section, node.${vec} AS vec
+""")
 
+# Context only, for hits that were all found locally; same row shape as the queries above
+HITS_WITH_CONTEXT = _profiled("""
 
+UNWIND $hits AS h
+MATCH (node:Chunk {chunk_id: h.id})
+OPTIONAL MATCH (cs:CaseStudy)-[:HAS_CHUNK]->(node)
+RETURN h.src AS src, h.score AS score,
+       cs.case_id AS case_id, cs.title AS title, cs.url AS url,
+       node.chunk_id AS chunk_id, node.text AS text, node.order AS ord,
+       node.char_start AS s, node.char_end AS e, node.page AS page,
+       node.section AS section, node.${vec} AS vec
+""")
 
+# (vector index in Neo4j, full-text index in Neo4j) -> query
+_HYBRID = {(True, True): HYBRID_SEARCH, (False, True): HYBRID_SEARCH_LOCAL,
+           (True, False): HYBRID_SEARCH_LOCAL_LEX, (False, False): HITS_WITH_CONTEXT}
 
+def _hits(rows: List[dict], src: str) -> List[dict]:
+    return [{"id": r["chunk"]["chunk_id"], "score": r["score"], "src": src} for r in rows]
 
+@traced("neo4j.hybrid_search")
+def hybrid_search(q: str, qvec: List[float], k: int):
+    # Searches the local indexes first, then one round trip for the remote ones plus context
+    hits = []
+    remote_vec = VECTOR_BACKEND != "local"
+    if not remote_vec:
+        hits += _hits(_local_vector(qvec, k), "sem")
+    lq = ""
+    if FULLTEXT_BACKEND == "local":
+        hits += _hits(_local_fulltext(q, k), "lex")
+    else:
+        lq = lucene_query(q)
+    return db.read(_HYBRID[remote_vec, bool(lq)], q=lq, qvec=qvec, hits=hits, k=k)
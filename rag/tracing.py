@@ -0,0 +1,98 @@
+import contextvars, functools, json, threading, time, uuid
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+import numpy as np
+from config import TRACE_JSONL_PATH, TRACE_OTLP_ENDPOINT
+
+# Lightweight timed spans. Each span lands in three places:
+#   - the current request's trace (see `request`), for the per-question breakdown
+#   - process-wide rolling windows per span name, for p50/p95 across all sessions
+#   - optional exporters: a JSONL file and/or an OpenTelemetry OTLP/HTTP collector
+
+WINDOW = 2000  # samples kept per span name
+
+_current: contextvars.ContextVar[Optional[Dict]] = contextvars.ContextVar("trace", default=None)
+_lock = threading.Lock()
+_samples: Dict[str, deque] = {}
+
+_tracer = None
+if TRACE_OTLP_ENDPOINT:
+    try:
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        _provider = TracerProvider(resource=Resource.create({"service.name": "conexus-ai-search"}))
+        _provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter(endpoint=TRACE_OTLP_ENDPOINT)))
+        _tracer = _provider.get_tracer("rag")
+    except ImportError:
+        _tracer = None  # opentelemetry-sdk / exporter not installed
+
+def _emit(name: str, seconds: float, attrs: Dict):
+    with _lock:
+        _samples.setdefault(name, deque(maxlen=WINDOW)).append(seconds)
+    trace = _current.get()
+    if trace is not None:
+        trace["spans"].append({"name": name, "ms": seconds * 1000, **attrs})
+    if TRACE_JSONL_PATH:
+        line = json.dumps({"ts": time.time(), "trace_id": trace["id"] if trace else None,
+                           "name": name, "ms": round(seconds * 1000, 3), **attrs}, default=str)
+        with _lock, open(TRACE_JSONL_PATH, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+@contextmanager
+def span(name: str, **attrs):
+    t0 = time.perf_counter()
+    if _tracer is None:
+        try:
+            yield attrs
+        finally:
+            _emit(name, time.perf_counter() - t0, attrs)
+        return
+    with _tracer.start_as_current_span(name) as otel_span:
+        try:
+            yield attrs
+        finally:
+            for k, v in attrs.items():
+                otel_span.set_attribute(k, v)
+            _emit(name, time.perf_counter() - t0, attrs)
+
+def record(name: str, seconds: float, **attrs):
+    # For durations measured elsewhere (other threads, event loops, streamed generators)
+    if _tracer is not None:
+        end = time.time_ns()
+        s = _tracer.start_span(name, start_time=end - int(seconds * 1e9), attributes=attrs)
+        s.end(end_time=end)
+    _emit(name, seconds, attrs)
+
+def traced(name: str):
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*a, **kw):
+            with span(name):
+                return fn(*a, **kw)
+        return wrapper
+    return deco
+
+@contextmanager
+def request(name: str):
+    """Collects every span opened inside the block; yields the trace dict {id, name, spans, ms}."""
+    trace = {"id": uuid.uuid4().hex, "name": name, "spans": [], "ms": 0.0}
+    token = _current.set(trace)
+    try:
+        with span(name):
+            yield trace
+    finally:
+        _current.reset(token)
+        trace["ms"] = trace["spans"][-1]["ms"] if trace["spans"] else 0.0
+
+def aggregates() -> List[Dict]:
+    with _lock:
+        snap = {k: np.fromiter(v, dtype=np.float64) for k, v in _samples.items() if v}
+    return [{
+        "span": k,
+        "count": len(v),
+        "p50_ms": round(float(np.percentile(v, 50)) * 1000, 1),
+        "p95_ms": round(float(np.percentile(v, 95)) * 1000, 1),
+    } for k, v in sorted(snap.items())]
@@ -0,0 +1,89 @@
+"""
+Background warmup, started once per process by the app (WARMUP).
+
+Clients and indexes are created on first use, so the page paints without waiting for
+them. Warmup does that first use on a daemon thread while the visitor reads the page
+and types a question. It loads the OpenAI client, opens a connection in the Neo4j
+pool and runs one read (the corpus version), with ASYNC_RETRIEVAL creates the async
+retriever's driver and client on its loop, and loads the in-process indexes when
+VECTOR_BACKEND / FULLTEXT_BACKEND is "local". Each step is timed. A failing step is
+recorded and skipped, and the question that follows just pays for it again; when
+Neo4j can't be reached, the steps that query it are skipped too.
+"""
+import threading, time
+from typing import Callable, Dict, List, Optional, Tuple
+from config import VECTOR_BACKEND, FULLTEXT_BACKEND, ASYNC_RETRIEVAL
+
+_lock = threading.Lock()
+_started = False
+_done = threading.Event()
+_stats: Dict = {"steps": {}, "errors": {}, "seconds": 0.0}
+# Steps that only retry their way to a timeout once the connectivity check has failed
+_NEEDS_NEO4J = {"corpus_version", "async_retriever"}
+
+def _openai():
+    from .composer import get_client
+    get_client()
+
+def _neo4j():
+    from . import db
+    db.get_driver().verify_connectivity()
+
+def _async():
+    from . import async_retriever
+    async_retriever.warm()
+
+def _corpus():
+    from .store import corpus_version
+    corpus_version()
+
+def _steps() -> List[Tuple[str, Callable]]:
+    steps = [("openai", _openai), ("neo4j", _neo4j), ("corpus_version", _corpus)]
+    if ASYNC_RETRIEVAL:
+        steps.append(("async_retriever", _async))
+    if VECTOR_BACKEND == "local":
+        from . import ann_index
+        steps.append(("ann_index", ann_index.get))
+    if FULLTEXT_BACKEND == "local":
+        from . import bm25
+        steps.append(("bm25", bm25.get))
+    return steps
+
+def _run():
+    t_all = time.perf_counter()
+    try:
+        for name, step in _steps():
+            if name in _NEEDS_NEO4J and "neo4j" in _stats["errors"]:
+                with _lock:
+                    _stats["errors"][name] = "skipped: Neo4j unreachable"
+                continue
+            t0 = time.perf_counter()
+            try:
+                step()
+            except Exception as e:
+                with _lock:
+                    _stats["errors"][name] = f"{type(e).__name__}: {e}"
+            with _lock:
+                _stats["steps"][name] = time.perf_counter() - t0
+    finally:
+        with _lock:
+            _stats["seconds"] = time.perf_counter() - t_all
+        _done.set()
+
+def start(enabled: bool = True):
+    """Starts the warmup thread (once per process; later calls are no-ops)."""
+    global _started
+    with _lock:
+        if _started or not enabled:
+            return
+        _started = True
+    threading.Thread(target=_run, name="warmup", daemon=True).start()
+
+def wait(timeout: Optional[float] = None) -> bool:
+    """Blocks until warmup has finished; False on timeout or if it was never started."""
+    return _started and _done.wait(timeout)
+
+def stats() -> Dict:
+    with _lock:
+        return {"started": _started, "done": _done.is_set(), "seconds": _stats["seconds"],
+                "steps": dict(_stats["steps"]), "errors": dict(_stats["errors"])}
@@ -0,0 +1,9 @@
+# Tests run offline: placeholder credentials (config insists on them), caches and the
+# job queue in a scratch directory, and no in-process indexes.
+import os, tempfile
+from bench import offline_env
+
+_scratch = tempfile.mkdtemp(prefix="conexus-tests-")
+offline_env(EMBED_CACHE_ENABLED="false", RETRIEVAL_CACHE_ENABLED="false", ANSWER_CACHE_ENABLED="true",
+            VECTOR_BACKEND="neo4j", FULLTEXT_BACKEND="neo4j", WARMUP="false",
+            JOBS_DB_PATH=os.path.join(_scratch, "jobs.sqlite"), JOBS_SPOOL_DIR=os.path.join(_scratch, "uploads"))
@@ -0,0 +1,27 @@
+import pytest
+
+@pytest.fixture
+def cache(monkeypatch):
+    from rag import answer_cache
+    version = {"v": 1}
+    monkeypatch.setattr(answer_cache, "corpus_version", lambda: version["v"])
+    monkeypatch.setattr(answer_cache, "_entries", type(answer_cache._entries)())
+    return answer_cache, version
+
+CHUNKS = [{"cid": "case-a-0000", "case_id": "case-a"}, {"cid": "case-a-0001", "case_id": "case-a"}]
+QVEC = [0.6, 0.8, 0.0]
+
+def test_hit_for_same_question_and_sources(cache):
+    cache, _ = cache
+    cache.store(QVEC, CHUNKS, "cached answer", 1.5)
+    assert cache.lookup(QVEC, [c["cid"] for c in CHUNKS]) == "cached answer"
+
+def test_newer_corpus_version_is_a_miss(cache):
+    # An ingest in another process bumps the version; the chunk ids stay the same
+    cache, version = cache
+    cache.store(QVEC, CHUNKS, "old answer", 1.5)
+    version["v"] += 1
+    assert cache.lookup(QVEC, [c["cid"] for c in CHUNKS]) is None
+    assert len(cache._entries) == 0
+    cache.store(QVEC, CHUNKS, "new answer", 1.5)
+    assert cache.lookup(QVEC, [c["cid"] for c in CHUNKS]) == "new answer"
@@ -0,0 +1,53 @@
+import pytest
+from bench.memstore import MemoryStore, hash_embed
+
+CASE = {"case_id": "case-a", "title": "Case A", "url": None}
+TEXT = " ".join(f"word{i}" for i in range(1200))  # ~8.9k chars, several 1,400-char chunks
+
+@pytest.fixture
+def ingest(monkeypatch):
+    from rag import ingest
+    store = MemoryStore()
+    for name in ("upsert_chunks", "get_case_hashes", "finish_case", "bump_corpus_version"):
+        monkeypatch.setattr(ingest, name, getattr(store, name))
+    monkeypatch.setattr(ingest, "embed_texts", lambda texts, stats=None: [hash_embed(t) for t in texts])
+    monkeypatch.setattr(ingest, "CHUNK_MODE", "chars")
+    ingest.store = store
+    return ingest
+
+def _chunks(text):
+    from rag.chunking import chunk_units
+    return list(chunk_units([(text, None, "text")], "chars"))
+
+def test_first_ingest_writes_every_chunk(ingest):
+    report = ingest.ingest_text(CASE, TEXT)
+    n = len(_chunks(TEXT))
+    assert n > 3
+    assert (report["chunks"], report["embedded"], report["written"], report["deleted"]) == (n, n, n, 0)
+    assert ingest.store.corpus_version() == 1
+
+def test_identical_reingest_writes_nothing(ingest):
+    ingest.ingest_text(CASE, TEXT)
+    report = ingest.ingest_text(CASE, TEXT)
+    assert (report["embedded"], report["written"], report["deleted"]) == (0, 0, 0)
+    assert ingest.store.corpus_version() == 1  # nothing changed, caches stay valid
+
+def test_edit_rewrites_only_the_changed_chunk(ingest):
+    ingest.ingest_text(CASE, TEXT)
+    # Position 1800 lies in chunk 1 only (chunk 0 ends at 1400, chunk 2 starts at 2400)
+    edited = TEXT[:1800] + "#" + TEXT[1801:]
+    report = ingest.ingest_text(CASE, edited)
+    assert (report["embedded"], report["written"], report["deleted"]) == (1, 1, 0)
+    assert ingest.store.chunks["case-a-0001"]["text"] == _chunks(edited)[1][0]
+    assert ingest.store.corpus_version() == 2
+
+def test_shortened_document_deletes_the_tail(ingest):
+    ingest.ingest_text(CASE, TEXT)
+    before = len(_chunks(TEXT))
+    short = TEXT[:3000]
+    after = _chunks(short)
+    report = ingest.ingest_text(CASE, short)
+    # Chunks 0 and 1 are unchanged; the last one now ends earlier; the rest are gone
+    assert len(after) == 3
+    assert (report["embedded"], report["written"], report["deleted"]) == (1, 1, before - 3)
+    assert sorted(ingest.store.chunks) == [f"case-a-{i:04d}" for i in range(3)]
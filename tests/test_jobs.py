@@ -0,0 +1,93 @@
+import threading
+import pytest
+
+@pytest.fixture
+def jobs(tmp_path, monkeypatch):
+    # A fresh queue file per test; connections are per thread, so drop the cached ones
+    from rag import jobs
+    monkeypatch.setattr(jobs, "JOBS_DB_PATH", str(tmp_path / "jobs.sqlite"))
+    monkeypatch.setattr(jobs, "JOBS_SPOOL_DIR", str(tmp_path / "uploads"))
+    monkeypatch.setattr(jobs, "_local", threading.local())
+    monkeypatch.setattr(jobs, "JOBS_MAX_ATTEMPTS", 3)
+    monkeypatch.setattr(jobs, "JOBS_STALE_SECONDS", 600)
+    monkeypatch.setattr(jobs, "JOBS_RETRY_BACKOFF", 0)  # retry at once unless a test turns it on
+    return jobs
+
+@pytest.fixture
+def failing_ingest(monkeypatch):
+    from rag import ingest
+    def boom(*a, **kw):
+        raise RuntimeError("embedding service down")
+    monkeypatch.setattr(ingest, "iter_units", lambda paths, **kw: iter(()))
+    monkeypatch.setattr(ingest, "ingest_text", boom)
+
+def _status(jobs, jid):
+    return jobs.list_jobs(ids=[jid])[0]
+
+def test_claim_is_exclusive(jobs):
+    jid = jobs.enqueue({"case_id": "c1", "title": "One"}, [("a.md", b"# A")])
+    claimed, barrier = [], threading.Barrier(8)
+    def worker(i):
+        barrier.wait()
+        job = jobs.claim(f"w{i}")
+        if job is not None:
+            claimed.append(job["id"])
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert claimed == [jid]
+    assert jobs.claim("late") is None
+    assert _status(jobs, jid)["status"] == "running"
+
+def test_failed_job_is_retried_then_failed(jobs, failing_ingest):
+    jid = jobs.enqueue({"case_id": "c1", "title": "One"}, [("a.md", b"# A")])
+    for attempt in range(1, jobs.JOBS_MAX_ATTEMPTS + 1):
+        job = jobs.claim("w")
+        assert job is not None and job["id"] == jid
+        jobs.run_job(job)
+        row = _status(jobs, jid)
+        assert row["attempts"] == attempt
+        assert row["status"] == ("failed" if attempt == jobs.JOBS_MAX_ATTEMPTS else "queued")
+        assert "embedding service down" in row["error"]
+    assert jobs.claim("w") is None
+
+def test_stale_claim_is_reclaimed_until_attempts_run_out(jobs):
+    jid = jobs.enqueue({"case_id": "c1", "title": "One"}, [("a.md", b"# A")])
+    def go_silent():
+        jobs._db().execute("UPDATE jobs SET heartbeat=0 WHERE id=?", (jid,))
+    assert jobs.claim("w1")["id"] == jid
+    assert jobs.claim("w2") is None  # still heart-beating
+    for n in range(2, jobs.JOBS_MAX_ATTEMPTS + 1):
+        go_silent()
+        assert jobs.claim(f"w{n}")["id"] == jid
+        assert _status(jobs, jid)["attempts"] == n
+    go_silent()
+    assert jobs.claim("w-last") is None
+    row = _status(jobs, jid)
+    assert row["status"] == "failed" and row["error"] == "worker stopped responding"
+
+def test_requeue_resets_attempts(jobs, failing_ingest):
+    jid = jobs.enqueue({"case_id": "c1", "title": "One"}, [("a.md", b"# A")])
+    for _ in range(jobs.JOBS_MAX_ATTEMPTS):
+        jobs.run_job(jobs.claim("w"))
+    assert _status(jobs, jid)["status"] == "failed"
+    jobs.requeue(jid)
+    row = _status(jobs, jid)
+    assert row["status"] == "queued" and row["attempts"] == 0 and row["error"] is None
+    assert jobs.claim("w")["id"] == jid
+
+def test_failed_job_backs_off_before_retry(jobs, failing_ingest, monkeypatch):
+    monkeypatch.setattr(jobs, "JOBS_RETRY_BACKOFF", 30)
+    jid = jobs.enqueue({"case_id": "c1", "title": "One"}, [("a.md", b"# A")])
+    def wait_out():
+        jobs._db().execute("UPDATE jobs SET not_before=0 WHERE id=?", (jid,))
+    for attempt, delay in ((1, 30), (2, 60)):
+        jobs.run_job(jobs.claim("w"))
+        row = _status(jobs, jid)
+        assert row["status"] == "queued" and row["attempts"] == attempt
+        assert row["not_before"] - row["finished"] == pytest.approx(delay)
+        assert jobs.claim("w") is None  # not before the backoff has passed
+        wait_out()
+    assert jobs.claim("w")["id"] == jid
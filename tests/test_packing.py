@@ -0,0 +1,20 @@
+from rag.packing import pack
+
+LONG = "The retrofit was staged across planned outages. " * 40
+
+def _chunk(i, text):
+    return {"cid": f"c{i}", "case_id": f"case-{i}", "start": 0, "end": len(text), "text": text}
+
+def test_budget_keeps_relevance_order():
+    # A short, low-ranked source must not take the room a more relevant one was denied
+    chunks = [_chunk(0, LONG), _chunk(1, LONG), _chunk(2, "Short.")]
+    stats = {}
+    assert pack(chunks, budget=5, stats=stats) == []
+    assert stats["dropped"] == 3
+    out = pack(chunks, budget=100, stats=stats)
+    assert [s["cid"] for s in out] == ["c0"]
+    assert stats["trimmed"] == 1 and stats["dropped"] == 2 and stats["tokens_out"] <= 100
+
+def test_no_budget_keeps_everything():
+    chunks = [_chunk(0, LONG), _chunk(1, "Short.")]
+    assert [s["cid"] for s in pack(chunks)] == ["c0", "c1"]